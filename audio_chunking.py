@@ -0,0 +1,353 @@
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from pydub import AudioSegment
+from pydub.silence import detect_silence
+
+from audio_stream import read_wav
+from inference_backends import CTranslate2Model, InferenceConfig, set_threads
+from model_registry import DEFAULT_PRECISION, get_model
+from vad import detect_speech, pack_speech, remap_result, vad_report
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+# Audio shorter than this many chunk lengths is transcribed in-process; the
+# pool start-up and per-worker model load would cost more than they save.
+MIN_CHUNKS_FOR_POOL = 1.5
+
+
+def load_audio_segment(audio) -> AudioSegment:
+    """Load a file (or pass through an AudioSegment) as 16 kHz mono."""
+    segment = audio if isinstance(audio, AudioSegment) else AudioSegment.from_file(audio)
+    return segment.set_frame_rate(SAMPLE_RATE).set_channels(1).set_sample_width(2)
+
+
+def array_to_segment(samples: np.ndarray) -> AudioSegment:
+    """Wrap float32 16 kHz samples in an AudioSegment for silence detection."""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+    return AudioSegment(data=pcm.tobytes(), sample_width=2, frame_rate=SAMPLE_RATE, channels=1)
+
+
+def segment_to_array(segment: AudioSegment) -> np.ndarray:
+    """Convert a 16-bit AudioSegment to the float32 array Whisper consumes."""
+    samples = np.array(segment.get_array_of_samples(), dtype=np.int16)
+    return samples.astype(np.float32) / 32768.0
+
+
+def find_chunk_boundaries(
+    segment: AudioSegment,
+    chunk_length_s: float = 600,
+    search_window_s: float = 30,
+    min_silence_ms: int = 700,
+    silence_offset_db: float = -16,
+) -> List[int]:
+    """Return cut points (ms) close to every ``chunk_length_s``, preferring silences.
+
+    The first entry is always 0 and the last is the segment length. A cut
+    that cannot be placed inside a silence falls back to a hard cut at the
+    target position; the overlap added around chunks covers those.
+    """
+    total_ms = len(segment)
+    target_ms = int(chunk_length_s * 1000)
+    window_ms = int(search_window_s * 1000)
+    if total_ms <= target_ms:
+        return [0, total_ms]
+
+    silence_thresh = segment.dBFS + silence_offset_db
+    silences = detect_silence(segment, min_silence_len=min_silence_ms,
+                              silence_thresh=silence_thresh, seek_step=10)
+    midpoints = [(start + end) // 2 for start, end in silences]
+
+    cuts = [0]
+    while total_ms - cuts[-1] > target_ms:
+        ideal = cuts[-1] + target_ms
+        candidates = [m for m in midpoints if cuts[-1] < m < total_ms and abs(m - ideal) <= window_ms]
+        cuts.append(min(candidates, key=lambda m: abs(m - ideal)) if candidates else ideal)
+    cuts.append(total_ms)
+    return cuts
+
+
+_progress_local = threading.local()
+
+
+class _CallbackProgressBar:
+    """Minimal tqdm replacement that forwards Whisper's frame progress to a callback."""
+
+    def __init__(self, total=None, callback=None, **kwargs):
+        self.total = total or 1
+        self.n = 0
+        self._callback = callback
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def update(self, n=1):
+        self.n += n
+        self._callback(min(1.0, self.n / self.total))
+
+
+def _install_progress_hook():
+    """Route ``whisper.transcribe``'s tqdm bar to the calling thread's callback.
+
+    Whisper advances that bar by the decoded frame position (the seek after
+    each window's segments), so this yields transcription percent without
+    changing how the audio is decoded. Threads without a callback keep the
+    regular tqdm behaviour.
+    """
+    import whisper.transcribe as whisper_transcribe
+
+    if getattr(whisper_transcribe, '_progress_hook_installed', False):
+        return
+    real_tqdm = whisper_transcribe.tqdm
+
+    class _TqdmShim:
+        def __getattr__(self, name):
+            return getattr(real_tqdm, name)
+
+        def tqdm(self, *args, **kwargs):
+            callback = getattr(_progress_local, 'callback', None)
+            if callback is None:
+                return real_tqdm.tqdm(*args, **kwargs)
+            return _CallbackProgressBar(total=kwargs.get('total'), callback=callback)
+
+    whisper_transcribe.tqdm = _TqdmShim()
+    whisper_transcribe._progress_hook_installed = True
+
+
+def _transcribe_in_process(samples, model_size, device, precision, progress, options):
+    model = get_model(model_size, device=device, precision=precision)
+    if progress is None:
+        return model.transcribe(samples, **options)
+    if isinstance(model, CTranslate2Model):
+        return model.transcribe(samples, progress=progress, **options)
+    _install_progress_hook()
+    _progress_local.callback = progress
+    try:
+        # verbose=False is what enables the progress bar in Whisper
+        return model.transcribe(samples, **dict(options, verbose=False))
+    finally:
+        _progress_local.callback = None
+
+
+def init_worker_threads(torch_threads: int):
+    """Limit inference threads so parallel workers don't oversubscribe the cores."""
+    set_threads(torch_threads)
+
+
+def transcribe_wav_file(audio_path: str, config: InferenceConfig, vad_aggressiveness: Optional[int] = None,
+                        regions: Optional[List[Tuple[int, int]]] = None) -> Dict:
+    """Process-pool entry point: transcribe one 16 kHz WAV file (e.g. from the media cache).
+
+    With ``regions`` (``(start_sample, end_sample)`` pairs, e.g. from an
+    ``audio_fingerprint.ReusePlan``) only those parts are transcribed;
+    timestamps still refer to the whole file.
+    """
+    samples = read_wav(audio_path)
+    time_map = None
+    if regions is not None:
+        samples, time_map = pack_speech(samples, regions)
+    if vad_aggressiveness is None:
+        model = get_model(config.model_size, device=config.device, precision=config.precision)
+        result = model.transcribe(samples, fp16=config.precision == 'fp16')
+        result = {'text': result['text'], 'segments': result['segments'], 'language': result['language']}
+    else:
+        # Already inside a pool worker: an unbounded chunk length keeps transcribe_chunked in-process
+        result = transcribe_chunked(samples, model_size=config.model_size, device=config.device,
+                                    precision=config.precision, chunk_length_s=float('inf'),
+                                    vad_aggressiveness=vad_aggressiveness)
+    return remap_result(result, time_map) if time_map is not None else result
+
+
+def _transcribe_chunk(samples: np.ndarray, model_size: str, device: str, precision: str, options: Dict) -> Dict:
+    model = get_model(model_size, device=device, precision=precision)
+    result = model.transcribe(samples, **options)
+    return {
+        'text': result['text'],
+        'segments': result['segments'],
+        'language': result['language'],
+    }
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _normalize_words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def dedupe_overlap(previous_text: str, next_text: str, max_words: int = 20) -> str:
+    """Strip words at the start of ``next_text`` that repeat the end of ``previous_text``."""
+    prev_words = _normalize_words(previous_text)[-max_words:]
+    next_tokens = next_text.split()
+    next_words = [" ".join(_normalize_words(tok)) for tok in next_tokens]
+    for size in range(min(len(prev_words), len(next_words)), 0, -1):
+        if next_words[:size] == prev_words[-size:]:
+            rest = " ".join(next_tokens[size:])
+            return (" " + rest) if rest else ""
+    return next_text
+
+
+def stitch_results(chunk_results: List[Dict], spans: List[Tuple[int, int, int, int]]) -> Dict:
+    """Merge per-chunk results into one Whisper-shaped result.
+
+    ``spans`` holds ``(audio_start_ms, audio_end_ms, owned_start_ms, owned_end_ms)``
+    per chunk: the first pair is what was sent to the model (including the
+    overlap), the second is the stretch of the timeline the chunk is
+    responsible for. Segments whose midpoint falls outside the owned stretch
+    are dropped as duplicates of the neighbouring chunk.
+    """
+    segments = []
+    language_weight = Counter()
+    last_index = len(spans) - 1
+    for index, (result, (audio_start, _, owned_start, owned_end)) in enumerate(zip(chunk_results, spans)):
+        offset = audio_start / 1000.0
+        language_weight[result['language']] += owned_end - owned_start
+        for seg in result['segments']:
+            start = seg['start'] + offset
+            end = seg['end'] + offset
+            midpoint_ms = (start + end) * 500
+            if midpoint_ms < owned_start or (midpoint_ms >= owned_end and index != last_index):
+                continue
+            seg = dict(seg, start=start, end=end)
+            if 'seek' in seg:
+                seg['seek'] = seg['seek'] + int(offset * 100)
+            if 'words' in seg:
+                seg['words'] = [dict(w, start=w['start'] + offset, end=w['end'] + offset)
+                                for w in seg['words']]
+            if segments and start < segments[-1]['end'] + 1.0:
+                seg['text'] = dedupe_overlap(segments[-1]['text'], seg['text'])
+                if not seg['text'].strip():
+                    continue
+            seg['id'] = len(segments)
+            segments.append(seg)
+
+    language = language_weight.most_common(1)[0][0] if language_weight else None
+    return {
+        'text': "".join(seg['text'] for seg in segments),
+        'segments': segments,
+        'language': language,
+    }
+
+
+def transcribe_chunked(
+    audio,
+    model_size: str = "base",
+    device: str = "cpu",
+    chunk_length_s: float = 600,
+    overlap_s: float = 1.0,
+    max_workers: Optional[int] = None,
+    progress: Optional[Callable[[float], None]] = None,
+    vad_aggressiveness: Optional[int] = None,
+    precision: str = DEFAULT_PRECISION,
+    threads: Optional[int] = None,
+    **transcribe_options,
+) -> Dict:
+    """Transcribe ``audio`` in silence-aligned chunks on a process pool.
+
+    ``audio`` is a file path, an AudioSegment or a float32 16 kHz array (as
+    produced by ``audio_stream.load_pcm``). Returns the same
+    ``{'text', 'segments', 'language'}`` shape as ``model.transcribe``.
+    Short audio is transcribed directly in this process.
+
+    ``progress(fraction)`` reports how far into the audio transcription has
+    got; raising from it aborts the transcription.
+
+    With ``vad_aggressiveness`` (0-3) only the speech regions found by
+    ``vad.detect_speech`` are transcribed; timestamps still refer to the
+    original audio and the result gains a ``vad`` entry with the skipped time.
+
+    ``precision`` picks the inference backend (``InferenceConfig.precision``)
+    and ``threads`` caps the inference threads used in total.
+    """
+    transcribe_options.setdefault('fp16', device != "cpu")
+    if isinstance(audio, np.ndarray):
+        samples = audio
+    else:
+        samples = segment_to_array(load_audio_segment(audio))
+
+    if vad_aggressiveness is None:
+        return _transcribe_samples(samples, model_size, device, precision, threads, chunk_length_s,
+                                   overlap_s, max_workers, progress, transcribe_options)
+
+    regions = detect_speech(samples, vad_aggressiveness)
+    report = dict(vad_report(regions, len(samples)), aggressiveness=vad_aggressiveness)
+    if not regions:
+        # Nothing looked like speech; transcribe everything rather than trust that
+        result = _transcribe_samples(samples, model_size, device, precision, threads, chunk_length_s,
+                                     overlap_s, max_workers, progress, transcribe_options)
+        return dict(result, vad=dict(report, skipped_s=0.0, skipped_fraction=0.0))
+    packed, time_map = pack_speech(samples, regions)
+    logger.info("VAD skipped %.0fs of %.0fs (%.0f%%) in %d speech regions", report['skipped_s'],
+                report['total_s'], report['skipped_fraction'] * 100, report['regions'])
+    result = _transcribe_samples(packed, model_size, device, precision, threads, chunk_length_s,
+                                 overlap_s, max_workers, progress, transcribe_options)
+    return dict(remap_result(result, time_map), vad=report)
+
+
+def _transcribe_samples(samples, model_size, device, precision, threads, chunk_length_s, overlap_s,
+                        max_workers, progress, transcribe_options) -> Dict:
+    total_ms = len(samples) * 1000 // SAMPLE_RATE
+
+    if total_ms < chunk_length_s * 1000 * MIN_CHUNKS_FOR_POOL:
+        set_threads(threads)
+        result = _transcribe_in_process(samples, model_size, device, precision, progress, transcribe_options)
+        return {'text': result['text'], 'segments': result['segments'], 'language': result['language']}
+
+    cuts = find_chunk_boundaries(array_to_segment(samples), chunk_length_s)
+    n_chunks = len(cuts) - 1
+
+    overlap_ms = int(overlap_s * 1000)
+    spans = []
+    for owned_start, owned_end in zip(cuts, cuts[1:]):
+        audio_start = max(0, owned_start - overlap_ms)
+        audio_end = min(total_ms, owned_end + overlap_ms)
+        spans.append((audio_start, audio_end, owned_start, owned_end))
+
+    cpu_count = threads or os.cpu_count() or 1
+    workers = max(1, min(max_workers or cpu_count, n_chunks))
+    torch_threads = max(1, cpu_count // workers)
+
+    chunk_results = [None] * n_chunks
+    done_ms = 0
+
+    def collect(futures):
+        nonlocal done_ms
+        for future in futures:
+            index = pending.pop(future)
+            chunk_results[index] = future.result()
+            done_ms += spans[index][3] - spans[index][2]
+            if progress is not None:
+                progress(done_ms / total_ms)
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker_threads,
+                               initargs=(torch_threads,))
+    pending = {}
+    try:
+        # Keep at most two chunks per worker in flight so a multi-hour file
+        # isn't pickled into the pool queue all at once.
+        for index, (start, end, _, _) in enumerate(spans):
+            if len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            chunk = np.ascontiguousarray(samples[start * SAMPLE_RATE // 1000:end * SAMPLE_RATE // 1000])
+            future = pool.submit(_transcribe_chunk, chunk, model_size, device, precision, transcribe_options)
+            pending[future] = index
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+    finally:
+        # On errors (or cancellation from the progress callback) drop queued chunks
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    return stitch_results(chunk_results, spans)
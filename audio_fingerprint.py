@@ -0,0 +1,485 @@
+"""Audio fingerprints for reusing transcripts across re-uploads and clips.
+
+A fingerprint is a set of landmark hashes over decoded 16 kHz PCM. The log
+spectrogram is computed with NumPy in blocks of frames, points that are
+the maximum of their time/frequency neighbourhood are kept as peaks, and
+each peak is paired with the next few peaks after it. A hash packs both
+frequencies and the distance in frames, so it survives re-encoding, volume
+changes and cutting.
+
+``FingerprintStore`` keeps the hashes of every transcribed recording next
+to its transcript segments (SQLite). To match new audio its hashes are
+looked up and every hit votes for a (recording, time offset) pair; the
+stretches of the new audio where one offset collects enough votes were
+heard before in that recording, whether the new audio is a re-upload of
+it or a clip cut from it.
+
+``FingerprintStore.plan`` turns the matches into a ``ReusePlan``: the
+stored segments inside each matched stretch, moved onto the new timeline,
+and the sample regions nobody transcribed yet. ``transcribe_with_reuse``
+runs Whisper on those regions only (packed like VAD speech regions) and
+merges the two.
+
+Environment:
+    FINGERPRINT_DB  store path (default ``fingerprints.db`` in ``TRANSCRIPT_CACHE_DIR``), or ``off``
+
+Usage:
+    python audio_fingerprint.py match clip.mp4
+    python audio_fingerprint.py stats
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from itertools import repeat
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from instrumentation import configure_logging, get_metrics, stage
+from media_cache import DEFAULT_CACHE_DIR
+from vad import pack_speech, remap_result
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+FFT_SIZE = 1024
+HOP = 512
+FRAME_S = HOP / SAMPLE_RATE
+BAND_HZ = (250, 4000)
+# Half-widths (frames, bins) of the neighbourhood a peak must dominate
+PEAK_FRAMES = 6
+PEAK_BINS = 10
+# Peaks must also stand this far above the block's median level
+PEAK_MARGIN_DB = 10.0
+# Frames per FFT block; bounds memory on multi-hour inputs
+BLOCK_FRAMES = 4096
+# Each peak is paired with this many following peaks, at most MAX_DT_FRAMES later
+FAN_OUT = 5
+MAX_DT_FRAMES = 63
+
+# A match needs this many hash votes at one offset, over at least MIN_SPAN_S seconds
+MIN_VOTES = 20
+MIN_SPAN_S = 10.0
+# Share of the new audio's hash anchors inside a span that must agree with the offset
+MIN_DENSITY = 0.05
+# Matching stretches further apart than this are separate spans
+MAX_GAP_S = 8.0
+# Offsets this many frames apart count as the same alignment
+OFFSET_TOLERANCE = 1
+MAX_CANDIDATES = 32
+# Stored segments may overhang a matched span by this much and still be reused
+EDGE_TOLERANCE_S = 1.0
+# The first and last peaks of a recording pair with few others, so matches stop short of its
+# ends; a match reaching this close to either end is taken to run to it
+END_REACH_S = 3.0
+# Uncovered audio shorter than this next to reused segments is not transcribed
+MIN_NEW_S = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    model TEXT NOT NULL,
+    duration REAL NOT NULL,
+    hashes INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hashes (
+    hash INTEGER NOT NULL,
+    source_id INTEGER NOT NULL,
+    frame INTEGER NOT NULL,
+    PRIMARY KEY (hash, source_id, frame)
+) WITHOUT ROWID;
+"""
+
+
+def _max_filter(values: np.ndarray, half_width: int, axis: int) -> np.ndarray:
+    pad = [(0, 0)] * values.ndim
+    pad[axis] = (half_width, half_width)
+    padded = np.pad(values, pad, constant_values=-np.inf)
+    return sliding_window_view(padded, 2 * half_width + 1, axis=axis).max(axis=-1)
+
+
+def spectral_peaks(samples: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the ``(frame, bin)`` indices of the spectrogram's local maxima, in frame order."""
+    samples = np.asarray(samples, dtype=np.float32)
+    if len(samples) < FFT_SIZE:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    windows = sliding_window_view(samples, FFT_SIZE)[::HOP]
+    window = np.hanning(FFT_SIZE).astype(np.float32)
+    low, high = (int(hz * FFT_SIZE / SAMPLE_RATE) for hz in BAND_HZ)
+    frames, bins = [], []
+    for start in range(0, len(windows), BLOCK_FRAMES):
+        # Blocks overlap by a neighbourhood so maxima at their edges are found exactly once
+        lo = max(0, start - PEAK_FRAMES)
+        hi = min(len(windows), start + BLOCK_FRAMES + PEAK_FRAMES)
+        level = 20 * np.log10(np.abs(np.fft.rfft(windows[lo:hi] * window, axis=1)[:, low:high]) + 1e-6)
+        neighbourhood = _max_filter(_max_filter(level, PEAK_FRAMES, 0), PEAK_BINS, 1)
+        peak_frames, peak_bins = np.nonzero((level == neighbourhood) & (level > np.median(level) + PEAK_MARGIN_DB))
+        peak_frames += lo
+        inside = (peak_frames >= start) & (peak_frames < start + BLOCK_FRAMES)
+        frames.append(peak_frames[inside])
+        bins.append(peak_bins[inside] + low)
+    return np.concatenate(frames).astype(np.int64), np.concatenate(bins).astype(np.int64)
+
+
+@dataclass
+class Fingerprint:
+    hashes: np.ndarray
+    # Anchor frame of each hash (FRAME_S seconds per frame)
+    frames: np.ndarray
+    duration_s: float
+
+
+def fingerprint(samples: np.ndarray) -> Fingerprint:
+    """Hash pairs of spectral peaks: ``f1 << 16 | f2 << 6 | dt``, anchored at the first peak."""
+    frames, bins = spectral_peaks(samples)
+    hashes, anchors = [], []
+    for step in range(1, FAN_OUT + 1):
+        dt = frames[step:] - frames[:-step]
+        paired = (dt > 0) & (dt <= MAX_DT_FRAMES)
+        hashes.append((bins[:-step][paired] << 16) | (bins[step:][paired] << 6) | dt[paired])
+        anchors.append(frames[:-step][paired])
+    hashes, anchors = np.concatenate(hashes), np.concatenate(anchors)
+    order = np.argsort(anchors, kind='stable')
+    return Fingerprint(hashes[order], anchors[order], len(samples) / SAMPLE_RATE)
+
+
+@dataclass
+class Match:
+    key: str
+    # Source time minus new-audio time
+    offset_s: float
+    # Matched stretch of the new audio
+    start_s: float
+    end_s: float
+    votes: int
+
+    @property
+    def source_start_s(self) -> float:
+        return self.start_s + self.offset_s
+
+    @property
+    def source_end_s(self) -> float:
+        return self.end_s + self.offset_s
+
+
+def _subtract(span: Tuple[float, float], taken: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """Parts of ``span`` not covered by the ``taken`` intervals."""
+    pieces = [span]
+    for start, end in taken:
+        pieces = [part for lo, hi in pieces for part in ((lo, min(hi, start)), (max(lo, end), hi)) if part[1] > part[0]]
+    return pieces
+
+
+def _minimal_result(result: Dict) -> Dict:
+    segments = [{'start': float(seg['start']), 'end': float(seg['end']), 'text': seg['text']}
+                for seg in result.get('segments', [])]
+    return {'text': result.get('text', ''), 'segments': segments, 'language': result.get('language')}
+
+
+@dataclass
+class ReusePlan:
+    """Reusable segments for new audio and the sample regions still to transcribe."""
+    key: str
+    model: str
+    matches: List[Match]
+    # Reused segments, on the new audio's timeline
+    segments: List[Dict]
+    regions: List[Tuple[int, int]]
+    language: Optional[str] = None
+    fingerprint: Optional[Fingerprint] = field(default=None, repr=False)
+    store: Optional["FingerprintStore"] = field(default=None, repr=False)
+
+    @property
+    def reused_s(self) -> float:
+        return sum(seg['end'] - seg['start'] for seg in self.segments)
+
+    @property
+    def new_s(self) -> float:
+        return sum(end - start for start, end in self.regions) / SAMPLE_RATE
+
+    def complete(self, result: Optional[Dict]) -> Dict:
+        """Merge Whisper's result for ``regions`` (original timeline) with the reused segments.
+
+        The merged transcript is recorded in the store under the plan's key,
+        so later uploads can reuse it in turn.
+        """
+        merged = result
+        if self.matches:
+            new_segments = [dict(seg) for seg in (result or {}).get('segments', [])]
+            segments = sorted(self.segments + new_segments, key=lambda seg: seg['start'])
+            for index, seg in enumerate(segments):
+                seg['id'] = index
+            new_language = (result or {}).get('language')
+            language = new_language if new_language and self.new_s > self.reused_s else self.language or new_language
+            merged = {'text': ''.join(seg['text'] for seg in segments), 'segments': segments, 'language': language,
+                      'reuse': {'reused_s': round(self.reused_s, 2), 'transcribed_s': round(self.new_s, 2),
+                                'sources': [{'key': m.key, 'start_s': round(m.start_s, 2),
+                                             'end_s': round(m.end_s, 2), 'offset_s': round(m.offset_s, 2)}
+                                            for m in self.matches]}}
+            if result and 'vad' in result:
+                merged['vad'] = result['vad']
+            get_metrics().inc('fingerprint_reused_audio_seconds_total', self.reused_s)
+            logger.info("Reused %.0fs of transcript from %s; transcribed %.0fs", self.reused_s,
+                        ', '.join(sorted({m.key for m in self.matches})), self.new_s)
+        if merged is not None and self.store is not None:
+            try:
+                self.store.add(self.key, self.fingerprint, merged, self.model)
+            except sqlite3.Error as e:
+                logger.warning("Could not record the fingerprint of %s: %s", self.key, e)
+        return merged
+
+
+def transcribe_with_reuse(samples: np.ndarray, transcribe: Callable[[np.ndarray], Dict],
+                          plan: Optional[ReusePlan] = None) -> Dict:
+    """Run ``transcribe(samples)`` on the plan's new regions only and merge in the reused segments.
+
+    Without a plan this is just ``transcribe(samples)``.
+    """
+    if plan is None:
+        return transcribe(samples)
+    result = None
+    if not plan.matches:
+        result = transcribe(samples)
+    elif plan.regions:
+        packed, time_map = pack_speech(samples, plan.regions)
+        result = remap_result(transcribe(packed), time_map)
+    return plan.complete(result)
+
+
+class FingerprintStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS query_hashes (hash INTEGER PRIMARY KEY)')
+            self._local.conn = conn
+        return conn
+
+    def add(self, key: str, fp: Fingerprint, result: Dict, model: str):
+        """Record a transcribed recording's fingerprint and transcript (replacing the transcript for ``key``)."""
+        payload = json.dumps(_minimal_result(result), ensure_ascii=False)
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT id FROM sources WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    # Same key, same content: the hashes are already there
+                    conn.execute('UPDATE sources SET model = ?, result = ?, added_at = ? WHERE id = ?',
+                                 (model, payload, time.time(), row[0]))
+                else:
+                    source_id = conn.execute(
+                        'INSERT INTO sources (key, model, duration, hashes, result, added_at) '
+                        'VALUES (?, ?, ?, ?, ?, ?)',
+                        (key, model, fp.duration_s, len(fp.hashes), payload, time.time()),
+                    ).lastrowid
+                    conn.executemany('INSERT OR IGNORE INTO hashes (hash, source_id, frame) VALUES (?, ?, ?)',
+                                     zip(fp.hashes.tolist(), repeat(source_id), fp.frames.tolist()))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    def result(self, key: str) -> Optional[Dict]:
+        row = self._conn().execute('SELECT result FROM sources WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def duration(self, key: str) -> Optional[float]:
+        row = self._conn().execute('SELECT duration FROM sources WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _lookup(self, fp: Fingerprint) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Stored ``(hash, source_id, frame)`` rows sharing a hash with ``fp``."""
+        conn = self._conn()
+        conn.execute('BEGIN')
+        try:
+            conn.execute('DELETE FROM query_hashes')
+            conn.executemany('INSERT INTO query_hashes (hash) VALUES (?)', zip(np.unique(fp.hashes).tolist()))
+            rows = conn.execute('SELECT h.hash, h.source_id, h.frame FROM query_hashes q '
+                                'JOIN hashes h ON h.hash = q.hash').fetchall()
+        finally:
+            conn.execute('COMMIT')
+        if not rows:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        table = np.array(rows, dtype=np.int64)
+        return table[:, 0], table[:, 1], table[:, 2]
+
+    def match(self, fp: Fingerprint, model: Optional[str] = None, exclude: Optional[str] = None) -> List[Match]:
+        """Stretches of the fingerprinted audio found in stored recordings, non-overlapping, in time order.
+
+        Only recordings transcribed with ``model`` count (all with None);
+        ``exclude`` skips the recording's own key.
+        """
+        query = 'SELECT id, key FROM sources WHERE key IS NOT ?' + (' AND model = ?' if model else '')
+        names = dict(self._conn().execute(query, (exclude, model) if model else (exclude,)).fetchall())
+        if not names or not len(fp.hashes):
+            return []
+        hashes, sources, frames = self._lookup(fp)
+        wanted = np.isin(sources, np.fromiter(names, dtype=np.int64))
+        hashes, sources, frames = hashes[wanted], sources[wanted], frames[wanted]
+
+        # Pair every stored hit with every occurrence of its hash in the new audio
+        order = np.argsort(fp.hashes, kind='stable')
+        query_hashes, query_frames = fp.hashes[order], fp.frames[order]
+        left = np.searchsorted(query_hashes, hashes, 'left')
+        counts = np.searchsorted(query_hashes, hashes, 'right') - left
+        hit = np.repeat(np.arange(len(hashes)), counts)
+        query_index = left[hit] + np.arange(len(hit)) - np.repeat(np.cumsum(counts) - counts, counts)
+        sources, at = sources[hit], query_frames[query_index]
+        offsets = frames[hit] - at
+
+        votes_key, votes = np.unique((sources << 32) | (offsets + (1 << 31)), return_counts=True)
+        ranked = np.argsort(-votes, kind='stable')[:MAX_CANDIDATES]
+        anchors = np.unique(fp.frames)
+        spans = []
+        for pair, count in zip(votes_key[ranked], votes[ranked]):
+            if count < MIN_VOTES:
+                break
+            source, offset = pair >> 32, (pair & 0xffffffff) - (1 << 31)
+            aligned = (sources == source) & (np.abs(offsets - offset) <= OFFSET_TOLERANCE)
+            if aligned.sum() < MIN_VOTES:
+                continue
+            matched = np.unique(at[aligned])
+            for run in np.split(matched, np.flatnonzero(np.diff(matched) > MAX_GAP_S / FRAME_S) + 1):
+                start_s, end_s = float(run[0] * FRAME_S), float((run[-1] + 1) * FRAME_S)
+                in_span = np.searchsorted(anchors, run[-1], 'right') - np.searchsorted(anchors, run[0], 'left')
+                if len(run) >= MIN_VOTES and end_s - start_s >= MIN_SPAN_S and len(run) / in_span >= MIN_DENSITY:
+                    spans.append(Match(names[int(source)], float(offset * FRAME_S), start_s, end_s, len(run)))
+
+        # Strongest alignments first; weaker ones only keep the time they add
+        accepted: List[Match] = []
+        for span in sorted(spans, key=lambda m: -m.votes):
+            for start_s, end_s in _subtract((span.start_s, span.end_s), [(m.start_s, m.end_s) for m in accepted]):
+                if end_s - start_s >= MIN_SPAN_S:
+                    accepted.append(Match(span.key, span.offset_s, start_s, end_s, span.votes))
+        return sorted(accepted, key=lambda m: m.start_s)
+
+    def plan(self, samples: np.ndarray, key: str, model: str) -> ReusePlan:
+        """Fingerprint new audio and work out which of its segments can be taken from earlier transcripts."""
+        with stage('fingerprint', audio_s=round(len(samples) / SAMPLE_RATE, 2)) as span:
+            fp = fingerprint(samples)
+            span['hashes'] = len(fp.hashes)
+        return self.plan_fingerprint(fp, key, model)
+
+    def plan_fingerprint(self, fp: Fingerprint, key: str, model: str) -> ReusePlan:
+        """``plan`` for audio fingerprinted earlier, e.g. to look again once more recordings are stored."""
+        with stage('fingerprint_match') as span:
+            try:
+                matches = self.match(fp, model, exclude=key)
+            except sqlite3.Error as e:
+                # Reuse is an optimization: without the store everything is transcribed
+                logger.warning("Fingerprint lookup failed, transcribing everything: %s", e)
+                matches = []
+            span['matches'] = len(matches)
+
+        duration = fp.duration_s
+        n_samples = int(round(duration * SAMPLE_RATE))
+        used, segments, covered, language = [], [], [], None
+        for match in matches:
+            source = self.result(match.key)
+            source_start = 0.0 if match.source_start_s <= END_REACH_S else match.source_start_s
+            source_end = match.source_end_s
+            if source_end >= self.duration(match.key) - END_REACH_S:
+                source_end = min(self.duration(match.key), duration + match.offset_s)
+            inside = []
+            for seg in source['segments'] if source else []:
+                if (seg['start'] >= source_start - EDGE_TOLERANCE_S
+                        and seg['end'] <= source_end + EDGE_TOLERANCE_S):
+                    start = max(0.0, seg['start'] - match.offset_s)
+                    end = min(duration, seg['end'] - match.offset_s)
+                    # Edge tolerance can reach into the previous match's segments
+                    if end > start and (not covered or start >= covered[-1][1] - 0.05):
+                        inside.append(dict(seg, start=start, end=end))
+            if not inside:
+                continue
+            used.append(match)
+            segments.extend(inside)
+            covered.append((inside[0]['start'], inside[-1]['end']))
+            language = language or source.get('language')
+
+        regions = []
+        if used:
+            for start, end in _subtract((0.0, duration), covered):
+                if end - start >= MIN_NEW_S:
+                    regions.append((int(start * SAMPLE_RATE), min(n_samples, int(end * SAMPLE_RATE))))
+        else:
+            regions = [(0, n_samples)]
+        return ReusePlan(key, model, used, segments, regions, language, fp, self)
+
+    def stats(self) -> Dict:
+        conn = self._conn()
+        sources, hashes, audio_s = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(hashes), 0), COALESCE(SUM(duration), 0) FROM sources').fetchone()
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        return {'sources': sources, 'hashes': hashes, 'audio_hours': round(audio_s / 3600, 2),
+                'bytes': page_count * page_size}
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_fingerprint_store() -> Optional[FingerprintStore]:
+    """Shared store at ``FINGERPRINT_DB`` (default inside the media cache directory); None when ``off``."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            cache_dir = os.getenv('TRANSCRIPT_CACHE_DIR', DEFAULT_CACHE_DIR)
+            path = os.getenv('FINGERPRINT_DB', os.path.join(cache_dir, 'fingerprints.db'))
+            if path.lower() in ('off', 'false', '0', ''):
+                return None
+            _default_store = FingerprintStore(path)
+        return _default_store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the audio fingerprint store.")
+    parser.add_argument('--db', default=None, help="Store path (default: FINGERPRINT_DB or the cache directory)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    match = commands.add_parser('match', help="List the stored recordings a media file overlaps with")
+    match.add_argument('path')
+    match.add_argument('--model', default=None, help="Only recordings transcribed with this model tag")
+    commands.add_parser('stats', help="Recording and hash counts")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    store = FingerprintStore(args.db) if args.db else get_default_fingerprint_store()
+    if store is None:
+        parser.error("FINGERPRINT_DB is off; pass --db")
+    if args.command == 'match':
+        from audio_stream import load_pcm
+
+        fp = fingerprint(load_pcm(args.path))
+        matches = store.match(fp, args.model)
+        print(json.dumps({'hashes': len(fp.hashes), 'duration_s': round(fp.duration_s, 2),
+                          'matches': [dict(key=m.key, start_s=round(m.start_s, 2), end_s=round(m.end_s, 2),
+                                           source_start_s=round(m.source_start_s, 2), votes=m.votes)
+                                      for m in matches]}, indent=2))
+    else:
+        print(json.dumps(store.stats()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
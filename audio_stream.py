@@ -0,0 +1,197 @@
+"""Decode audio straight into NumPy without intermediate audio files.
+
+ffmpeg writes 16 kHz mono signed 16-bit PCM to a pipe and we convert it
+block by block into the float32 array Whisper's ``transcribe`` accepts.
+Inputs longer than ``MMAP_THRESHOLD_S`` are decoded into a memory-mapped
+temp file instead of RAM.
+"""
+import json
+import logging
+import os
+import struct
+import subprocess
+import tempfile
+import wave
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+READ_BLOCK_BYTES = 1 << 20
+MMAP_THRESHOLD_S = 2 * 3600
+
+logger = logging.getLogger(__name__)
+
+
+def probe_duration(source: str, headers: Optional[Dict[str, str]] = None) -> Optional[float]:
+    """Return the duration of ``source`` in seconds via ffprobe, or None if unknown."""
+    cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'json']
+    if headers:
+        cmd += ['-headers', ''.join(f"{k}: {v}\r\n" for k, v in headers.items())]
+    try:
+        out = subprocess.run(cmd + [source], capture_output=True, check=True).stdout
+        return float(json.loads(out)['format']['duration'])
+    except (OSError, subprocess.CalledProcessError, KeyError, ValueError):
+        return None
+
+
+def ffmpeg_pcm_command(source: str, sample_rate: int = SAMPLE_RATE,
+                       headers: Optional[Dict[str, str]] = None, threads: int = 0,
+                       input_options: Optional[List[str]] = None):
+    # threads=0 lets ffmpeg pick; callers decoding several files at once pass 1
+    cmd = ['ffmpeg', '-nostdin', '-loglevel', 'error', '-threads', str(threads)]
+    if headers:
+        cmd += ['-headers', ''.join(f"{k}: {v}\r\n" for k, v in headers.items())]
+    # input_options go before -i (e.g. ['-follow', '1'] for files still being written)
+    cmd += list(input_options or [])
+    return cmd + ['-i', source, '-vn', '-f', 's16le', '-ac', '1', '-ar', str(sample_rate), '-']
+
+
+def load_pcm(
+    source: str,
+    sample_rate: int = SAMPLE_RATE,
+    headers: Optional[Dict[str, str]] = None,
+    mmap_threshold_s: float = MMAP_THRESHOLD_S,
+    mmap_dir: Optional[str] = None,
+    progress: Optional[Callable[[int, Optional[float]], None]] = None,
+    threads: int = 0,
+) -> np.ndarray:
+    """Decode any ffmpeg-readable file or URL to a float32 mono array.
+
+    The array is filled while ffmpeg is still decoding, so no audio file is
+    written. When the probed duration exceeds ``mmap_threshold_s`` the
+    samples go to an ``np.memmap`` in ``mmap_dir`` (the file is unlinked
+    once mapped on POSIX, so it disappears with the array). The map grows
+    when ffmpeg delivers more audio than probed (VBR files, broken headers).
+
+    ``progress(bytes_read, fraction)`` is called after every block read;
+    ``fraction`` is None when the duration could not be probed.
+    ``threads`` is ffmpeg's decoder thread count (0 for automatic).
+    """
+    duration = probe_duration(source, headers)
+    use_mmap = duration is not None and duration > mmap_threshold_s
+
+    process = subprocess.Popen(ffmpeg_pcm_command(source, sample_rate, headers, threads),
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    mmap_file = None
+    try:
+        if use_mmap:
+            # Leave a little headroom over the probed length; trimmed below
+            capacity = int((duration + 1) * sample_rate)
+            fd, mmap_path = tempfile.mkstemp(suffix='.f32', dir=mmap_dir)
+            # Kept open so the map can grow after the path is unlinked
+            mmap_file = os.fdopen(fd, 'w+b')
+            mmap_file.truncate(capacity * 4)
+            buffer = np.memmap(mmap_file, dtype=np.float32, mode='r+', shape=(capacity,))
+            if os.name == 'posix':
+                os.remove(mmap_path)
+        else:
+            buffer = None
+            blocks = []
+
+        filled = 0
+        bytes_read = 0
+        expected_bytes = duration * sample_rate * 2 if duration else None
+        leftover = b''
+        while True:
+            data = process.stdout.read(READ_BLOCK_BYTES)
+            if not data:
+                break
+            bytes_read += len(data)
+            if progress is not None:
+                progress(bytes_read, min(1.0, bytes_read / expected_bytes) if expected_bytes else None)
+            data = leftover + data
+            usable = len(data) - (len(data) % 2)
+            leftover = data[usable:]
+            block = np.frombuffer(data[:usable], dtype=np.int16).astype(np.float32) / 32768.0
+            if buffer is not None:
+                if filled + len(block) > len(buffer):
+                    buffer = _grow_memmap(buffer, mmap_file, filled + len(block), source, sample_rate)
+                buffer[filled:filled + len(block)] = block
+                filled += len(block)
+            else:
+                blocks.append(block)
+
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to decode {source}: {stderr.decode(errors='replace').strip()}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        if mmap_file is not None:
+            # The map keeps its own reference to the file
+            mmap_file.close()
+
+    if buffer is not None:
+        return buffer[:filled]
+    return np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+
+
+def _grow_memmap(buffer: np.memmap, mmap_file, needed: int, source: str, sample_rate: int) -> np.memmap:
+    """Extend the backing file and remap it with room for at least ``needed`` samples."""
+    capacity = max(needed, int(len(buffer) * 1.25))
+    logger.warning("%s decodes longer than its probed duration; growing the sample map to %.0f s",
+                   source, capacity / sample_rate)
+    buffer.flush()
+    mmap_file.truncate(capacity * 4)
+    return np.memmap(mmap_file, dtype=np.float32, mode='r+', shape=(capacity,))
+
+
+def wav_data_offset(path: str):
+    """Return (offset, byte_count) of the PCM data chunk in a RIFF/WAVE file."""
+    with open(path, 'rb') as f:
+        riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError(f"{path} is not a WAV file")
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id, size = struct.unpack('<4sI', header)
+            if chunk_id == b'data':
+                return f.tell(), size
+            f.seek(size + (size & 1), os.SEEK_CUR)
+
+
+def read_wav(path: str) -> np.ndarray:
+    """Read a 16-bit mono WAV (e.g. from the media cache) as float32 without ffmpeg.
+
+    The PCM data is memory-mapped and converted in one vectorized pass into
+    a new in-memory float32 array, so the whole file is loaded.
+    """
+    with wave.open(path, 'rb') as f:
+        if f.getsampwidth() != 2 or f.getnchannels() != 1:
+            return load_pcm(path)
+    offset, size = wav_data_offset(path)
+    file_bytes = os.path.getsize(path)
+    # Streamed WAVs can carry a placeholder data size
+    count = min(size, file_bytes - offset) // 2
+    samples = np.memmap(path, dtype=np.int16, mode='r', offset=offset, shape=(count,))
+    return samples.astype(np.float32) / 32768.0
+
+
+def write_wav(path: str, samples: np.ndarray, sample_rate: int = SAMPLE_RATE):
+    """Write float32 samples as 16-bit mono WAV (no codec involved)."""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2')
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+
+
+def youtube_stream_source(youtube_link: str):
+    """Resolve the smallest adequate audio-only stream URL (and its HTTP headers) for a video."""
+    import yt_dlp
+    from download_manager import audio_format
+
+    with yt_dlp.YoutubeDL({'format': audio_format(), 'quiet': True}) as ydl:
+        info = ydl.extract_info(youtube_link, download=False)
+    return info['url'], info.get('http_headers') or {}
+
+
+def load_youtube_pcm(youtube_link: str, **kwargs) -> np.ndarray:
+    """Stream a YouTube video's audio through ffmpeg into a float32 array."""
+    url, headers = youtube_stream_source(youtube_link)
+    return load_pcm(url, headers=headers, **kwargs)
@@ -0,0 +1,416 @@
+"""Headless batch mode: transcribe many YouTube links concurrently.
+
+Caption lookups and audio downloads run on an I/O-bound thread pool, Whisper
+runs on a separately sized process pool, and a bounded queue between the two
+stages keeps downloads from running far ahead of transcription. With
+``--batch-size`` above 1, short videos are instead decoded together in
+shared batches by ``batched_inference.BatchedWhisperScheduler``. Every state
+change is appended to a JSON-lines status file, which is also what lets an
+interrupted run resume where it stopped.
+
+Usage:
+    python batch_transcriber.py links.txt
+    cat links.txt | python batch_transcriber.py --io-workers 16 --cpu-workers 4
+    python batch_transcriber.py shorts.txt --batch-size 8 --max-wait-ms 500
+"""
+import argparse
+import json
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from audio_chunking import init_worker_threads, transcribe_wav_file
+from audio_fingerprint import get_default_fingerprint_store, transcribe_with_reuse
+from audio_stream import read_wav
+from batched_inference import SAMPLE_RATE, BatchedWhisperScheduler
+from processed_store import get_default_store
+from media_cache import get_default_cache, youtube_key
+from caption_provider import get_default_caption_provider
+from transcript_model import Transcript
+from vad import default_aggressiveness, detect_speech, pack_speech, remap_result, vad_report
+from inference_backends import BACKENDS, InferenceConfig
+from instrumentation import Trace, configure_logging, get_metrics, stage, use_trace
+from download_manager import DownloadManager, extract_video_id, get_default_download_manager
+from yt_transcript_extractor import (
+    fetch_caption_transcript, get_youtube_audio, save_transcript_file, create_output_folder
+)
+
+_STOP = object()
+
+
+def read_links(sources: List[str]) -> Iterator[str]:
+    """Yield links from files (``-`` for stdin), skipping blanks and ``#`` comments."""
+    for source in sources or ['-']:
+        handle = sys.stdin if source == '-' else open(source, 'r', encoding='utf-8')
+        try:
+            for line in handle:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield line
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+
+
+def load_completed(status_file: str) -> Set[str]:
+    """Return the video IDs recorded as done in a previous run's status file."""
+    completed = set()
+    if not os.path.exists(status_file):
+        return completed
+    with open(status_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A crash can leave a truncated last line
+                continue
+            if record.get('status') == 'done':
+                completed.add(record['video_id'])
+    return completed
+
+
+class StatusWriter:
+    """Append one JSON object per event to the status file (and optionally stdout)."""
+
+    def __init__(self, path: str, echo: bool = False):
+        self.path = path
+        self.echo = echo
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, video_id: str, link: str, stage: str, status: str, **fields):
+        record = {'ts': time.time(), 'video_id': video_id, 'link': link,
+                  'stage': stage, 'status': status}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+            if self.echo:
+                print(line, flush=True)
+
+    def close(self):
+        self._file.close()
+
+
+def _private_copy(path: str, directory: str, name: str) -> str:
+    """Hard-link (or, across file systems, copy) ``path`` to ``directory/name``.
+
+    The cache may evict or replace its file later; the link keeps this copy intact.
+    """
+    private = os.path.join(directory, name + os.path.splitext(path)[1])
+    try:
+        os.link(path, private)
+    except OSError:
+        shutil.copyfile(path, private)
+    return private
+
+
+def _transcribe_batched(scheduler: BatchedWhisperScheduler, samples, vad_aggressiveness: Optional[int] = None) -> Dict:
+    """Transcribe one clip through the shared scheduler, packing out silence first when VAD is on."""
+    if vad_aggressiveness is None:
+        return scheduler.transcribe(samples)
+    regions = detect_speech(samples, vad_aggressiveness)
+    if not regions:
+        result = scheduler.transcribe(samples)
+    else:
+        packed, time_map = pack_speech(samples, regions)
+        result = remap_result(scheduler.transcribe(packed), time_map)
+    return dict(result, vad=vad_report(regions, len(samples)))
+
+
+class BatchTranscriber:
+    def __init__(
+        self,
+        io_workers: int = 8,
+        cpu_workers: Optional[int] = None,
+        queue_size: int = 4,
+        output_dir: str = "batch_output",
+        status_file: str = "batch_status.jsonl",
+        model_size: Optional[str] = None,
+        resume: bool = True,
+        echo: bool = False,
+        vad_aggressiveness: Optional[int] = None,
+        backend: Optional[str] = None,
+        threads: Optional[int] = None,
+        batch_size: int = 1,
+        max_wait_ms: float = 500,
+        batch_max_seconds: float = 120,
+        max_downloads: Optional[int] = None,
+        rate_limit: Optional[str] = None,
+        fingerprints="env",
+    ):
+        cpu_count = os.cpu_count() or 1
+        self.config = InferenceConfig.from_env(model_size=model_size, backend=backend, threads=threads)
+        self.io_workers = io_workers
+        self.cpu_workers = cpu_workers or max(1, cpu_count // 2)
+        # threads is the inference thread count per Whisper process
+        self.torch_threads = self.config.threads or max(1, cpu_count // self.cpu_workers)
+        self.queue_size = queue_size
+        self.output_dir = output_dir
+        self.status_file = status_file
+        self.model_size = self.config.model_size
+        self.resume = resume
+        self.echo = echo
+        # Silence/music skipping before Whisper (0-3, None disables)
+        self.vad_aggressiveness = vad_aggressiveness
+        # batch_size > 1 sends clips up to batch_max_seconds long through one shared batching model
+        self.batch_size = batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batch_max_seconds = batch_max_seconds
+        self.batch_stats = None
+        # Downloads share one manager: at most max_downloads in flight within rate_limit in total
+        default = get_default_download_manager()
+        self.downloader = DownloadManager(
+            max_concurrent=max_downloads or default.max_concurrent,
+            rate_limit=rate_limit or default.rate_limit,
+            fragments=default.fragments, min_abr_kbps=default.min_abr_kbps, work_dir=default.work_dir,
+        )
+        self.captions = get_default_caption_provider()
+        # Re-uploads and clips of videos transcribed before reuse their segments (None disables)
+        self.fingerprints = get_default_fingerprint_store() if fingerprints == "env" else fingerprints
+
+    def run(self, links: Iterable[str]) -> Dict[str, int]:
+        """Process every link and return counts per final status."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        completed = load_completed(self.status_file) if self.resume else set()
+        store = get_default_store()
+        cache = get_default_cache()
+        status = StatusWriter(self.status_file, echo=self.echo)
+        counts = {'done': 0, 'failed': 0, 'skipped': 0}
+        counts_lock = threading.Lock()
+        batching = self.batch_size > 1
+        # Enough downloaded clips must be waiting for a batch to fill
+        transcribe_queue: "queue.Queue" = queue.Queue(
+            maxsize=max(self.queue_size, self.batch_size) if batching else self.queue_size)
+
+        # Private copies of downloaded audio between the fetch and transcription stages
+        work_dir = tempfile.mkdtemp(prefix='batch_transcriber-')
+
+        def finish(kind):
+            with counts_lock:
+                counts[kind] += 1
+
+        def fetch(link):
+            video_id = link
+            audio_path = None
+            # The trace follows the video onto a transcription thread when it is queued
+            active = Trace(link)
+            with use_trace(active):
+                try:
+                    video_id = active.video_id = extract_video_id(link)
+                    stored = store.get_status(video_id) if self.resume else None
+                    if video_id in completed or (stored and (stored.captions_done or stored.whisper_done)):
+                        status.write(video_id, link, 'fetch', 'skipped')
+                        finish('skipped')
+                        return
+                    output_folder = create_output_folder(video_id, base_dir=self.output_dir)
+
+                    start = time.perf_counter()
+                    transcript = fetch_caption_transcript(link, provider=self.captions)
+                    if transcript is not None:
+                        output_file = save_transcript_file(output_folder, video_id, None, link, transcript)
+                        store.update_status(video_id, captions_done=True, artifacts={'transcript': output_file})
+                        status.write(video_id, link, 'captions', 'done', source='captions',
+                                     output_file=output_file, seconds=time.perf_counter() - start)
+                        finish('done')
+                        active.finish()
+                        return
+
+                    cached = cache.get_transcript(youtube_key(video_id), self.config.cache_tag)
+                    if cached is not None:
+                        save_whisper_result(link, video_id, output_folder, cached, 'cache', 0.0)
+                        active.finish()
+                        return
+
+                    start = time.perf_counter()
+                    # The cached WAV can be evicted or replaced while the video waits in the queue
+                    audio_path = _private_copy(get_youtube_audio(link, cache=cache, video_id=video_id,
+                                                                 downloader=self.downloader), work_dir, video_id)
+                    status.write(video_id, link, 'download', 'ok', seconds=time.perf_counter() - start,
+                                 bytes=os.path.getsize(audio_path))
+                    # Blocks while the transcription stage is saturated
+                    with stage('queue_wait'):
+                        transcribe_queue.put((link, video_id, output_folder, audio_path, active))
+                    audio_path = None  # the transcription stage deletes it now
+                    status.write(video_id, link, 'download', 'queued', queue_depth=transcribe_queue.qsize())
+                except Exception as e:
+                    if audio_path is not None and os.path.exists(audio_path):
+                        os.remove(audio_path)
+                    status.write(video_id, link, 'fetch', 'failed', error=str(e))
+                    finish('failed')
+                    active.finish(e)
+
+        def save_whisper_result(link, video_id, output_folder, result, source, seconds):
+            output_file = save_transcript_file(output_folder, video_id, None, link,
+                                               Transcript.from_whisper(result), result['language'])
+            store.update_status(video_id, whisper_done=True, artifacts={'transcript': output_file})
+            extra = {'vad_skipped_s': result['vad']['skipped_s']} if 'vad' in result else {}
+            if 'reuse' in result:
+                extra.update(reused_s=result['reuse']['reused_s'],
+                             reused_from=sorted({source['key'] for source in result['reuse']['sources']}))
+            status.write(video_id, link, 'transcribe', 'done', source=source,
+                         language=result['language'], output_file=output_file, seconds=seconds, **extra)
+            finish('done')
+
+        def transcribe_worker(pool, scheduler):
+            while True:
+                item = transcribe_queue.get()
+                if item is _STOP:
+                    return
+                link, video_id, output_folder, audio_path, active = item
+                start = time.perf_counter()
+                with use_trace(active):
+                    try:
+                        need_samples = scheduler is not None or self.fingerprints is not None
+                        samples = read_wav(audio_path) if need_samples else None
+                        plan = None
+                        if self.fingerprints is not None:
+                            plan = self.fingerprints.plan(samples, youtube_key(video_id), self.config.cache_tag)
+                        batched = scheduler is not None and len(samples) <= self.batch_max_seconds * SAMPLE_RATE
+                        if plan is not None and plan.matches and not plan.regions:
+                            # Everything was heard before (a re-upload): no inference at all
+                            result = plan.complete(None)
+                        else:
+                            with stage('inference', model=self.config.cache_tag, batched=batched) as span:
+                                if batched:
+                                    transcribe = partial(_transcribe_batched, scheduler,
+                                                         vad_aggressiveness=self.vad_aggressiveness)
+                                    result = transcribe_with_reuse(samples, transcribe, plan)
+                                else:
+                                    regions = plan.regions if plan is not None and plan.matches else None
+                                    result = pool.submit(transcribe_wav_file, audio_path, self.config,
+                                                         self.vad_aggressiveness, regions).result()
+                                    if plan is not None:
+                                        result = plan.complete(result)
+                                if 'vad' in result:
+                                    span['vad_skipped_s'] = result['vad']['skipped_s']
+                        cache.put_transcript(youtube_key(video_id), self.config.cache_tag, result)
+                        save_whisper_result(link, video_id, output_folder, result, 'whisper',
+                                            time.perf_counter() - start)
+                        active.finish()
+                    except Exception as e:
+                        status.write(video_id, link, 'transcribe', 'failed', error=str(e))
+                        finish('failed')
+                        active.finish(e)
+                    finally:
+                        os.remove(audio_path)
+
+        scheduler = None
+        if batching:
+            scheduler = BatchedWhisperScheduler(self.config.model_size, self.config.device, self.config.precision,
+                                                max_batch_size=self.batch_size,
+                                                max_wait_s=self.max_wait_ms / 1000)
+            self.batch_stats = scheduler.stats
+        try:
+            with ProcessPoolExecutor(max_workers=self.cpu_workers, initializer=init_worker_threads,
+                                     initargs=(self.torch_threads,)) as cpu_pool:
+                # Each consumer holds one clip in flight, so batching needs at least batch_size of them
+                n_consumers = max(self.cpu_workers, self.batch_size) if batching else self.cpu_workers
+                consumers = [threading.Thread(target=transcribe_worker, args=(cpu_pool, scheduler), daemon=True)
+                             for _ in range(n_consumers)]
+                for consumer in consumers:
+                    consumer.start()
+
+                with ThreadPoolExecutor(max_workers=self.io_workers) as io_pool:
+                    seen = set()
+                    for link in links:
+                        # Different links to one video would download to the same files at once
+                        try:
+                            identity = extract_video_id(link)
+                        except ValueError:
+                            identity = link  # still submitted, so it is reported as failed
+                        if identity in seen:
+                            continue
+                        seen.add(identity)
+                        io_pool.submit(fetch, link)
+
+                for _ in consumers:
+                    transcribe_queue.put(_STOP)
+                for consumer in consumers:
+                    consumer.join()
+        finally:
+            if scheduler is not None:
+                scheduler.close()
+            status.close()
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe a list of YouTube links concurrently.")
+    parser.add_argument('inputs', nargs='*', help="Files with one link per line ('-' or none for stdin)")
+    parser.add_argument('--io-workers', type=int, default=8, help="Concurrent caption fetches/downloads")
+    parser.add_argument('--cpu-workers', type=int, default=None, help="Concurrent Whisper processes")
+    parser.add_argument('--queue-size', type=int, default=4,
+                        help="Downloaded files allowed to wait for transcription")
+    parser.add_argument('--output-dir', default="batch_output")
+    parser.add_argument('--status-file', default="batch_status.jsonl")
+    parser.add_argument('--model', default=None, help="Whisper model size (default: WHISPER_MODEL or base)")
+    parser.add_argument('--backend', default=None, choices=BACKENDS,
+                        help="Inference backend (default: WHISPER_BACKEND or whisper)")
+    parser.add_argument('--threads', type=int, default=None, help="Inference threads per Whisper process")
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help="Decode windows from up to this many short videos together (1 disables batching)")
+    parser.add_argument('--max-wait-ms', type=float, default=500,
+                        help="Longest a window waits for its batch to fill")
+    parser.add_argument('--batch-max-seconds', type=float, default=120,
+                        help="Longer videos skip batching and use the Whisper process pool")
+    parser.add_argument('--no-resume', action='store_true', help="Reprocess videos already marked done")
+    parser.add_argument('--echo', action='store_true', help="Also print status lines to stdout")
+    parser.add_argument('--max-downloads', type=int, default=None,
+                        help="Concurrent audio downloads (default: DOWNLOAD_MAX_CONCURRENT or 4)")
+    parser.add_argument('--rate-limit', default=None,
+                        help="Total download bandwidth, e.g. 5M (default: DOWNLOAD_RATE_LIMIT, unlimited)")
+    parser.add_argument('--metrics-file', default=None,
+                        help="Write Prometheus-format metrics here when the batch ends")
+    parser.add_argument('--vad', default=None, choices=('0', '1', '2', '3', 'off'),
+                        help="Skip silence/music before Whisper: 0-3 or 'off' (default: VAD_AGGRESSIVENESS)")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    batch = BatchTranscriber(
+        io_workers=args.io_workers,
+        cpu_workers=args.cpu_workers,
+        queue_size=args.queue_size,
+        output_dir=args.output_dir,
+        status_file=args.status_file,
+        model_size=args.model,
+        resume=not args.no_resume,
+        echo=args.echo,
+        vad_aggressiveness=default_aggressiveness() if args.vad is None else
+        (None if args.vad == 'off' else int(args.vad)),
+        backend=args.backend,
+        threads=args.threads,
+        batch_size=args.batch_size,
+        max_wait_ms=args.max_wait_ms,
+        batch_max_seconds=args.batch_max_seconds,
+        max_downloads=args.max_downloads,
+        rate_limit=args.rate_limit,
+    )
+    counts = batch.run(read_links(args.inputs))
+    if args.metrics_file:
+        get_metrics().write(args.metrics_file)
+    print(f"Batch complete: {counts['done']} done, {counts['failed']} failed, {counts['skipped']} skipped")
+    stats = batch.captions.stats
+    print(f"Caption hit rate: {stats.hits}/{stats.lookups} ({stats.hit_rate:.0%}), {dict(stats.kinds)}")
+    downloads = batch.downloader.stats
+    if downloads.downloads:
+        print(f"Downloads: {downloads.downloads} ({downloads.resumed} resumed, {downloads.failures} failed), "
+              f"{downloads.bytes / 1024 ** 2:.1f} MB at {downloads.throughput_bps / 1024 ** 2:.2f} MB/s per download")
+    if batch.batch_stats is not None and batch.batch_stats.batches:
+        b = batch.batch_stats
+        print(f"Batched inference: {b.videos} videos, {b.windows} windows in {b.batches} batches "
+              f"(mean size {b.mean_batch_size:.1f}), {b.busy_seconds:.1f}s busy")
+    return 0 if counts['failed'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""Batch Whisper inference across several videos at once.
+
+Short videos (Shorts, clip libraries) are dominated by per-call overhead
+when each one is decoded on its own with batch size 1. The scheduler here
+cuts every submitted video into 30-second windows, computes their log-mel
+spectrograms on the submitting thread, and queues them. A single inference
+thread then encodes and decodes windows from different videos together, up
+to ``max_batch_size`` at a time, waiting at most ``max_wait_s`` for a batch
+to fill. The decoded tokens of each window are routed back to the video
+that owns it, and a video's Future resolves once all of its windows are in.
+
+Windows are fixed 30-second cuts rather than Whisper's timestamp-driven
+seek, so the scheduler is meant for short clips; callers send long inputs
+through ``audio_chunking.transcribe_chunked`` instead.
+"""
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from model_registry import DEFAULT_PRECISION, get_model
+
+SAMPLE_RATE = 16000
+WINDOW_SAMPLES = 30 * SAMPLE_RATE
+SECONDS_PER_TIMESTAMP = 0.02
+
+# Whisper's own fallback thresholds (see whisper.transcribe)
+TEMPERATURE_FALLBACK = (0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+
+@dataclass
+class SchedulerStats:
+    videos: int = 0
+    windows: int = 0
+    batches: int = 0
+    fallback_windows: int = 0
+    busy_seconds: float = 0.0
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.windows / self.batches if self.batches else 0.0
+
+
+@dataclass
+class _Job:
+    future: Future
+    n_windows: int
+    results: List = field(default_factory=list)
+    remaining: int = 0
+
+
+@dataclass
+class _Window:
+    job: _Job
+    index: int
+    mel: object
+    length_s: float
+    queued_at: float
+
+
+def _compression_ratio(text: str) -> float:
+    data = text.encode('utf-8')
+    return len(data) / len(zlib.compress(data)) if data else 0.0
+
+
+class BatchedWhisperScheduler:
+    """Runs Whisper on windows from many videos in shared batches.
+
+    ``submit(samples)`` returns a Future with a Whisper-shaped
+    ``{'text', 'segments', 'language'}`` result. Use as a context manager,
+    or call ``close()`` to stop the inference thread.
+    """
+
+    def __init__(self, model_size: str = "base", device: str = "cpu", precision: str = DEFAULT_PRECISION,
+                 max_batch_size: int = 8, max_wait_s: float = 0.5, language: Optional[str] = None):
+        if precision.startswith('ct2-'):
+            raise ValueError("batched inference needs a PyTorch Whisper backend")
+        self.model_size = model_size
+        self.device = device
+        self.precision = precision
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_s
+        self.language = language
+        self.stats = SchedulerStats()
+        self._stats_lock = threading.Lock()
+        self._windows: "queue.Queue[Optional[_Window]]" = queue.Queue()
+        self._model = get_model(model_size, device=device, precision=precision)
+        self._thread = threading.Thread(target=self._loop, name='whisper-batcher', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def submit(self, samples: np.ndarray) -> Future:
+        """Queue a float32 16 kHz clip for transcription."""
+        import torch
+        import whisper
+
+        future = Future()
+        starts = list(range(0, max(len(samples), 1), WINDOW_SAMPLES))
+        job = _Job(future, len(starts), [None] * len(starts), len(starts))
+        with self._stats_lock:
+            self.stats.videos += 1
+        now = time.monotonic()
+        for index, start in enumerate(starts):
+            window = samples[start:start + WINDOW_SAMPLES]
+            audio = whisper.pad_or_trim(torch.from_numpy(np.ascontiguousarray(window, dtype=np.float32)))
+            mel = whisper.log_mel_spectrogram(audio, n_mels=self._model.dims.n_mels)
+            self._windows.put(_Window(job, index, mel, len(window) / SAMPLE_RATE, now))
+        return future
+
+    def transcribe(self, samples: np.ndarray) -> Dict:
+        """Blocking ``submit``; other threads' clips share the batches meanwhile."""
+        return self.submit(samples).result()
+
+    def close(self):
+        self._windows.put(None)
+        self._thread.join()
+
+    def _next_batch(self) -> Optional[List[_Window]]:
+        first = self._windows.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = first.queued_at + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                window = self._windows.get(timeout=max(remaining, 0)) if remaining > 0 else self._windows.get_nowait()
+            except queue.Empty:
+                break
+            if window is None:
+                # Finish what is queued, then stop
+                self._windows.put(None)
+                break
+            batch.append(window)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            start = time.perf_counter()
+            try:
+                results = self._decode(batch)
+            except Exception as e:
+                for window in batch:
+                    if not window.job.future.done():
+                        window.job.future.set_exception(e)
+                continue
+            finally:
+                self.stats.busy_seconds += time.perf_counter() - start
+            self.stats.batches += 1
+            self.stats.windows += len(batch)
+            for window, result in zip(batch, results):
+                job = window.job
+                if job.future.done():
+                    continue
+                job.results[window.index] = (window, result)
+                job.remaining -= 1
+                if job.remaining == 0:
+                    job.future.set_result(self._assemble(job))
+
+    def _decode(self, batch: List[_Window]):
+        import torch
+        import whisper
+
+        mel = torch.stack([window.mel for window in batch]).to(self._model.device)
+        fp16 = self.precision == 'fp16'
+        options = whisper.DecodingOptions(task='transcribe', language=self.language, fp16=fp16,
+                                          without_timestamps=False)
+        results = self._model.decode(mel, options)
+
+        # Retry windows that look like hallucination loops at higher temperatures, as transcribe() does
+        for temperature in TEMPERATURE_FALLBACK:
+            retry = [i for i, r in enumerate(results) if self._needs_fallback(r)]
+            if not retry:
+                break
+            self.stats.fallback_windows += len(retry)
+            retry_options = whisper.DecodingOptions(task='transcribe', language=self.language, fp16=fp16,
+                                                    without_timestamps=False, temperature=temperature)
+            for i, result in zip(retry, self._model.decode(mel[retry], retry_options)):
+                results[i] = result
+        return results
+
+    @staticmethod
+    def _needs_fallback(result) -> bool:
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+            return False
+        return (_compression_ratio(result.text) > COMPRESSION_RATIO_THRESHOLD
+                or result.avg_logprob < LOGPROB_THRESHOLD)
+
+    def _tokenizer(self, language: Optional[str]):
+        from whisper.tokenizer import get_tokenizer
+
+        return get_tokenizer(self._model.is_multilingual, num_languages=self._model.num_languages,
+                             language=language, task='transcribe')
+
+    def _assemble(self, job: _Job) -> Dict:
+        """Turn a video's per-window decoding results into one Whisper-shaped result."""
+        segments = []
+        languages: Dict[str, float] = {}
+        for window, result in job.results:
+            offset = window.index * WINDOW_SAMPLES / SAMPLE_RATE
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+                continue
+            languages[result.language] = languages.get(result.language, 0.0) + window.length_s
+            tokenizer = self._tokenizer(result.language)
+            for start, end, tokens in self._split_timestamps(result.tokens, tokenizer, window.length_s):
+                text = tokenizer.decode(tokens)
+                if not text.strip():
+                    continue
+                segments.append({
+                    'id': len(segments), 'seek': int(offset * 100),
+                    'start': offset + start, 'end': offset + min(end, window.length_s), 'text': text,
+                    'tokens': tokens, 'temperature': result.temperature, 'avg_logprob': result.avg_logprob,
+                    'compression_ratio': result.compression_ratio, 'no_speech_prob': result.no_speech_prob,
+                })
+        language = max(languages, key=languages.get) if languages else None
+        return {'text': "".join(seg['text'] for seg in segments), 'segments': segments, 'language': language}
+
+    @staticmethod
+    def _split_timestamps(tokens: List[int], tokenizer, window_s: float):
+        """Yield ``(start, end, text_tokens)`` between timestamp token pairs."""
+        timestamp_begin = tokenizer.timestamp_begin
+        start = 0.0
+        text_tokens: List[int] = []
+        for token in tokens:
+            if token >= timestamp_begin:
+                time_s = (token - timestamp_begin) * SECONDS_PER_TIMESTAMP
+                if text_tokens:
+                    yield start, time_s, text_tokens
+                    text_tokens = []
+                start = time_s
+            else:
+                text_tokens.append(token)
+        if text_tokens:
+            yield start, window_s, text_tokens
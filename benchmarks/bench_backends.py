@@ -0,0 +1,156 @@
+"""Compare Whisper inference backends by speed and accuracy on a local audio set.
+
+Usage:
+    python benchmarks/bench_backends.py base:whisper base:whisper-int8 small:ctranslate2 \\
+        [--audio-dir benchmarks/audio_set] [--threads 4] [--per-file]
+
+The audio set is a directory of audio files (anything ffmpeg reads), each
+with a reference transcript of the same name and a ``.txt`` extension, e.g.
+``talk1.wav`` + ``talk1.txt``. Files without a reference are timed but left
+out of the word error rate.
+
+Each ``size:backend`` setting runs in its own process, so model load time and
+peak RSS are per setting. Reported per setting: load time, real-time factor
+(transcription seconds per audio second, lower is faster) and corpus word
+error rate. Results are printed as JSON.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import re
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_AUDIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'audio_set')
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.m4a', '.flac', '.ogg', '.webm', '.mp4')
+
+_WORD_RE = re.compile(r"[\w']+")
+
+
+def normalize_words(text):
+    return _WORD_RE.findall(text.lower())
+
+
+def word_edits(reference, hypothesis):
+    """Levenshtein distance between two word lists (substitutions + insertions + deletions)."""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1]
+
+
+def word_error_rate(reference, hypothesis):
+    ref = normalize_words(reference)
+    return word_edits(ref, normalize_words(hypothesis)) / len(ref) if ref else 0.0
+
+
+def find_audio_set(audio_dir):
+    """Return ``(audio_path, reference_text_or_None)`` pairs sorted by name."""
+    items = []
+    for name in sorted(os.listdir(audio_dir)):
+        base, ext = os.path.splitext(name)
+        if ext.lower() not in AUDIO_EXTENSIONS:
+            continue
+        reference_path = os.path.join(audio_dir, base + '.txt')
+        reference = None
+        if os.path.exists(reference_path):
+            with open(reference_path, 'r', encoding='utf-8') as f:
+                reference = f.read()
+        items.append((os.path.join(audio_dir, name), reference))
+    return items
+
+
+def _run_setting(setting, items, threads, language, results):
+    from audio_stream import load_pcm
+    from inference_backends import InferenceConfig, load_model, set_threads
+
+    size, backend = setting.split(':', 1)
+    config = InferenceConfig(model_size=size, backend=backend, threads=threads)
+    set_threads(threads)
+    start = time.perf_counter()
+    model = load_model(config.model_size, config.device, config.precision)
+    load_seconds = time.perf_counter() - start
+
+    files = []
+    for path, reference in items:
+        samples = load_pcm(path)
+        start = time.perf_counter()
+        result = model.transcribe(samples, fp16=False, language=language)
+        seconds = time.perf_counter() - start
+        entry = {'file': os.path.basename(path), 'audio_seconds': len(samples) / 16000, 'seconds': seconds}
+        if reference is not None:
+            ref_words = normalize_words(reference)
+            entry['reference_words'] = len(ref_words)
+            entry['edits'] = word_edits(ref_words, normalize_words(result['text']))
+        files.append(entry)
+
+    results.put({
+        'setting': setting,
+        'load_seconds': load_seconds,
+        'files': files,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+
+
+def run(setting, items, threads, language):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_setting, args=(setting, items, threads, language, results))
+    process.start()
+    while True:
+        try:
+            report = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                raise RuntimeError(f"{setting} failed with exit code {process.exitcode}")
+    process.join()
+    files = report['files']
+    audio_seconds = sum(f['audio_seconds'] for f in files)
+    seconds = sum(f['seconds'] for f in files)
+    ref_words = sum(f.get('reference_words', 0) for f in files)
+    report.update({
+        'threads': threads,
+        'audio_seconds': round(audio_seconds, 2),
+        'transcribe_seconds': round(seconds, 2),
+        'realtime_factor': round(seconds / audio_seconds, 4) if audio_seconds else None,
+        'wer': round(sum(f.get('edits', 0) for f in files) / ref_words, 4) if ref_words else None,
+    })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('settings', nargs='*', default=['base:whisper', 'base:whisper-int8'],
+                        help="size:backend pairs, backend one of whisper, whisper-int8, ctranslate2")
+    parser.add_argument('--audio-dir', default=DEFAULT_AUDIO_DIR)
+    parser.add_argument('--threads', type=int, default=None, help="Inference threads (default: all cores)")
+    parser.add_argument('--language', default=None, help="Skip language detection, e.g. 'en'")
+    parser.add_argument('--per-file', action='store_true', help="Keep per-file timings in the output")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.audio_dir):
+        parser.error(f"audio set not found: {args.audio_dir}")
+    items = find_audio_set(args.audio_dir)
+    if not items:
+        parser.error(f"no audio files in {args.audio_dir}")
+
+    report = []
+    for setting in args.settings:
+        result = run(setting, items, args.threads, args.language)
+        if not args.per_file:
+            del result['files']
+        report.append(result)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
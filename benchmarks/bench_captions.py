@@ -0,0 +1,94 @@
+"""Check caption track selection against recorded caption responses.
+
+Usage:
+    python benchmarks/bench_captions.py [--fixture benchmarks/fixtures/captions.json] [--repeat 200]
+
+Replays ``--fixture`` (the format ``python caption_provider.py --record``
+writes) through ``CaptionProvider`` under several preference settings and
+checks the fallback order: a manual track in a preferred language, then an
+auto-generated one, then a translation into the first preferred language,
+and no captions when none of them is allowed. Also times ``prefetch`` and
+``fetch`` over the fixture. Prints a JSON report; exits with status 1 when
+a video gets the wrong track. Needs no network access.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from caption_provider import GENERATED, MANUAL, TRANSLATED, CaptionProvider, FixtureCaptionSource  # noqa: E402
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'captions.json')
+
+# (provider settings, video ID, expected (kind, language, source language) or None)
+CASES = [
+    ({}, 'manualEn001', (MANUAL, 'en', None)),
+    ({}, 'autoOnly002', (GENERATED, 'en', None)),
+    ({}, 'germanMan03', (TRANSLATED, 'en', 'de')),
+    ({}, 'genTransl04', (TRANSLATED, 'en', 'fr')),
+    ({}, 'noCaption05', None),
+    ({'languages': ['de', 'en']}, 'germanMan03', (MANUAL, 'de', None)),
+    ({'languages': ['de', 'en']}, 'manualEn001', (MANUAL, 'en', None)),
+    ({'allow_generated': False}, 'autoOnly002', None),
+    ({'allow_generated': False}, 'genTransl04', None),
+    ({'allow_generated': False}, 'germanMan03', (TRANSLATED, 'en', 'de')),
+    ({'allow_translated': False}, 'germanMan03', None),
+]
+
+
+def check(source):
+    results, failures = [], []
+    for settings, video_id, expected in CASES:
+        provider = CaptionProvider(source, **settings)
+        available = provider.available(video_id)
+        captions = provider.fetch(video_id)
+        got = None
+        if captions is not None:
+            got = (captions.kind, captions.language_code, captions.source_language)
+            if not captions.transcript.text.strip():
+                failures.append(f"{video_id} {settings}: empty transcript")
+        results.append({'video_id': video_id, 'settings': settings, 'got': got})
+        if got != expected:
+            failures.append(f"{video_id} {settings}: expected {expected}, got {got}")
+        if available != (expected[0] if expected else None):
+            failures.append(f"{video_id} {settings}: available() says {available}")
+    return results, failures
+
+
+def timed(source, repeat):
+    video_ids = list(source.fixtures)
+    provider = CaptionProvider(source)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        provider.prefetch(video_ids)
+    prefetch_s = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for video_id in video_ids:
+            provider.fetch(video_id)
+    fetch_s = time.perf_counter() - start
+    lookups = repeat * len(video_ids)
+    return {'prefetch_us_per_video': round(prefetch_s / lookups * 1e6, 1),
+            'fetch_us_per_video': round(fetch_s / lookups * 1e6, 1),
+            'hit_rate': round(provider.stats.hit_rate, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixture', default=DEFAULT_FIXTURE)
+    parser.add_argument('--repeat', type=int, default=200, help="Passes over the fixture for the timings")
+    args = parser.parse_args()
+
+    source = FixtureCaptionSource(args.fixture)
+    results, failures = check(source)
+    report = {'videos': len(source.fixtures), 'cases': results, 'timing': timed(source, args.repeat),
+              'failures': failures}
+    print(json.dumps(report, indent=2))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
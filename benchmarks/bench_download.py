@@ -0,0 +1,133 @@
+"""Exercise the download manager against a local media server.
+
+Usage:
+    python benchmarks/bench_download.py [--files 8] [--size-mb 4] [--max-concurrent 4] \\
+        [--rate-limit 8M] [--server-rate 4M] [--drop-after 1000000]
+
+Serves ``--files`` random files from ``fake_media_server``, downloads them all
+at once through one ``DownloadManager`` and reports per-download throughput
+and the aggregate rate as JSON. Checks that every file arrives intact, that
+no more than ``--max-concurrent`` downloads overlapped, that the aggregate
+rate stays within ``--rate-limit``, and that downloads cut off by the server
+(``--drop-after``) and a ``.part`` file left by an earlier run both resume
+with a Range request instead of starting over. Exits with status 1 when a
+check fails. Needs yt_dlp but no network.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from download_manager import DownloadManager, parse_rate  # noqa: E402
+from fake_media_server import FakeMediaServer  # noqa: E402
+
+# Allowed overshoot of the rate cap (yt_dlp throttles on averages)
+RATE_TOLERANCE = 1.15
+
+
+def video_id(index):
+    return f"bench{index:06d}"
+
+
+def run(args):
+    size = int(args.size_mb * 1024 * 1024)
+    files = {f"{video_id(i)}.webm": os.urandom(size) for i in range(args.files)}
+    server = FakeMediaServer(files, bytes_per_second=parse_rate(args.server_rate),
+                             drop_after=args.drop_after).start()
+    report = {'files': args.files, 'size_mb': args.size_mb, 'max_concurrent': args.max_concurrent,
+              'rate_limit': args.rate_limit, 'server_rate': args.server_rate}
+    failures = []
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            # A .part file as an interrupted earlier run would leave it
+            leftover = f"{video_id(0)}.webm"
+            with open(os.path.join(work_dir, leftover + '.part'), 'wb') as f:
+                f.write(files[leftover][:size // 3])
+
+            manager = DownloadManager(max_concurrent=args.max_concurrent, rate_limit=args.rate_limit,
+                                      work_dir=work_dir)
+            active = [0, 0]
+            lock = threading.Lock()
+
+            def fetch(index):
+                # Count overlap from the manager's point of view (inside its slot) via progress reports
+                seen = [False]
+
+                def progress(done, fraction):
+                    if not seen[0]:
+                        seen[0] = True
+                        with lock:
+                            active[0] += 1
+                            active[1] = max(active[1], active[0])
+
+                try:
+                    return manager.download(f"{server.base_url}/{video_id(index)}.webm",
+                                            video_id=video_id(index), progress=progress)
+                finally:
+                    if seen[0]:
+                        with lock:
+                            active[0] -= 1
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.files) as pool:
+                results = list(pool.map(fetch, range(args.files)))
+            wall = time.perf_counter() - start
+
+            for result in results:
+                with open(result.path, 'rb') as f:
+                    if f.read() != files[f"{result.video_id}.webm"]:
+                        failures.append(f"{result.video_id}: content mismatch")
+            fetched = sum(r.bytes - r.resumed_from for r in results)
+            report.update({
+                'wall_seconds': round(wall, 3),
+                'aggregate_mb_per_s': round(fetched / wall / 1024 ** 2, 3),
+                'max_overlap': active[1],
+                'resumed': manager.stats.resumed,
+                'downloads': [{'video_id': r.video_id, 'seconds': round(r.seconds, 3),
+                               'mb_per_s': round(r.throughput_bps / 1024 ** 2, 3),
+                               'resumed_from': r.resumed_from} for r in results],
+            })
+            cap = parse_rate(args.rate_limit)
+            if cap and fetched / wall > cap * RATE_TOLERANCE:
+                failures.append(f"aggregate rate {fetched / wall:.0f} B/s over cap {cap:.0f} B/s")
+            if active[1] > args.max_concurrent:
+                failures.append(f"{active[1]} downloads overlapped (max {args.max_concurrent})")
+            if results[0].resumed_from != size // 3:
+                failures.append("leftover .part file was not resumed")
+    finally:
+        server.stop()
+
+    ranges = [r['range'] for r in server.requests if r['range']]
+    resumed_ranges = [r for r in ranges if not r.startswith('bytes=0-')]
+    report['resumed_requests'] = len(resumed_ranges)
+    if args.drop_after and len(resumed_ranges) < args.files:
+        failures.append(f"only {len(resumed_ranges)} of {args.files} dropped downloads resumed with a Range")
+    report['failures'] = failures
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=8)
+    parser.add_argument('--size-mb', type=float, default=4)
+    parser.add_argument('--max-concurrent', type=int, default=4)
+    parser.add_argument('--rate-limit', default='8M', help="Total bandwidth cap for the manager")
+    parser.add_argument('--server-rate', default=None, help="Per-response rate of the fake server")
+    parser.add_argument('--drop-after', type=int, default=1000000,
+                        help="Cut each file's first transfer after this many bytes (0 disables)")
+    args = parser.parse_args()
+    args.drop_after = args.drop_after or None
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    return 1 if report['failures'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
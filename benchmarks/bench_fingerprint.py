@@ -0,0 +1,144 @@
+"""Check audio fingerprint matching on synthetic re-uploads and clips.
+
+Usage:
+    python benchmarks/bench_fingerprint.py [--library 20] [--minutes 5] [--queries 10]
+
+Fills a ``FingerprintStore`` with ``--library`` recordings of synthetic
+speech-like audio (harmonic syllables with moving formants and pauses),
+then asks for reuse plans for three kinds of new audio: re-uploads (the
+whole recording, re-encoded, behind a short new intro), clips (a random
+stretch of a recording, re-encoded, followed by new audio) and unrelated
+recordings. Reports fingerprinting speed, lookup latency, store size and
+how much of each query was found, as JSON. Exits with status 1 when a copy
+is missed, lands at the wrong offset, or unrelated audio matches anything.
+Needs only NumPy.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_fingerprint import FingerprintStore, fingerprint  # noqa: E402
+
+SAMPLE_RATE = 16000
+MODEL = 'bench'
+# A copy must be found for at least this share of its length, within OFFSET_TOLERANCE_S
+MIN_COVERAGE = 0.9
+OFFSET_TOLERANCE_S = 0.1
+
+
+def speechlike(seconds, seed):
+    """Syllables of 80-350 ms: a gliding pitch with three formants, separated by pauses."""
+    rng = np.random.default_rng(seed)
+    out = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    harmonics = np.arange(1, 17)[:, None]
+    pos = 0
+    while pos < len(out):
+        n = min(int(rng.uniform(0.08, 0.35) * SAMPLE_RATE), len(out) - pos)
+        if rng.random() < 0.15 or n < 2:
+            pos += n
+            continue
+        t = np.arange(n) / SAMPLE_RATE
+        f0 = rng.uniform(90, 250) * (1 + 0.1 * rng.choice([-1, 1]) * t / t[-1])
+        formants = rng.uniform([300, 900, 2000], [900, 2200, 3500])
+        # Formant gains at the syllable's mean pitch; the glide itself only moves the phases
+        gains = np.exp(-((f0.mean() * harmonics - formants) / 150) ** 2).sum(axis=1, keepdims=True) + 0.02
+        phases = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE * harmonics
+        out[pos:pos + n] = (gains * np.sin(phases)).sum(axis=0) * np.hanning(n) * rng.uniform(0.02, 0.1)
+        pos += n
+    return out
+
+
+def reencode(samples, seed):
+    """Stand-in for a lossy re-encode: gain change, noise and a gentle low-pass."""
+    rng = np.random.default_rng(seed)
+    noisy = 0.7 * samples + rng.normal(0, 0.002, len(samples)).astype(np.float32)
+    return np.convolve(noisy, np.ones(3) / 3, mode='same').astype(np.float32)
+
+
+def run(args, path):
+    rng = np.random.default_rng(args.seed)
+    store = FingerprintStore(path)
+    length_s = args.minutes * 60
+    library = {}
+    fingerprint_s = audio_s = 0.0
+    for index in range(args.library):
+        samples = speechlike(length_s, 1000 + index)
+        start = time.perf_counter()
+        fp = fingerprint(samples)
+        fingerprint_s += time.perf_counter() - start
+        audio_s += length_s
+        segments = [{'start': t, 'end': t + 5.0, 'text': f" {index}-{t:.0f}"} for t in np.arange(0, length_s, 5.0)]
+        store.add(f"bench:{index}", fp, {'text': '', 'segments': segments, 'language': 'en'}, MODEL)
+        library[index] = samples
+
+    queries, failures, latencies = [], [], []
+    for query in range(args.queries):
+        index = int(rng.integers(args.library))
+        kind = ('reupload', 'clip', 'unrelated')[query % 3]
+        new_s = float(rng.uniform(2, 20))
+        new = speechlike(new_s, 5000 + query)
+        if kind == 'reupload':
+            samples = np.concatenate([new, reencode(library[index], query)])
+            expected = (length_s, -new_s)
+        elif kind == 'clip':
+            clip_s = float(rng.uniform(30, length_s / 2))
+            at = float(rng.uniform(0, length_s - clip_s))
+            clip = library[index][int(at * SAMPLE_RATE):int((at + clip_s) * SAMPLE_RATE)]
+            samples = np.concatenate([reencode(clip, query), new])
+            expected = (clip_s, at)
+        else:
+            samples = speechlike(float(rng.uniform(60, length_s)), 9000 + query)
+            expected = None
+
+        start = time.perf_counter()
+        plan = store.plan(samples, f"query:{query}", MODEL)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {'kind': kind, 'source': index if expected else None, 'audio_s': round(len(samples) / SAMPLE_RATE, 1),
+                 'reused_s': round(plan.reused_s, 1), 'transcribe_s': round(plan.new_s, 1),
+                 'matches': [(m.key, round(m.start_s, 2), round(m.end_s, 2), round(m.offset_s, 3))
+                             for m in plan.matches]}
+        queries.append(found)
+        if expected is None:
+            if plan.matches:
+                failures.append(f"query {query}: unrelated audio matched {plan.matches[0].key}")
+            continue
+        covered = sum(m.end_s - m.start_s for m in plan.matches if m.key == f"bench:{index}")
+        if covered < MIN_COVERAGE * expected[0]:
+            failures.append(f"query {query} ({kind}): found {covered:.1f}s of {expected[0]:.1f}s")
+        if any(abs(m.offset_s - expected[1]) > OFFSET_TOLERANCE_S for m in plan.matches):
+            failures.append(f"query {query} ({kind}): offset off (expected {expected[1]:.2f}s)")
+
+    latencies.sort()
+    return {
+        'library': args.library, 'minutes': args.minutes,
+        'fingerprint_x_realtime': round(audio_s / fingerprint_s, 1),
+        'plan_ms': {'p50': round(latencies[len(latencies) // 2], 1), 'max': round(latencies[-1], 1)},
+        'store': store.stats(),
+        'queries': queries,
+        'failures': failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--library', type=int, default=20, help="Recordings in the store")
+    parser.add_argument('--minutes', type=float, default=5, help="Length of each recording")
+    parser.add_argument('--queries', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        report = run(args, os.path.join(work_dir, 'fingerprints.db'))
+    print(json.dumps(report, indent=2))
+    return 1 if report['failures'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Measure cold-start import time of the UI and CLI entry points.
+
+Usage:
+    python benchmarks/bench_import.py [--repeat 5] [--max-ms 1500] [--top 8]
+
+Each entry module is imported in a fresh interpreter under ``python -X
+importtime``. The best cumulative time, the slowest nested imports and any
+heavy dependency that got loaded eagerly are printed as JSON. The exit
+status is 1 when an entry point exceeds ``--max-ms`` or imports one of its
+deferred dependencies, so the script can guard start-up latency in CI.
+
+``yt_transcript_extractor_ui`` opens its window on import and is not
+measured directly; its cost is ``yt_transcript_extractor`` plus tkinter.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules each entry point must not load until the code path that needs them runs
+ML_MODULES = ['whisper', 'torch', 'numba', 'moviepy']
+DEFERRED = {
+    'transcript_generator_ui': ML_MODULES + ['openai', 'pytube', 'yt_dlp', 'pydub', 'speech_recognition'],
+    'yt_transcript_extractor': ML_MODULES + ['openai', 'pytube', 'yt_dlp', 'pydub', 'speech_recognition'],
+    'video_transcriber': ML_MODULES + ['pydub'],
+    'folder_ingest': ML_MODULES + ['pydub'],
+    'live_transcriber': ML_MODULES + ['pydub', 'yt_dlp'],
+    'transcript_index': ML_MODULES + ['openai'],
+    'audio_fingerprint': ML_MODULES + ['openai', 'pydub', 'yt_dlp'],
+    'batch_transcriber': ML_MODULES + ['openai', 'pytube', 'yt_dlp'],
+    'transcription_service': ML_MODULES + ['openai', 'pytube', 'yt_dlp', 'pydub'],
+}
+
+_PROBE = "import json, sys; import {module}; print(json.dumps(sorted(sys.modules)))"
+
+
+def parse_importtime(stderr):
+    """Return ``(name, depth, self_us, cumulative_us)`` rows from ``-X importtime`` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        stripped = name.lstrip()
+        depth = (len(name) - len(stripped) - 1) // 2
+        rows.append((stripped, depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure(module):
+    """Import ``module`` once in a clean interpreter."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _PROBE.format(module=module)],
+        cwd=REPO_ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+    rows = parse_importtime(proc.stderr)
+    loaded = set(json.loads(proc.stdout.strip().splitlines()[-1]))
+    end = next(i for i, (name, depth, _, _) in enumerate(rows) if name == module and depth == 0)
+    # Nested imports are printed before their parent
+    start = end
+    while start > 0 and rows[start - 1][1] > 0:
+        start -= 1
+    return rows[end][3], rows[start:end], loaded
+
+
+def run(module, repeat, top):
+    best = None
+    for _ in range(repeat):
+        total_us, rows, loaded = measure(module)
+        if best is None or total_us < best[0]:
+            best = (total_us, rows, loaded)
+    total_us, rows, loaded = best
+    nested = sorted((row for row in rows if row[1] <= 2), key=lambda r: -r[3])
+    eager = sorted(name for name in DEFERRED.get(module, [])
+                   if name in loaded or any(m.startswith(name + '.') for m in loaded))
+    return {
+        'module': module,
+        'import_ms': round(total_us / 1000, 1),
+        'repeat': repeat,
+        'slowest': [{'name': name, 'cumulative_ms': round(cumulative / 1000, 1)}
+                    for name, _, _, cumulative in nested[:top]],
+        'eager_heavy_imports': eager,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modules', nargs='*', default=list(DEFERRED), help="Entry modules to measure")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, default=1500.0, help="Fail above this import time")
+    parser.add_argument('--top', type=int, default=8, help="Slowest nested imports to list")
+    args = parser.parse_args()
+
+    report = [run(module, args.repeat, args.top) for module in args.modules]
+    print(json.dumps(report, indent=2))
+
+    failures = [r['module'] for r in report if r['import_ms'] > args.max_ms or r['eager_heavy_imports']]
+    if failures:
+        print(f"Import budget exceeded: {', '.join(failures)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
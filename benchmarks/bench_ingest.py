@@ -0,0 +1,133 @@
+"""Compare the file-based audio ingest flow with the streaming one.
+
+Usage:
+    python benchmarks/bench_ingest.py path/to/video.mp4 [--youtube LINK] [--repeat 3]
+
+Each variant runs in its own process so peak RSS is measured per variant.
+Results are printed as JSON. Inference is not included; both variants hand
+Whisper the same float32 array.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _dir_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def legacy_local(video_path, work_dir):
+    """MP4 -> MP3 via moviepy, then Whisper's own ffmpeg decode of the MP3."""
+    import whisper
+    from video_transcriber import VideoTranscriber
+
+    mp3_path = VideoTranscriber.convert_mp4_to_mp3(None, video_path, work_dir)
+    temp_bytes = _dir_bytes(work_dir)
+    samples = whisper.load_audio(mp3_path)
+    return samples, temp_bytes
+
+
+def streaming_local(video_path, work_dir):
+    from audio_stream import load_pcm
+
+    return load_pcm(video_path), _dir_bytes(work_dir)
+
+
+def legacy_youtube(link, work_dir):
+    """The original yt_dlp flow: best audio stream, kept alongside a WAV extracted
+    by FFmpegExtractAudio, then Whisper's own ffmpeg decode of the WAV."""
+    import whisper
+    import yt_dlp
+
+    audio_path = os.path.join(work_dir, 'temp_audio.wav')
+    ydl_opts = {
+        'format': 'bestaudio/best',
+        'outtmpl': os.path.join(work_dir, 'temp_audio.%(ext)s'),
+        'postprocessors': [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'wav',
+            'preferredquality': '192',
+        }],
+        'keepvideo': True,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        ydl.download([link])
+    temp_bytes = _dir_bytes(work_dir)
+    return whisper.load_audio(audio_path), temp_bytes
+
+
+def streaming_youtube(link, work_dir):
+    from audio_stream import load_youtube_pcm
+
+    return load_youtube_pcm(link), _dir_bytes(work_dir)
+
+
+VARIANTS = {
+    'legacy_local': legacy_local,
+    'streaming_local': streaming_local,
+    'legacy_youtube': legacy_youtube,
+    'streaming_youtube': streaming_youtube,
+}
+
+
+def _run_variant(name, source, results):
+    with tempfile.TemporaryDirectory() as work_dir:
+        start = time.perf_counter()
+        samples, temp_bytes = VARIANTS[name](source, work_dir)
+        elapsed = time.perf_counter() - start
+    results.put({
+        'variant': name,
+        'seconds': elapsed,
+        'audio_seconds': len(samples) / 16000,
+        'temp_bytes': temp_bytes,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+
+
+def run(name, source, repeat):
+    runs = []
+    for _ in range(repeat):
+        results = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_run_variant, args=(name, source, results))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            raise RuntimeError(f"{name} failed with exit code {process.exitcode}")
+        runs.append(results.get())
+    best = min(runs, key=lambda r: r['seconds'])
+    best['realtime_factor'] = best['seconds'] / best['audio_seconds'] if best['audio_seconds'] else None
+    best['repeat'] = repeat
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('video', nargs='?', help="Local video file")
+    parser.add_argument('--youtube', help="YouTube link to benchmark the download path")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    report = []
+    if args.video:
+        report += [run('legacy_local', args.video, args.repeat), run('streaming_local', args.video, args.repeat)]
+    if args.youtube:
+        report += [run('legacy_youtube', args.youtube, args.repeat),
+                   run('streaming_youtube', args.youtube, args.repeat)]
+    if not report:
+        parser.error("pass a video file and/or --youtube LINK")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
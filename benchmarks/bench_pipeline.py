@@ -0,0 +1,454 @@
+"""Benchmark every pipeline stage offline on synthetic fixtures and compare with a baseline.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--stages captions,whisper,video,summarize,analyze] \\
+        [--model tiny] [--audio-seconds 60] [--videos 20] [--words 6000] \\
+        [--llm-latency 0.05] [--rpm N] [--tpm N] [--baseline PATH] [--save-baseline]
+
+Stages and what they time:
+    captions   ``process_video_transcript`` for ``--videos`` videos whose
+               captions come from a fixture-backed ``CaptionProvider``
+    whisper    ``process_video_transcript`` for videos without captions; their
+               audio is put in the media cache first, so nothing is downloaded
+    video      ``VideoTranscriber.process_video`` on the audio fixtures as files
+    summarize  ``summarize_text`` on a generated ``--words`` transcript
+    analyze    ``SinekStyleAnalyzer.process_transcript`` on the same transcript
+
+Audio fixtures are generated: stepped tones, speech-like syllables (as in
+``bench_fingerprint``) and babble of several overlapping voices over noise,
+``--audio-seconds`` each. Recordings in ``--clips`` (default
+``benchmarks/audio_set``: a bundled synthetic speech clip plus any local
+recordings, see its README) are added to them. The LLM stages talk to a ``FakeOpenAIServer`` that answers
+after ``--llm-latency`` seconds and enforces ``--rpm``/``--tpm`` limits.
+
+Each stage runs in a freshly spawned process, with its media cache, stores,
+index and outputs in a temporary directory and the LLM cache off, so peak RSS
+is per stage and nothing is reused between stages or runs. Reported per
+stage, as JSON: wall time (model loading is reported separately), items and
+words per second, real-time factor for the audio stages (processing seconds
+per audio second, lower is faster), peak RSS, and the summed
+``instrumentation`` stage totals of the traced runs. Stages whose
+dependencies are missing here (Whisper, ffmpeg, openai) are reported as
+skipped.
+
+``--save-baseline`` writes the report to ``--baseline`` (default
+``benchmarks/pipeline_baseline.json``). When that file exists, later runs
+compare every stage's wall time and peak RSS with it and exit with status 1
+when one grew by more than ``--tolerance``, or when a stage failed. Record
+the baseline on the machine that runs the comparison.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+SAMPLE_RATE = 16000
+STAGES = ('captions', 'whisper', 'video', 'summarize', 'analyze')
+LLM_STAGES = ('summarize', 'analyze')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'pipeline_baseline.json')
+DEFAULT_CLIPS_DIR = os.path.join(BENCH_DIR, 'audio_set')
+CLIP_EXTENSIONS = ('.wav', '.mp3', '.m4a', '.flac', '.ogg', '.webm', '.mp4')
+# Compared metrics, with the smallest change that counts as a regression whatever the ratio
+COMPARED = {'seconds': 0.05, 'peak_rss_mb': 5.0}
+WORDS_PER_SEGMENT = 12
+
+
+class StageSkipped(Exception):
+    """A stage cannot run in this environment (missing binary or service)."""
+
+
+# -- fixtures --------------------------------------------------------------
+
+def tones(seconds, seed):
+    """Steady sine tones of 0.3-1.5 s at 200-2000 Hz with short gaps, like a test signal."""
+    rng = np.random.default_rng(seed)
+    out = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    pos = 0
+    while pos < len(out):
+        n = min(int(rng.uniform(0.3, 1.5) * SAMPLE_RATE), len(out) - pos)
+        t = np.arange(n) / SAMPLE_RATE
+        out[pos:pos + n] = 0.1 * np.sin(2 * np.pi * rng.uniform(200, 2000) * t) * np.hanning(n)
+        pos += n + int(rng.uniform(0.05, 0.3) * SAMPLE_RATE)
+    return out
+
+
+def babble(seconds, seed, voices=4):
+    """Several speech-like voices at once over a noise floor: crowd or café audio."""
+    from bench_fingerprint import speechlike
+
+    rng = np.random.default_rng(seed)
+    out = sum(speechlike(seconds, seed * 100 + voice) for voice in range(voices)) / voices
+    return (out + rng.normal(0, 0.005, len(out))).astype(np.float32)
+
+
+def audio_fixtures(work_dir, seconds, seed, clips_dir):
+    """Write the generated audio fixtures as WAV files; return ``{'name', 'path', 'generated'}`` entries."""
+    from audio_stream import write_wav
+    from bench_fingerprint import speechlike
+
+    makers = {'tones': tones, 'speechlike': speechlike, 'babble': babble}
+    fixtures = []
+    for offset, (name, make) in enumerate(makers.items()):
+        path = os.path.join(work_dir, f"{name}.wav")
+        write_wav(path, make(seconds, seed + offset))
+        fixtures.append({'name': name, 'path': path, 'generated': True})
+    if clips_dir and os.path.isdir(clips_dir):
+        for name in sorted(os.listdir(clips_dir)):
+            if os.path.splitext(name)[1].lower() in CLIP_EXTENSIONS:
+                fixtures.append({'name': name, 'path': os.path.join(clips_dir, name), 'generated': False})
+    return fixtures
+
+
+def make_vocabulary(rng, size=3000):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(letters) for _ in range(rng.randint(2, 9))))
+    return sorted(words)
+
+
+def caption_segments(rng, vocabulary, words):
+    """Caption-style ``{'text', 'start', 'duration'}`` segments of sentences drawn from ``vocabulary``."""
+    segments, start = [], 0.0
+    for _ in range(max(1, words // WORDS_PER_SEGMENT)):
+        text = ' '.join(rng.choices(vocabulary, k=WORDS_PER_SEGMENT))
+        duration = round(WORDS_PER_SEGMENT / 2.5, 2)
+        segments.append({'text': text.capitalize() + '.', 'start': round(start, 2), 'duration': duration})
+        start += duration
+    return segments
+
+
+def text_fixtures(videos, words, seed):
+    """Caption fixtures (``FixtureCaptionSource`` format) for ``videos`` IDs, and one long transcript."""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    captions = {}
+    for index in range(videos):
+        captions[f"benchcap{index:03d}"] = {
+            'tracks': [{'language_code': 'en', 'language': 'English'}],
+            'segments': {'en': caption_segments(rng, vocabulary, words // 4)},
+        }
+    segments = [segment['text'] for segment in caption_segments(rng, vocabulary, words)]
+    return captions, {'text': ' '.join(segments), 'segments': segments}
+
+
+def fake_openai_server(latency, requests_per_minute, tokens_per_minute):
+    from fake_openai_server import FakeOpenAIServer
+
+    class PointsServer(FakeOpenAIServer):
+        """Answers extraction prompts with numbered points, so the analyzer parses real output."""
+
+        def reply(self, body):
+            content = super().reply(body)
+            if 'extract main points' not in str(body.get('messages', '')):
+                return content
+            words = content.split()
+            lines = []
+            for point in range(0, len(words), 10):
+                number = point // 10 + 1
+                lines.append(f"{number}. {' '.join(words[point:point + 4])}")
+                lines.append(f"{number}.1. {' '.join(words[point + 4:point + 10])}")
+            return '\n'.join(lines)
+
+    return PointsServer(latency=latency, reply_words=60, requests_per_minute=requests_per_minute,
+                        tokens_per_minute=tokens_per_minute)
+
+
+# -- stages (run in the spawned process) ------------------------------------
+
+def _load_audio(entry):
+    from audio_stream import load_pcm, read_wav
+
+    if entry['generated']:
+        return read_wav(entry['path'])
+    if shutil.which('ffmpeg') is None:
+        raise StageSkipped(f"ffmpeg not found (needed to decode {entry['name']})")
+    return load_pcm(entry['path'])
+
+
+def _run_traced(stage_name, items, fn):
+    """Run ``fn(item)`` for each item in its own trace; return seconds, outputs and summed stage totals."""
+    from instrumentation import trace
+
+    seconds, outputs, totals = 0.0, [], {}
+    for index, item in enumerate(items):
+        with trace(f"bench-{stage_name}-{index}") as active:
+            start = time.perf_counter()
+            outputs.append(fn(item))
+            seconds += time.perf_counter() - start
+        for name, value in active.to_dict()['stage_totals_s'].items():
+            totals[name] = totals.get(name, 0.0) + value
+    return seconds, outputs, {name: round(value, 4) for name, value in totals.items()}
+
+
+def _load_model():
+    from inference_backends import InferenceConfig
+    from model_registry import get_model
+
+    config = InferenceConfig.from_env()
+    start = time.perf_counter()
+    get_model(config.model_size, device=config.device, precision=config.precision)
+    return time.perf_counter() - start
+
+
+def stage_captions(fixtures):
+    from caption_provider import CaptionProvider, FixtureCaptionSource, set_default_caption_provider
+    from yt_transcript_extractor import process_video_transcript
+
+    set_default_caption_provider(CaptionProvider(FixtureCaptionSource(fixtures['captions'])))
+    seconds, outputs, totals = _run_traced('captions', sorted(fixtures['captions']), process_video_transcript)
+    return {'items': len(outputs), 'seconds': seconds, 'stage_totals_s': totals,
+            'words': sum(len(output['transcript'].split()) for output in outputs)}
+
+
+def stage_whisper(fixtures):
+    from caption_provider import CaptionProvider, FixtureCaptionSource, set_default_caption_provider
+    from media_cache import get_default_cache, youtube_key
+    from yt_transcript_extractor import process_video_transcript
+
+    load_seconds = _load_model()
+    # No caption tracks, and the audio is already cached: the run goes straight to Whisper
+    set_default_caption_provider(CaptionProvider(FixtureCaptionSource({})))
+    cache = get_default_cache()
+    video_ids, audio_s = [], 0.0
+    for index, entry in enumerate(fixtures['audio']):
+        samples = _load_audio(entry)
+        video_ids.append(f"benchaud{index:03d}")
+        cache.store_audio_array(youtube_key(video_ids[-1]), samples)
+        audio_s += len(samples) / SAMPLE_RATE
+    seconds, outputs, totals = _run_traced('whisper', video_ids, process_video_transcript)
+    return {'items': len(outputs), 'seconds': seconds, 'load_seconds': load_seconds, 'audio_s': audio_s,
+            'stage_totals_s': totals, 'words': sum(len(output['transcript'].split()) for output in outputs)}
+
+
+def stage_video(fixtures):
+    from video_transcriber import VideoTranscriber
+
+    if shutil.which('ffmpeg') is None:
+        raise StageSkipped("ffmpeg not found")
+    load_seconds = _load_model()
+    audio_s = sum(len(_load_audio(entry)) / SAMPLE_RATE for entry in fixtures['audio'])
+    transcriber = VideoTranscriber()
+    paths = [entry['path'] for entry in fixtures['audio']]
+    seconds, outputs, totals = _run_traced('video', paths, transcriber.process_video)
+    return {'items': len(outputs), 'seconds': seconds, 'load_seconds': load_seconds, 'audio_s': audio_s,
+            'stage_totals_s': totals}
+
+
+def stage_summarize(fixtures):
+    from yt_transcript_extractor import summarize_text
+
+    transcript = fixtures['transcript']
+    seconds, outputs, totals = _run_traced(
+        'summarize', [transcript], lambda item: summarize_text(item['text'], item['segments']))
+    # summarize_text reports failures in its return value
+    if outputs[0].startswith("Error summarizing text"):
+        raise RuntimeError(outputs[0])
+    return {'items': 1, 'seconds': seconds, 'stage_totals_s': totals, 'words': len(transcript['text'].split())}
+
+
+def stage_analyze(fixtures):
+    from sinek_style_analyzer import SinekStyleAnalyzer
+
+    transcript = fixtures['transcript']
+    analyzer = SinekStyleAnalyzer(api_key=os.environ['OPENAI_API_KEY'])
+    seconds, outputs, totals = _run_traced(
+        'analyze', [transcript], lambda item: analyzer.process_transcript(item['text'], segments=item['segments']))
+    return {'items': 1, 'seconds': seconds, 'stage_totals_s': totals, 'points': len(outputs[0]),
+            'words': len(transcript['text'].split())}
+
+
+STAGE_FUNCTIONS = {
+    'captions': stage_captions,
+    'whisper': stage_whisper,
+    'video': stage_video,
+    'summarize': stage_summarize,
+    'analyze': stage_analyze,
+}
+
+
+def _run_stage(name, work_dir, env, fixtures, results):
+    os.environ.update(env)
+    os.chdir(work_dir)
+    from instrumentation import configure_logging
+
+    configure_logging(env.get('LOG_LEVEL', 'WARNING'))
+    try:
+        report = STAGE_FUNCTIONS[name](fixtures)
+        report['status'] = 'ok'
+    except (ImportError, StageSkipped) as e:
+        report = {'status': 'skipped', 'reason': f"{type(e).__name__}: {e}"}
+    except Exception as e:
+        report = {'status': 'failed', 'reason': f"{type(e).__name__}: {e}"}
+    report['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    results.put(report)
+
+
+def summarize_stage(report):
+    """Add throughput figures and round the raw numbers of a stage report."""
+    if report['status'] != 'ok':
+        report['peak_rss_mb'] = round(report['peak_rss_mb'], 1)
+        return report
+    seconds = report['seconds']
+    if seconds:
+        report['items_per_s'] = round(report['items'] / seconds, 3)
+        if report.get('words'):
+            report['words_per_s'] = round(report['words'] / seconds, 1)
+    if report.get('audio_s'):
+        report['realtime_factor'] = round(seconds / report['audio_s'], 4)
+        report['audio_s'] = round(report['audio_s'], 2)
+    for key in ('seconds', 'load_seconds'):
+        if key in report:
+            report[key] = round(report[key], 4)
+    report['peak_rss_mb'] = round(report['peak_rss_mb'], 1)
+    return report
+
+
+def run_stage(name, work_dir, env, fixtures, server=None):
+    """Run one stage in a spawned process; a fresh interpreter keeps peak RSS per stage."""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    os.makedirs(work_dir)
+    requests_before = len(server.requests) if server else 0
+    limited_before = server.rate_limited if server else 0
+    process = context.Process(target=_run_stage, args=(name, work_dir, env, fixtures, results))
+    process.start()
+    while True:
+        try:
+            report = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                report = {'status': 'failed', 'reason': f"exit code {process.exitcode}", 'peak_rss_mb': 0.0}
+                break
+    process.join()
+    if server is not None:
+        report['llm_requests'] = len(server.requests) - requests_before
+        report['llm_rate_limited'] = server.rate_limited - limited_before
+    return summarize_stage(report)
+
+
+# -- baseline --------------------------------------------------------------
+
+def compare(report, baseline, tolerance):
+    """Compare stage times and peak RSS with ``baseline``; return ``(comparison, failures)``."""
+    if baseline.get('settings') != report['settings']:
+        return {}, ["baseline was recorded with different settings; re-run with --save-baseline"]
+    comparison, failures = {}, []
+    for name, current in report['stages'].items():
+        before = baseline.get('stages', {}).get(name)
+        if current['status'] != 'ok' or not before or before.get('status') != 'ok':
+            continue
+        rows = {}
+        for metric, floor in COMPARED.items():
+            old, new = before[metric], current[metric]
+            change = (new - old) / old if old else 0.0
+            rows[metric] = {'baseline': old, 'current': new, 'change': round(change, 3)}
+            if change > tolerance and new - old > floor:
+                failures.append(f"{name}: {metric} {new} vs baseline {old} (+{change:.0%})")
+        comparison[name] = rows
+    return comparison, failures
+
+
+def run(args, work_dir):
+    stages = [name.strip() for name in args.stages.split(',') if name.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise SystemExit(f"unknown stages: {', '.join(sorted(unknown))}; choose from {', '.join(STAGES)}")
+    captions, transcript = text_fixtures(args.videos, args.words, args.seed)
+    fixtures = {
+        'audio': audio_fixtures(work_dir, args.audio_seconds, args.seed, args.clips),
+        'captions': captions,
+        'transcript': transcript,
+    }
+    report = {
+        'settings': {'model': args.model, 'backend': args.backend, 'threads': args.threads,
+                     'audio_seconds': args.audio_seconds, 'audio_fixtures': [f['name'] for f in fixtures['audio']],
+                     'videos': args.videos, 'words': args.words, 'llm_latency': args.llm_latency,
+                     'rpm': args.rpm, 'tpm': args.tpm, 'seed': args.seed},
+        'stages': {},
+    }
+
+    server = None
+    if set(stages) & set(LLM_STAGES):
+        server = fake_openai_server(args.llm_latency, args.rpm, args.tpm).start()
+    try:
+        for name in stages:
+            stage_dir = os.path.join(work_dir, name)
+            env = {
+                'TRANSCRIPT_CACHE_DIR': os.path.join(stage_dir, 'cache'),
+                'FINGERPRINT_DB': os.path.join(stage_dir, 'fingerprints.db'),
+                'PROCESSED_STORE': 'sqlite',
+                'PROCESSED_STORE_PATH': os.path.join(stage_dir, 'processed.db'),
+                'TRANSCRIPT_INDEX': os.path.join(stage_dir, 'index.db'),
+                'DOWNLOAD_DIR': os.path.join(stage_dir, 'downloads'),
+                'LLM_CACHE': 'off',
+                'CAPTION_LANGUAGES': 'en',
+                'OPENAI_API_KEY': 'bench',
+                'WHISPER_MODEL': args.model,
+                'WHISPER_BACKEND': args.backend,
+                'LOG_LEVEL': args.log_level,
+            }
+            if args.threads:
+                env['WHISPER_THREADS'] = str(args.threads)
+            if server is not None:
+                env['OPENAI_BASE_URL'] = server.base_url
+            report['stages'][name] = run_stage(name, stage_dir, env, fixtures,
+                                               server if name in LLM_STAGES else None)
+    finally:
+        if server is not None:
+            server.stop()
+
+    failures = [f"{name}: {stage['reason']}" for name, stage in report['stages'].items()
+                if stage['status'] == 'failed']
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            report['comparison'], regressions = compare(report, json.load(f), args.tolerance)
+        failures.extend(regressions)
+    report['failures'] = failures
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stages', default=','.join(STAGES), help="Comma-separated subset of " + ', '.join(STAGES))
+    parser.add_argument('--model', default='tiny', help="Whisper model size for the audio stages")
+    parser.add_argument('--backend', default='whisper', help="whisper, whisper-int8 or ctranslate2")
+    parser.add_argument('--threads', type=int, default=None, help="Inference threads (default: all cores)")
+    parser.add_argument('--audio-seconds', type=float, default=60, help="Length of each generated audio fixture")
+    parser.add_argument('--clips', default=DEFAULT_CLIPS_DIR, help="Directory of extra recordings to include")
+    parser.add_argument('--videos', type=int, default=20, help="Videos with caption fixtures")
+    parser.add_argument('--words', type=int, default=6000, help="Words in the transcript for the LLM stages")
+    parser.add_argument('--llm-latency', type=float, default=0.05, help="Seconds per fake OpenAI response")
+    parser.add_argument('--rpm', type=int, default=None, help="Fake OpenAI requests per minute")
+    parser.add_argument('--tpm', type=int, default=None, help="Fake OpenAI prompt tokens (words) per minute")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Write this run's report to --baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed growth over the baseline (0.2 = 20%%)")
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        report = run(args, work_dir)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    return 1 if report['failures'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""Measure transcript search latency on a synthetic corpus.
+
+Usage:
+    python benchmarks/bench_search.py [--docs 20000] [--segments 40] [--queries 200] [--max-ms 50] \\
+        [--semantic] [--index PATH]
+
+Builds a ``TranscriptIndex`` of ``--docs`` generated transcripts (Zipf-like
+word frequencies, ``--segments`` timed segments each), then runs keyword,
+phrase and prefix queries drawn from the same vocabulary and reports build
+time, index size and p50/p95 query latency as JSON. With ``--semantic`` the
+corpus is also embedded with the hashing embedder and semantic queries are
+timed too. Exits with status 1 when a p95 exceeds ``--max-ms`` or a query
+for a phrase planted in one transcript does not find it, or when a local
+transcript indexed by the save hook and then by ``reindex`` (before and
+after its file changes) ends up indexed twice. Pass ``--index`` to keep (and
+reuse) the database between runs.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import transcript_index  # noqa: E402
+from transcript_index import HashingEmbedder, TranscriptIndex, reindex  # noqa: E402
+
+VOCABULARY = 20000
+PLANTED = 'zyzzyva quokka marmalade'
+
+
+def make_vocabulary(rng, size):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    return sorted(words)
+
+
+def zipf_cum_weights(size):
+    return list(itertools.accumulate(1.0 / rank for rank in range(1, size + 1)))
+
+
+def build(index, docs, segments, rng, words, cum_weights):
+    planted_doc = docs // 2
+    for doc in range(docs):
+        rows = []
+        for seg in range(segments):
+            text = ' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(8, 20)))
+            if doc == planted_doc and seg == segments // 2:
+                text = f"{text} {PLANTED}"
+            rows.append({'start': seg * 5.0, 'end': seg * 5.0 + 5.0, 'text': text})
+        index.add_segments(f"youtube:bench{doc:06d}", rows, 'youtube', video_id=f"bench{doc:06d}")
+    return f"bench{planted_doc:06d}"
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {'p50_ms': round(statistics.median(samples), 3),
+            'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 3),
+            'max_ms': round(samples[-1], 3)}
+
+
+def timed(fn, queries):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+
+def check_save_then_reindex(work_dir):
+    """Index a local transcript the way the save hook does, then reindex its folder; it must stay one document."""
+    failures = []
+    md_path = os.path.join(work_dir, 'lecture_transcript.md')
+    text = "[00:00:00] we start with gradient descent\n[00:00:05] and then momentum\n"
+    with open(md_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.environ['TRANSCRIPT_INDEX'] = os.path.join(work_dir, 'saved.db')
+    transcript_index.index_transcript(md_path, text, 'local', title='lecture', key='abc123')
+    index = transcript_index.get_default_index()
+    for step, force in (('forced reindex', True), ('reindex after an edit', False)):
+        if not force:
+            os.utime(md_path, (time.time() + 10, time.time() + 10))
+        reindex(index, [work_dir], force=force)
+        documents = index.stats()['documents']
+        hits = index.search('gradient')
+        if documents != 1 or len(hits) != 1:
+            failures.append(f"{step} after save: {documents} documents, {len(hits)} hits for 'gradient'")
+    index.close()
+    return failures
+
+
+def run(args, path):
+    rng = random.Random(args.seed)
+    words = make_vocabulary(rng, VOCABULARY)
+    cum_weights = zipf_cum_weights(len(words))
+    index = TranscriptIndex(path)
+    report = {'docs': args.docs, 'segments_per_doc': args.segments, 'queries': args.queries}
+    failures = []
+
+    existing = index.stats()['documents']
+    start = time.perf_counter()
+    if existing != args.docs:
+        planted = build(index, args.docs, args.segments, rng, words, cum_weights)
+    else:
+        planted = f"bench{args.docs // 2:06d}"
+    report['build_seconds'] = round(time.perf_counter() - start, 3)
+    report['index'] = index.stats()
+
+    # Mostly mid-frequency words: the head of the distribution matches everything, the tail nothing
+    pool = words[20:2000]
+    queries = {
+        'keyword': [rng.choice(pool) for _ in range(args.queries)],
+        'two_words': [f"{rng.choice(pool)} {rng.choice(pool)}" for _ in range(args.queries)],
+        'phrase': [f'"{rng.choice(words[:200])} {rng.choice(words[:200])}"' for _ in range(args.queries)],
+        # Truncated words, as typed; two- and three-letter prefixes expand to thousands of terms
+        'prefix': [word[:max(4, len(word) - 2)] + '*' for word in rng.choices(pool, k=args.queries)],
+    }
+    report['latency'] = {kind: timed(lambda q: index.search(q, limit=args.limit), batch)
+                         for kind, batch in queries.items()}
+
+    hits = index.search(f'"{PLANTED}"', limit=5)
+    if not hits or hits[0].video_id != planted:
+        failures.append(f"planted phrase not found in {planted}")
+
+    if args.semantic:
+        embedder = HashingEmbedder()
+        start = time.perf_counter()
+        report['embedded_docs'] = index.embed_missing(embedder)
+        report['embed_seconds'] = round(time.perf_counter() - start, 3)
+        start = time.perf_counter()
+        index.semantic_search(PLANTED, limit=1, embedder=embedder)
+        report['matrix_load_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        report['latency']['semantic'] = timed(lambda q: index.semantic_search(q, limit=args.limit, embedder=embedder),
+                                              queries['two_words'])
+
+    for kind, latency in report['latency'].items():
+        if latency['p95_ms'] > args.max_ms:
+            failures.append(f"{kind} p95 {latency['p95_ms']} ms over {args.max_ms} ms")
+    index.close()
+    with tempfile.TemporaryDirectory() as work_dir:
+        failures += check_save_then_reindex(work_dir)
+    report['failures'] = failures
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--docs', type=int, default=20000)
+    parser.add_argument('--segments', type=int, default=40, help="Timed segments per transcript")
+    parser.add_argument('--queries', type=int, default=200, help="Queries per query type")
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--max-ms', type=float, default=50, help="Allowed p95 latency per query type")
+    parser.add_argument('--semantic', action='store_true', help="Also embed the corpus and time semantic search")
+    parser.add_argument('--index', help="Keep the index at this path instead of a temporary directory")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.index:
+        report = run(args, args.index)
+    else:
+        with tempfile.TemporaryDirectory() as work_dir:
+            report = run(args, os.path.join(work_dir, 'index.db'))
+    print(json.dumps(report, indent=2))
+    return 1 if report['failures'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Check the transcription service's job handling over HTTP, offline.
+
+Usage:
+    python benchmarks/bench_service.py [--polls 200]
+
+Starts a ``TranscriptionService`` on a free local port with injected
+``Pipeline``s whose jobs run until the check releases them, so no model,
+network or OpenAI key is needed. Checks, in order: a repeated request joins
+the running job; a request beyond ``max_pending`` gets 429 with
+``Retry-After``; ``?wait=`` returns when the job finishes, or after the
+timeout while it is still running; a cancelled job is not joined by a
+retry; and bad requests get 400/404. Also times submit and poll round
+trips. Prints a JSON report; exits with status 1 when a check fails.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transcription_service import Pipeline, TranscriptionService  # noqa: E402
+
+MAX_PENDING = 2
+RETRY_AFTER_S = 3
+
+
+class GatedPipeline:
+    """Jobs report progress until their ``name`` is released, then return it."""
+
+    def __init__(self):
+        self.gates = {}
+        self._lock = threading.Lock()
+
+    def gate(self, name):
+        with self._lock:
+            return self.gates.setdefault(name, threading.Event())
+
+    def key(self, params):
+        if not params.get('name'):
+            raise ValueError("'name' is required")
+        return params['name']
+
+    def run(self, params, job):
+        gate = self.gate(params['name'])
+        while not gate.wait(0.02):
+            job.report('working')
+        return {'name': params['name']}
+
+
+def request(base_url, method, path, body=None):
+    """Return ``(status, json_body, headers)``; HTTP errors are returned, not raised."""
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(base_url + path, data=data, method=method,
+                                 headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            return response.status, json.loads(response.read()), response.headers
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'{}'), e.headers
+
+
+def run_checks(base_url, pipeline):
+    failures = []
+
+    def expect(condition, message):
+        if not condition:
+            failures.append(message)
+
+    def post(name):
+        return request(base_url, 'POST', '/jobs', {'kind': 'gated', 'name': name})
+
+    status, first, _ = post('a')
+    expect(status == 202 and not first['coalesced'], f"first request: {status} {first}")
+    status, second, _ = post('a')
+    expect(status == 202 and second['coalesced'] and second['job']['id'] == first['job']['id'],
+           f"repeated request was not coalesced: {status} {second}")
+    job_a = first['job']['id']
+
+    status, body, _ = post('b')
+    expect(status == 202, f"second job rejected: {status} {body}")
+    job_b = body['job']['id']
+    status, body, headers = post('c')
+    expect(status == 429 and headers.get('Retry-After') == str(RETRY_AFTER_S),
+           f"request over max_pending: {status} {body}, Retry-After {headers.get('Retry-After')}")
+
+    start = time.monotonic()
+    status, body, _ = request(base_url, 'GET', f'/jobs/{job_b}?wait=0.3')
+    waited = time.monotonic() - start
+    expect(body['job']['status'] == 'running' and 0.25 <= waited < 2,
+           f"?wait timeout on a running job: {body['job']['status']} after {waited:.2f}s")
+    pipeline.gate('b').set()
+    status, body, _ = request(base_url, 'GET', f'/jobs/{job_b}?wait=10')
+    expect(body['job']['status'] == 'done' and body['job']['result'] == {'name': 'b'},
+           f"?wait on a finishing job: {body['job']}")
+
+    status, body, _ = request(base_url, 'DELETE', f'/jobs/{job_a}')
+    expect(status == 202 and body['cancelled'], f"cancel: {status} {body}")
+    retry_status, retry, _ = post('a')
+    expect(retry_status == 202 and not retry['coalesced'] and retry['job']['id'] != job_a,
+           f"retry after cancel joined the cancelled job: {retry_status} {retry}")
+    status, body, _ = request(base_url, 'GET', f'/jobs/{job_a}?wait=10')
+    expect(body['job']['status'] == 'cancelled', f"cancelled job finished as {body['job']['status']}")
+    pipeline.gate('a').set()
+    if retry_status == 202:
+        status, body, _ = request(base_url, 'GET', f"/jobs/{retry['job']['id']}?wait=10")
+        expect(body['job']['status'] == 'done', f"retried job finished as {body['job']['status']}")
+    status, body, _ = request(base_url, 'DELETE', f'/jobs/{job_b}')
+    expect(status == 409, f"cancelling a finished job: {status} {body}")
+
+    status, _, _ = request(base_url, 'POST', '/jobs', {'kind': 'nope'})
+    expect(status == 400, f"unknown kind: {status}")
+    status, _, _ = request(base_url, 'POST', '/jobs', {'kind': 'gated'})
+    expect(status == 400, f"missing parameter: {status}")
+    status, _, _ = request(base_url, 'GET', '/jobs/999999')
+    expect(status == 404, f"unknown job: {status}")
+    status, _, _ = request(base_url, 'GET', f'/jobs/{job_b}?wait=soon')
+    expect(status == 400, f"bad wait value: {status}")
+    return failures
+
+
+def timed(base_url, pipeline, polls):
+    """Median round trip of submitting (and coalescing) and of polling a job, in ms."""
+    pipeline.gate('timing').set()
+    submit_ms, poll_ms = [], []
+    job_id = 0
+    for _ in range(polls):
+        start = time.perf_counter()
+        _, body, _ = request(base_url, 'POST', '/jobs', {'kind': 'gated', 'name': 'timing'})
+        submit_ms.append((time.perf_counter() - start) * 1000)
+        # A 429 (earlier jobs not yet finished) still counts as a round trip
+        job_id = body['job']['id'] if 'job' in body else job_id
+        start = time.perf_counter()
+        request(base_url, 'GET', f'/jobs/{job_id}')
+        poll_ms.append((time.perf_counter() - start) * 1000)
+    return {'submit_p50_ms': round(statistics.median(submit_ms), 3),
+            'poll_p50_ms': round(statistics.median(poll_ms), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--polls', type=int, default=200, help="Submit/poll round trips to time")
+    args = parser.parse_args()
+
+    pipeline = GatedPipeline()
+    service = TranscriptionService(workers=MAX_PENDING, max_pending=MAX_PENDING, retry_after_s=RETRY_AFTER_S,
+                                   pipelines={'gated': Pipeline(pipeline.key, pipeline.run)}).start()
+    try:
+        failures = run_checks(service.base_url, pipeline)
+        report = {'timing': timed(service.base_url, pipeline, args.polls), 'failures': failures}
+    finally:
+        for gate in list(pipeline.gates.values()):
+            gate.set()
+        service.stop()
+    print(json.dumps(report, indent=2))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
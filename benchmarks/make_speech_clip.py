@@ -0,0 +1,84 @@
+"""Synthesize a speech clip with a known transcript for the benchmark audio set.
+
+Usage:
+    python benchmarks/make_speech_clip.py TEXT_FILE OUTPUT.wav [--voice en-us] [--rate 165]
+
+Speaks the text with eSpeak NG (the ``espeakng-loader`` package bundles the
+library and voices, so no system install is needed) and writes 16 kHz mono
+WAV next to a copy of the text, named like the WAV with ``.txt``, which
+``bench_backends.py`` uses as the reference transcript. This is how
+``audio_set/synthetic_speech.wav`` was made. Synthetic speech is far easier
+than real talks, so word error rates on it only show that a setting works.
+"""
+import argparse
+import ctypes
+import os
+import shutil
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_stream import SAMPLE_RATE, write_wav  # noqa: E402
+
+# espeak_AUDIO_OUTPUT / espeak_POSITION_TYPE / espeak_PARAMETER values from speak_lib.h
+AUDIO_OUTPUT_SYNCHRONOUS = 2
+POS_CHARACTER = 1
+ESPEAK_RATE = 1
+
+
+def synthesize(text, voice='en-us', rate=165):
+    """Return ``(samples, sample_rate)`` of ``text`` spoken by eSpeak NG, as float32."""
+    import espeakng_loader
+
+    lib = ctypes.CDLL(espeakng_loader.get_library_path())
+    data_dir = os.path.dirname(espeakng_loader.get_data_path())
+    sample_rate = lib.espeak_Initialize(AUDIO_OUTPUT_SYNCHRONOUS, 0, data_dir.encode(), 0)
+    chunks = []
+
+    @ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(ctypes.c_short), ctypes.c_int, ctypes.c_void_p)
+    def collect(wav, count, events):
+        if count > 0:
+            chunks.append(np.ctypeslib.as_array(wav, shape=(count,)).copy())
+        return 0
+
+    lib.espeak_SetSynthCallback(collect)
+    lib.espeak_SetVoiceByName(voice.encode())
+    lib.espeak_SetParameter(ESPEAK_RATE, rate, 0)
+    buffer = ctypes.create_string_buffer(text.encode('utf-8'))
+    lib.espeak_Synth(buffer, len(buffer), 0, POS_CHARACTER, 0, 0, None, None)
+    lib.espeak_Synchronize()
+    return np.concatenate(chunks).astype(np.float32) / 32768.0, sample_rate
+
+
+def resample(samples, rate, target=SAMPLE_RATE):
+    """Band-limit below the target Nyquist frequency in the FFT domain, then interpolate."""
+    spectrum = np.fft.rfft(samples)
+    spectrum[np.fft.rfftfreq(len(samples), 1 / rate) > 0.95 * target / 2] = 0
+    filtered = np.fft.irfft(spectrum, len(samples))
+    times = np.arange(int(len(samples) * target / rate)) / target
+    return np.interp(times, np.arange(len(samples)) / rate, filtered).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('text_file')
+    parser.add_argument('output')
+    parser.add_argument('--voice', default='en-us')
+    parser.add_argument('--rate', type=int, default=165, help="Words per minute")
+    args = parser.parse_args()
+
+    with open(args.text_file, 'r', encoding='utf-8') as f:
+        text = f.read().strip()
+    samples, rate = synthesize(text, args.voice, args.rate)
+    samples = resample(samples, rate)
+    write_wav(args.output, 0.7 * samples / max(1e-9, float(np.abs(samples).max())))
+    reference = os.path.splitext(args.output)[0] + '.txt'
+    if os.path.abspath(reference) != os.path.abspath(args.text_file):
+        shutil.copyfile(args.text_file, reference)
+    print(f"{args.output}: {len(samples) / SAMPLE_RATE:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
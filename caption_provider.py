@@ -0,0 +1,316 @@
+import json
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from transcript_model import Transcript
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANGUAGES = ('en',)
+
+MANUAL = 'manual'
+GENERATED = 'generated'
+TRANSLATED = 'translated'
+
+
+@dataclass
+class TrackInfo:
+    language_code: str
+    language: str = ''
+    is_generated: bool = False
+    is_translatable: bool = False
+    translation_languages: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Captions:
+    video_id: str
+    language_code: str
+    kind: str
+    segments: List[Dict]
+    source_language: Optional[str] = None
+
+    @property
+    def transcript(self) -> Transcript:
+        return Transcript.from_segments(self.segments, self.language_code, f"captions:{self.kind}")
+
+
+class CaptionSource(ABC):
+    """Where caption listings and segments come from (network or fixtures)."""
+
+    @abstractmethod
+    def list_tracks(self, video_id: str) -> List[TrackInfo]:
+        """Return the video's caption tracks; an empty list when captions are unavailable."""
+
+    @abstractmethod
+    def fetch(self, video_id: str, language_code: str, translate_to: Optional[str] = None) -> List[Dict]:
+        """Return ``{'text', 'start', 'duration'}`` segments of one track."""
+
+
+class TranscriptApiSource(CaptionSource):
+    """Caption source backed by ``youtube_transcript_api`` (no API key needed)."""
+
+    def __init__(self, proxies: Optional[Dict[str, str]] = None):
+        self.proxies = proxies
+        # Listings are kept until the chosen track is fetched so it is not listed twice
+        self._listings = {}
+        self._lock = threading.Lock()
+
+    def _transcript_list(self, video_id: str):
+        from youtube_transcript_api import YouTubeTranscriptApi
+
+        with self._lock:
+            listing = self._listings.get(video_id)
+        if listing is None:
+            listing = YouTubeTranscriptApi.list_transcripts(video_id, proxies=self.proxies)
+            with self._lock:
+                self._listings[video_id] = listing
+        return listing
+
+    def list_tracks(self, video_id: str) -> List[TrackInfo]:
+        from youtube_transcript_api import CouldNotRetrieveTranscript
+
+        try:
+            listing = self._transcript_list(video_id)
+        except CouldNotRetrieveTranscript:
+            return []
+        return [
+            TrackInfo(
+                language_code=transcript.language_code,
+                language=transcript.language,
+                is_generated=transcript.is_generated,
+                is_translatable=transcript.is_translatable,
+                translation_languages=[lang['language_code'] for lang in transcript.translation_languages],
+            )
+            for transcript in listing
+        ]
+
+    def fetch(self, video_id: str, language_code: str, translate_to: Optional[str] = None) -> List[Dict]:
+        listing = self._transcript_list(video_id)
+        with self._lock:
+            self._listings.pop(video_id, None)
+        transcript = next(t for t in listing if t.language_code == language_code)
+        if translate_to:
+            transcript = transcript.translate(translate_to)
+        return transcript.fetch()
+
+
+class FixtureCaptionSource(CaptionSource):
+    """Replays responses recorded by ``RecordingCaptionSource`` from a JSON file.
+
+    The file maps video IDs to ``{"tracks": [...], "segments": {key: [...]}}``
+    where ``key`` is ``"en"`` or ``"en>de"`` for a translation.
+    """
+
+    def __init__(self, fixtures):
+        if isinstance(fixtures, (str, os.PathLike)):
+            with open(fixtures, 'r', encoding='utf-8') as f:
+                fixtures = json.load(f)
+        self.fixtures = fixtures
+
+    def list_tracks(self, video_id: str) -> List[TrackInfo]:
+        entry = self.fixtures.get(video_id) or {}
+        return [TrackInfo(**track) for track in entry.get('tracks', [])]
+
+    def fetch(self, video_id: str, language_code: str, translate_to: Optional[str] = None) -> List[Dict]:
+        return self.fixtures[video_id]['segments'][_segment_key(language_code, translate_to)]
+
+
+class RecordingCaptionSource(CaptionSource):
+    """Wraps another source and saves every response in the fixture format."""
+
+    def __init__(self, inner: CaptionSource, path: str):
+        self.inner = inner
+        self.path = path
+        self.fixtures: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, video_id: str) -> Dict:
+        return self.fixtures.setdefault(video_id, {'tracks': [], 'segments': {}})
+
+    def list_tracks(self, video_id: str) -> List[TrackInfo]:
+        tracks = self.inner.list_tracks(video_id)
+        with self._lock:
+            self._entry(video_id)['tracks'] = [asdict(track) for track in tracks]
+        return tracks
+
+    def fetch(self, video_id: str, language_code: str, translate_to: Optional[str] = None) -> List[Dict]:
+        segments = self.inner.fetch(video_id, language_code, translate_to)
+        with self._lock:
+            self._entry(video_id)['segments'][_segment_key(language_code, translate_to)] = segments
+        return segments
+
+    def save(self):
+        with self._lock, open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.fixtures, f, ensure_ascii=False, indent=1)
+
+
+def _segment_key(language_code: str, translate_to: Optional[str]) -> str:
+    return f"{language_code}>{translate_to}" if translate_to else language_code
+
+
+@dataclass
+class CaptionStats:
+    lookups: int = 0
+    hits: int = 0
+    misses: int = 0
+    errors: int = 0
+    kinds: Counter = field(default_factory=Counter)
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+class CaptionProvider:
+    """Pick and fetch the best caption track for a video.
+
+    Tracks are tried in order: manual tracks in ``languages`` order, then
+    auto-generated ones, then a translation of an available track into the
+    first preferred language. ``prefetch`` lists many videos concurrently so
+    callers can tell up front which ones need Whisper.
+    """
+
+    def __init__(self, source: Optional[CaptionSource] = None, languages: Sequence[str] = DEFAULT_LANGUAGES,
+                 allow_generated: bool = True, allow_translated: bool = True, max_workers: int = 8):
+        self.source = source or TranscriptApiSource()
+        self.languages = list(languages)
+        self.allow_generated = allow_generated
+        self.allow_translated = allow_translated
+        self.max_workers = max_workers
+        self.stats = CaptionStats()
+        self._tracks: Dict[str, List[TrackInfo]] = {}
+        self._lock = threading.Lock()
+
+    def tracks(self, video_id: str) -> List[TrackInfo]:
+        with self._lock:
+            tracks = self._tracks.get(video_id)
+        if tracks is None:
+            tracks = self.source.list_tracks(video_id)
+            with self._lock:
+                self._tracks[video_id] = tracks
+        return tracks
+
+    def select(self, tracks: List[TrackInfo]) -> Optional[Tuple[TrackInfo, str, Optional[str]]]:
+        """Return ``(track, kind, translate_to)`` for the preferred usable track, or None."""
+        by_language = {}
+        for track in tracks:
+            by_language.setdefault((track.language_code, track.is_generated), track)
+        for language in self.languages:
+            if (language, False) in by_language:
+                return by_language[(language, False)], MANUAL, None
+        if self.allow_generated:
+            for language in self.languages:
+                if (language, True) in by_language:
+                    return by_language[(language, True)], GENERATED, None
+        if self.allow_translated and self.languages:
+            target = self.languages[0]
+            # Prefer translating a manual track over an auto-generated one
+            for track in sorted(tracks, key=lambda t: t.is_generated):
+                if track.is_translatable and target in track.translation_languages:
+                    if track.is_generated and not self.allow_generated:
+                        continue
+                    return track, TRANSLATED, target
+        return None
+
+    def available(self, video_id: str) -> Optional[str]:
+        """Return the kind of captions that would be used for a video, or None."""
+        selection = self.select(self.tracks(video_id))
+        return selection[1] if selection else None
+
+    def prefetch(self, video_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+        """List captions for many videos concurrently; maps each ID to ``available()``."""
+        video_ids = list(dict.fromkeys(video_ids))
+
+        def check(video_id):
+            try:
+                return self.available(video_id)
+            except Exception:
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return dict(zip(video_ids, pool.map(check, video_ids)))
+
+    def fetch(self, video_id: str) -> Optional[Captions]:
+        """Return the preferred captions, or None when the video has no usable track."""
+        with self._lock:
+            self.stats.lookups += 1
+        try:
+            selection = self.select(self.tracks(video_id))
+            if selection is not None:
+                track, kind, translate_to = selection
+                segments = self.source.fetch(video_id, track.language_code, translate_to)
+        except Exception as e:
+            logger.warning("Could not fetch captions for %s: %s", video_id, e)
+            with self._lock:
+                self.stats.errors += 1
+                self.stats.misses += 1
+            return None
+        finally:
+            with self._lock:
+                self._tracks.pop(video_id, None)
+
+        with self._lock:
+            if selection is None:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            self.stats.kinds[kind] += 1
+        return Captions(video_id, translate_to or track.language_code, kind, segments,
+                        source_language=track.language_code if translate_to else None)
+
+
+_default_provider = None
+_default_provider_lock = threading.Lock()
+
+
+def get_default_caption_provider() -> CaptionProvider:
+    """Shared provider; ``CAPTION_LANGUAGES`` is a comma-separated preference list."""
+    global _default_provider
+    with _default_provider_lock:
+        if _default_provider is None:
+            languages = [lang.strip() for lang in os.getenv('CAPTION_LANGUAGES', 'en').split(',') if lang.strip()]
+            _default_provider = CaptionProvider(
+                languages=languages or DEFAULT_LANGUAGES,
+                allow_translated=os.getenv('CAPTION_TRANSLATE', '1').lower() not in ('0', 'false', 'no'),
+            )
+        return _default_provider
+
+
+def set_default_caption_provider(provider: Optional[CaptionProvider]):
+    """Replace the shared provider (e.g. with a fixture-backed one); None restores the env default."""
+    global _default_provider
+    with _default_provider_lock:
+        _default_provider = provider
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check which videos have usable captions.")
+    parser.add_argument('video_ids', nargs='+', help="YouTube video IDs")
+    parser.add_argument('--languages', default='en', help="Comma-separated preference list")
+    parser.add_argument('--fixture', help="Replay responses from this fixture file")
+    parser.add_argument('--record', help="Fetch the chosen tracks and save all responses to this fixture file")
+    args = parser.parse_args()
+
+    source = FixtureCaptionSource(args.fixture) if args.fixture else TranscriptApiSource()
+    if args.record:
+        source = RecordingCaptionSource(source, args.record)
+    provider = CaptionProvider(source, languages=args.languages.split(','))
+    availability = provider.prefetch(args.video_ids)
+    for video_id, kind in availability.items():
+        print(f"{video_id}: {kind or 'no captions (Whisper needed)'}")
+    if args.record:
+        for video_id, kind in availability.items():
+            if kind:
+                provider.fetch(video_id)
+        source.save()
+    hits = sum(1 for kind in availability.values() if kind)
+    print(f"Caption hit rate: {hits}/{len(availability)}")
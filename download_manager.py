@@ -0,0 +1,243 @@
+"""Audio-only, resumable YouTube downloads shared across a batch.
+
+``extract_video_id`` parses IDs out of links locally (no pytube object, no
+network). ``DownloadManager`` fetches the smallest audio-only stream that
+still meets ``min_abr_kbps`` with yt_dlp. Downloads use concurrent
+fragments (DASH/HLS) and chunked HTTP ranges, and they resume from the
+``.part`` file of an interrupted run. The manager caps in-flight downloads
+with a semaphore and total bandwidth by splitting ``rate_limit`` evenly
+between the download slots (yt_dlp rate limits are per download). Every
+download's bytes, seconds and throughput are recorded in ``stats``.
+
+The downloaded file is compressed audio. Callers decode it with
+``audio_stream.load_pcm`` and delete it; nothing of the video stream is
+fetched or kept.
+"""
+import os
+import re
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from instrumentation import get_metrics
+
+DEFAULT_WORK_DIR = os.path.join(tempfile.gettempdir(), 'yt-transcript-downloads')
+# Speech transcribed at 16 kHz gains nothing from more than this
+DEFAULT_MIN_ABR_KBPS = 48
+HTTP_CHUNK_SIZE = 10 * 1024 * 1024
+
+_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+_PATH_PREFIXES = ('/shorts/', '/embed/', '/live/', '/v/', '/e/')
+
+
+def _on_domain(host: str, *domains: str) -> bool:
+    """True when ``host`` is one of ``domains`` or a subdomain of one (not merely ending in it)."""
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+def extract_video_id(link: str) -> str:
+    """Return the 11-character video ID of a YouTube link (or of a bare ID)."""
+    link = link.strip()
+    if _ID_RE.match(link):
+        return link
+    parsed = urlparse(link if '://' in link else f"https://{link}")
+    host = (parsed.hostname or '').lower()
+    candidate = None
+    if _on_domain(host, 'youtu.be'):
+        candidate = parsed.path.lstrip('/').split('/')[0]
+    elif _on_domain(host, 'youtube.com', 'youtube-nocookie.com'):
+        candidate = (parse_qs(parsed.query).get('v') or [None])[0]
+        if candidate is None:
+            for prefix in _PATH_PREFIXES:
+                if parsed.path.startswith(prefix):
+                    candidate = parsed.path[len(prefix):].split('/')[0]
+                    break
+    if candidate and _ID_RE.match(candidate):
+        return candidate
+    raise ValueError(f"Not a YouTube video link: {link!r}")
+
+
+def audio_format(min_abr_kbps: int = DEFAULT_MIN_ABR_KBPS) -> str:
+    """yt_dlp format selector: smallest audio-only stream of at least ``min_abr_kbps``.
+
+    Falls back to the best audio-only stream when bitrates are unknown;
+    there is deliberately no fallback to formats that carry video.
+    """
+    return f"worstaudio[vcodec=none][abr>={min_abr_kbps}]/bestaudio[vcodec=none]/bestaudio"
+
+
+def parse_rate(value) -> Optional[float]:
+    """Parse ``"5M"``, ``"800K"`` or a plain number into bytes per second (binary units)."""
+    if value in (None, '', 0):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMG]?)i?B?\s*', str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid rate {value!r}; use e.g. 800K or 5M")
+    return float(match.group(1)) * 1024 ** ' KMG'.index(match.group(2).upper() or ' ')
+
+
+@dataclass
+class DownloadResult:
+    video_id: str
+    path: str
+    bytes: int
+    seconds: float
+    resumed_from: int = 0
+    format_id: Optional[str] = None
+    abr_kbps: Optional[float] = None
+
+    @property
+    def throughput_bps(self) -> float:
+        """Bytes fetched in this run per second (a resumed prefix is not counted)."""
+        return (self.bytes - self.resumed_from) / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class DownloadStats:
+    downloads: int = 0
+    failures: int = 0
+    resumed: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    results: List[DownloadResult] = field(default_factory=list)
+
+    @property
+    def throughput_bps(self) -> float:
+        """Mean per-download throughput (bytes fetched / time spent downloading)."""
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+
+class DownloadManager:
+    def __init__(self, max_concurrent: int = 4, rate_limit=None, fragments: int = 4,
+                 min_abr_kbps: int = DEFAULT_MIN_ABR_KBPS, work_dir: str = DEFAULT_WORK_DIR,
+                 retries: int = 10, ydl_options: Optional[Dict] = None):
+        self.max_concurrent = max_concurrent
+        self.rate_limit = parse_rate(rate_limit)
+        self.fragments = fragments
+        self.min_abr_kbps = min_abr_kbps
+        self.work_dir = work_dir
+        self.retries = retries
+        # Extra yt_dlp options (e.g. proxy, cookiefile)
+        self.ydl_options = ydl_options or {}
+        self.stats = DownloadStats()
+        self._slots = threading.Semaphore(max_concurrent)
+        self._lock = threading.Lock()
+
+    @property
+    def per_download_rate(self) -> Optional[float]:
+        """Each slot's share of the total bandwidth cap."""
+        return self.rate_limit / self.max_concurrent if self.rate_limit else None
+
+    def _options(self, outtmpl: str, hook: Callable) -> Dict:
+        options = {
+            'format': audio_format(self.min_abr_kbps),
+            'outtmpl': outtmpl,
+            'quiet': True,
+            'noprogress': True,
+            'noplaylist': True,
+            'continuedl': True,
+            'nopart': False,
+            'retries': self.retries,
+            'fragment_retries': self.retries,
+            'concurrent_fragment_downloads': self.fragments,
+            'http_chunk_size': HTTP_CHUNK_SIZE,
+            'progress_hooks': [hook],
+        }
+        if self.per_download_rate:
+            options['ratelimit'] = self.per_download_rate
+        options.update(self.ydl_options)
+        return options
+
+    @staticmethod
+    def _partial_bytes(prefix: str, directory: str) -> int:
+        """Size of an unfinished ``.part`` download left by an earlier run."""
+        return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+                   if name.startswith(prefix + '.') and name.endswith('.part'))
+
+    def download(self, link: str, video_id: Optional[str] = None,
+                 progress: Optional[Callable[[int, Optional[float]], None]] = None) -> DownloadResult:
+        """Download a video's audio into ``work_dir``, blocking while all slots are busy.
+
+        ``progress(bytes_read, fraction)`` follows yt_dlp's progress reports;
+        ``fraction`` is None when the size is unknown.
+        """
+        import yt_dlp
+
+        video_id = video_id or extract_video_id(link)
+        os.makedirs(self.work_dir, exist_ok=True)
+        resumed_from = self._partial_bytes(video_id, self.work_dir)
+
+        def hook(update):
+            if progress is None or update.get('status') != 'downloading':
+                return
+            total = update.get('total_bytes') or update.get('total_bytes_estimate')
+            done = update.get('downloaded_bytes') or 0
+            progress(done, min(1.0, done / total) if total else None)
+
+        outtmpl = os.path.join(self.work_dir, f"{video_id}.%(ext)s")
+        with self._slots:
+            start = time.perf_counter()
+            try:
+                with yt_dlp.YoutubeDL(self._options(outtmpl, hook)) as ydl:
+                    info = ydl.extract_info(link, download=True)
+                    requested = (info.get('requested_downloads') or [{}])[0]
+                    path = requested.get('filepath') or ydl.prepare_filename(info)
+            except Exception:
+                with self._lock:
+                    self.stats.failures += 1
+                get_metrics().inc('download_failures_total')
+                raise
+            seconds = time.perf_counter() - start
+
+        result = DownloadResult(video_id, path, os.path.getsize(path), seconds, resumed_from,
+                                info.get('format_id'), info.get('abr'))
+        with self._lock:
+            self.stats.downloads += 1
+            self.stats.resumed += bool(resumed_from)
+            self.stats.bytes += result.bytes - resumed_from
+            self.stats.seconds += seconds
+            self.stats.results.append(result)
+        metrics = get_metrics()
+        metrics.inc('download_bytes_total', result.bytes - resumed_from)
+        metrics.observe('download_throughput_bytes_per_second', result.throughput_bps)
+        return result
+
+    def fetch_samples(self, link: str, video_id: Optional[str] = None, progress=None, keep: bool = False):
+        """Download, decode to 16 kHz float32 and (unless ``keep``) delete the compressed file.
+
+        Returns ``(samples, DownloadResult)``.
+        """
+        from audio_stream import load_pcm
+
+        result = self.download(link, video_id, progress)
+        try:
+            samples = load_pcm(result.path)
+        finally:
+            if not keep:
+                os.remove(result.path)
+        return samples, result
+
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+def get_default_download_manager() -> DownloadManager:
+    """Shared manager configured by ``DOWNLOAD_MAX_CONCURRENT``, ``DOWNLOAD_RATE_LIMIT``,
+    ``DOWNLOAD_FRAGMENTS``, ``DOWNLOAD_MIN_ABR`` and ``DOWNLOAD_DIR``."""
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            _default_manager = DownloadManager(
+                max_concurrent=int(os.getenv('DOWNLOAD_MAX_CONCURRENT', '4')),
+                rate_limit=os.getenv('DOWNLOAD_RATE_LIMIT'),
+                fragments=int(os.getenv('DOWNLOAD_FRAGMENTS', '4')),
+                min_abr_kbps=int(os.getenv('DOWNLOAD_MIN_ABR', str(DEFAULT_MIN_ABR_KBPS))),
+                work_dir=os.getenv('DOWNLOAD_DIR', DEFAULT_WORK_DIR),
+            )
+        return _default_manager
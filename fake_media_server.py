@@ -0,0 +1,151 @@
+"""Minimal local stand-in for a media CDN, for exercising downloads offline.
+
+    server = FakeMediaServer({'clip.webm': data}, bytes_per_second=2_000_000).start()
+    manager.download(f"{server.base_url}/clip.webm", video_id='clip0000000')
+    server.stop()
+
+Files are served as ``audio/webm`` with HTTP range support, so yt_dlp's
+generic extractor treats them as audio-only and can resume them.
+``bytes_per_second`` throttles every response, and ``drop_after`` cuts the
+first ranged response of each file after that many bytes to simulate an
+interrupted download (yt_dlp probes the URL with a plain GET first).
+Every request's path and Range header is recorded in ``requests``.
+"""
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+WRITE_BLOCK = 64 * 1024
+
+
+class FakeMediaServer:
+    def __init__(self, files: Dict[str, bytes], host: str = '127.0.0.1', port: int = 0,
+                 bytes_per_second: Optional[float] = None, drop_after: Optional[int] = None,
+                 content_type: str = 'audio/webm'):
+        self.files = files
+        self.bytes_per_second = bytes_per_second
+        self.drop_after = drop_after
+        self.content_type = content_type
+        self.requests = []
+        self._dropped = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeMediaServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except ConnectionError:
+                    # yt_dlp hangs up on its probe request and on keep-alive connections
+                    pass
+
+            def _resolve(self):
+                name = self.path.split('?', 1)[0].lstrip('/')
+                data = fake.files.get(name)
+                if data is None:
+                    self.send_error(404)
+                    return None, None, None
+                start, end = 0, len(data) - 1
+                match = re.match(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+                if match and (match.group(1) or match.group(2)):
+                    if match.group(1):
+                        start = int(match.group(1))
+                        end = min(int(match.group(2)), end) if match.group(2) else end
+                    else:
+                        start = max(0, len(data) - int(match.group(2)))
+                    if start > end:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f"bytes */{len(data)}")
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return None, None, None
+                with fake._lock:
+                    fake.requests.append({'method': self.command, 'path': name,
+                                          'range': self.headers.get('Range')})
+                self.send_response(206 if match and (match.group(1) or match.group(2)) else 200)
+                self.send_header('Content-Type', fake.content_type)
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('Content-Length', str(end - start + 1))
+                if match and (match.group(1) or match.group(2)):
+                    self.send_header('Content-Range', f"bytes {start}-{end}/{len(data)}")
+                self.end_headers()
+                return name, data, (start, end)
+
+            def do_HEAD(self):
+                self._resolve()
+
+            def do_GET(self):
+                name, data, span = self._resolve()
+                if data is None:
+                    return
+                start, end = span
+                with fake._lock:
+                    drop = (fake.drop_after is not None and self.headers.get('Range')
+                            and name not in fake._dropped)
+                    if drop:
+                        fake._dropped.add(name)
+                sent = 0
+                began = time.perf_counter()
+                for offset in range(start, end + 1, WRITE_BLOCK):
+                    block = data[offset:min(offset + WRITE_BLOCK, end + 1)]
+                    if drop and sent + len(block) > fake.drop_after:
+                        self.wfile.write(block[:fake.drop_after - sent])
+                        self.wfile.flush()
+                        self.close_connection = True
+                        return
+                    self.wfile.write(block)
+                    sent += len(block)
+                    if fake.bytes_per_second:
+                        # Sleep off any lead over the configured rate
+                        lead = sent / fake.bytes_per_second - (time.perf_counter() - began)
+                        if lead > 0:
+                            time.sleep(lead)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description="Serve a directory of media files with range support.")
+    parser.add_argument('directory')
+    parser.add_argument('--port', type=int, default=8098)
+    parser.add_argument('--rate', type=float, default=None, help="Bytes per second per response")
+    args = parser.parse_args()
+    files = {}
+    for name in os.listdir(args.directory):
+        with open(os.path.join(args.directory, name), 'rb') as f:
+            files[name] = f.read()
+    server = FakeMediaServer(files, port=args.port, bytes_per_second=args.rate)
+    print(f"Fake media server listening on {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
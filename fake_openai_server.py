@@ -0,0 +1,167 @@
+"""Minimal local stand-in for the OpenAI chat completions endpoint.
+
+Lets the summarizer and analyzer run offline:
+
+    server = FakeOpenAIServer(latency=0.05).start()
+    client = AsyncOpenAI(api_key="test", base_url=server.base_url)
+    ...
+    server.stop()
+
+Each reply echoes the first ``reply_words`` words of the last user message,
+so summaries shrink deterministically at every level. ``fail_every`` makes
+every n-th request return a 429 with a ``Retry-After`` header.
+``requests_per_minute`` and ``tokens_per_minute`` enforce limits over a
+sliding one-minute window the way the real API does: a request that would
+exceed either one gets a 429 whose ``Retry-After`` says when it would fit.
+Prompt tokens are counted as words.
+"""
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+class FakeOpenAIServer:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 reply_words: int = 30, fail_every: Optional[int] = None, retry_after: float = 0.0,
+                 requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        self.latency = latency
+        self.reply_words = reply_words
+        self.fail_every = fail_every
+        self.retry_after = retry_after
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests = []
+        self.rate_limited = 0
+        # (accepted_at, prompt_tokens) of the requests in the last minute
+        self._window = deque()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reply(self, body: dict) -> str:
+        """Build the completion text for a request body."""
+        user_messages = [m['content'] for m in body.get('messages', []) if m.get('role') == 'user']
+        prompt = user_messages[-1] if user_messages else ''
+        # Drop the instruction line(s) and keep the text being processed
+        content = prompt.split('\n\n', 1)[-1]
+        return " ".join(content.split()[:self.reply_words])
+
+    def _admit(self, tokens: int) -> Optional[float]:
+        """Record a request against the rate limits; return seconds to wait when it does not fit."""
+        if not self.requests_per_minute and not self.tokens_per_minute:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            while self._window and now - self._window[0][0] >= 60:
+                self._window.popleft()
+            wait = None
+            if self.requests_per_minute and len(self._window) >= self.requests_per_minute:
+                wait = 60 - (now - self._window[0][0])
+            elif self.tokens_per_minute:
+                used = sum(count for _, count in self._window)
+                for at, count in self._window:
+                    if used + tokens <= self.tokens_per_minute:
+                        break
+                    used -= count
+                    wait = 60 - (now - at)
+            if wait is not None:
+                self.rate_limited += 1
+                return max(wait, 0.001)
+            self._window.append((now, tokens))
+            return None
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, payload, headers=None):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self._send(404, {'error': {'message': 'not found', 'type': 'invalid_request_error'}})
+                    return
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                with fake._lock:
+                    fake.requests.append(body)
+                    count = len(fake.requests)
+                if fake.fail_every and count % fake.fail_every == 0:
+                    self._send(429, {'error': {'message': 'rate limited', 'type': 'rate_limit_exceeded'}},
+                               {'Retry-After': str(fake.retry_after)})
+                    return
+                prompt_tokens = sum(len(m.get('content', '').split()) for m in body.get('messages', []))
+                wait = fake._admit(prompt_tokens)
+                if wait is not None:
+                    self._send(429, {'error': {'message': 'rate limit reached', 'type': 'rate_limit_exceeded'}},
+                               {'Retry-After': f"{wait:.3f}"})
+                    return
+                if fake.latency:
+                    time.sleep(fake.latency)
+                content = fake.reply(body)
+                completion_tokens = len(content.split())
+                self._send(200, {
+                    'id': f'chatcmpl-fake-{count}',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': body.get('model', 'fake'),
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': content},
+                        'finish_reason': 'stop',
+                    }],
+                    'usage': {
+                        'prompt_tokens': prompt_tokens,
+                        'completion_tokens': completion_tokens,
+                        'total_tokens': prompt_tokens + completion_tokens,
+                    },
+                })
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI chat completions server.")
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--fail-every', type=int, default=None)
+    parser.add_argument('--rpm', type=int, default=None, help="Requests per minute before 429s")
+    parser.add_argument('--tpm', type=int, default=None, help="Prompt tokens (words) per minute before 429s")
+    args = parser.parse_args()
+    server = FakeOpenAIServer(port=args.port, latency=args.latency, fail_every=args.fail_every,
+                              requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+    print(f"Fake OpenAI server listening on {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,485 @@
+"""Transcribe whole folders (or glob patterns) of local recordings.
+
+``find_media`` expands folders, globs and plain paths into media files:
+anything with an extension in ``MEDIA_EXTENSIONS`` or, with
+``probe_unknown``, any other file ffprobe can read. ``FolderIngester`` runs
+them through ``VideoTranscriber``: a thread pool hashes the upcoming files
+and decodes their audio (one ffmpeg thread each) up to ``decode_ahead``
+files in front of inference, so decoding overlaps Whisper instead of
+alternating with it.
+
+A file whose content hash is already recorded as transcribed in the
+processed store is skipped, as is a second copy of the same content within
+one run once the first copy is transcribed (if the first copy fails, the
+next one is tried). If only the transcript cache knows the hash (e.g. the
+file was transcribed from the UI), the transcript is written again without
+decoding.
+Decoded audio is fingerprinted in the decode pool as well: stretches heard
+before in another recording (a re-export, a cut-down copy) reuse that
+recording's segments, and only the rest goes to Whisper.
+
+``workers`` Whisper processes run at once (1 keeps the model in this
+process). Each gets ``plan_threads`` intra-op threads, i.e. the cores left
+after the decoders split evenly between the workers, so decoders and
+workers together don't oversubscribe the machine. The run ends with
+aggregate real-time factors in ``IngestStats``.
+
+Usage:
+    python folder_ingest.py /archive/recordings
+    python folder_ingest.py "/archive/**/*.mkv" --workers 2 --decode-workers 2 --output-dir transcripts
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from audio_stream import SAMPLE_RATE, probe_duration, write_wav
+from instrumentation import Trace, configure_logging, get_metrics, stage, use_trace
+from media_cache import file_key
+from processed_store import get_default_store
+
+logger = logging.getLogger(__name__)
+
+# Containers ffmpeg reads that are accepted without probing
+MEDIA_EXTENSIONS = frozenset({
+    '.3gp', '.avi', '.flv', '.m2ts', '.m4v', '.mkv', '.mov', '.mp4', '.mpeg', '.mpg', '.mts', '.mxf',
+    '.ogv', '.ts', '.vob', '.webm', '.wmv',
+    '.aac', '.aif', '.aiff', '.amr', '.flac', '.m4a', '.mka', '.mp3', '.oga', '.ogg', '.opus', '.wav', '.wma',
+})
+_GLOB_CHARS = set('*?[')
+
+
+def _is_media(path: str, probe_unknown: bool) -> bool:
+    if os.path.splitext(path)[1].lower() in MEDIA_EXTENSIONS:
+        return True
+    return probe_unknown and probe_duration(path) is not None
+
+
+def find_media(sources: Iterable[str], recursive: bool = True, probe_unknown: bool = False) -> Iterator[str]:
+    """Yield each media file under the given folders, glob patterns and paths once.
+
+    Paths named explicitly are always yielded; files found by walking or
+    globbing are filtered by extension (or ffprobe with ``probe_unknown``).
+    Hidden files and folders are ignored and results are sorted per source.
+    """
+    seen = set()
+    for source in sources:
+        if os.path.isfile(source):
+            candidates, explicit = [source], True
+        elif os.path.isdir(source):
+            candidates, explicit = [], False
+            for root, dirs, files in os.walk(source):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.')) if recursive else []
+                candidates.extend(os.path.join(root, name) for name in files if not name.startswith('.'))
+        elif _GLOB_CHARS & set(source):
+            candidates, explicit = glob.glob(source, recursive=recursive), False
+            candidates = [path for path in candidates if os.path.isfile(path)]
+        else:
+            logger.warning("No such file or folder: %s", source)
+            continue
+        for path in sorted(candidates):
+            real = os.path.realpath(path)
+            if real in seen or not (explicit or _is_media(path, probe_unknown)):
+                continue
+            seen.add(real)
+            yield path
+
+
+def plan_threads(workers: int, decode_workers: int, cpu_count: Optional[int] = None) -> int:
+    """Intra-op threads per Whisper worker: the cores the decoders leave, split between workers."""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    available = max(workers, cpu_count - decode_workers)
+    return max(1, available // workers)
+
+
+@dataclass
+class IngestResult:
+    path: str
+    key: Optional[str] = None
+    status: str = 'pending'
+    transcript_file: Optional[str] = None
+    audio_s: float = 0.0
+    decode_s: float = 0.0
+    inference_s: float = 0.0
+    reused_s: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class IngestStats:
+    files: int = 0
+    done: int = 0
+    cached: int = 0
+    skipped: int = 0
+    failed: int = 0
+    audio_seconds: float = 0.0
+    decode_seconds: float = 0.0
+    inference_seconds: float = 0.0
+    reused_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    workers: int = 1
+    decode_workers: int = 1
+    torch_threads: int = 1
+    results: List[IngestResult] = field(default_factory=list)
+
+    @property
+    def rtf(self) -> float:
+        """Wall time per second of newly transcribed audio (below 1 is faster than real time)."""
+        return self.wall_seconds / self.audio_seconds if self.audio_seconds else 0.0
+
+    @property
+    def inference_rtf(self) -> float:
+        """Whisper time per second of audio, summed over the workers."""
+        return self.inference_seconds / self.audio_seconds if self.audio_seconds else 0.0
+
+    @property
+    def decode_rtf(self) -> float:
+        return self.decode_seconds / self.audio_seconds if self.audio_seconds else 0.0
+
+    def to_dict(self, include_results: bool = False) -> Dict:
+        report = {k: round(v, 3) if isinstance(v, float) else v
+                  for k, v in asdict(self).items() if k != 'results'}
+        report.update(rtf=round(self.rtf, 4), inference_rtf=round(self.inference_rtf, 4),
+                      decode_rtf=round(self.decode_rtf, 4))
+        if include_results:
+            report['results'] = [asdict(result) for result in self.results]
+        return report
+
+
+@dataclass
+class _Prepared:
+    result: IngestResult
+    name: str
+    trace: Trace
+    samples: object = None
+    audio_path: Optional[str] = None
+    cached: Optional[Dict] = None
+    plan: object = None
+    error: Optional[BaseException] = None
+    # Another file in this run claimed the same content first
+    duplicate: bool = False
+
+
+class FolderIngester:
+    def __init__(self, transcriber=None, workers: int = 1, decode_workers: int = 2, decode_ahead: int = 2,
+                 output_dir: str = "transcripts", threads: Optional[int] = None, resume: bool = True,
+                 store=None):
+        if transcriber is None:
+            from video_transcriber import VideoTranscriber
+
+            transcriber = VideoTranscriber()
+        self.transcriber = transcriber
+        self.workers = max(1, workers)
+        self.decode_workers = max(1, decode_workers)
+        # Decoded files allowed to wait for a free worker (bounds memory)
+        self.decode_ahead = max(0, decode_ahead)
+        self.output_dir = output_dir
+        # threads is the inference thread count per worker (default: planned from the core count)
+        self.torch_threads = threads or transcriber.config.threads or plan_threads(self.workers, self.decode_workers)
+        self.resume = resume
+        self.store = store or get_default_store()
+        self.stats = IngestStats(workers=self.workers, decode_workers=self.decode_workers,
+                                 torch_threads=self.torch_threads)
+        # Content hashes claimed by a file in this run, and those whose file has been settled
+        self._claimed = set()
+        self._claimed_lock = threading.Lock()
+        self._settled = set()
+        # Duplicates waiting for the claiming file to finish, and those to decode again after it failed
+        self._waiting: Dict[str, List[_Prepared]] = {}
+        self._retry = deque()
+        self._temp_dir = None
+
+    def _prepare(self, path: str, key: Optional[str] = None) -> _Prepared:
+        """Decode-pool step: hash the file, decide whether it needs Whisper and decode it if so."""
+        name = os.path.splitext(os.path.basename(path))[0]
+        prepared = _Prepared(IngestResult(path, key), name, Trace(name))
+        result = prepared.result
+        with use_trace(prepared.trace):
+            try:
+                if result.key is None:
+                    with stage('hash', bytes=os.path.getsize(path)):
+                        result.key = file_key(path)
+                stored = self.store.get_status(result.key) if self.resume else None
+                if stored and stored.whisper_done:
+                    result.status = 'skipped'
+                    return prepared
+                with self._claimed_lock:
+                    prepared.duplicate = result.key in self._claimed
+                    self._claimed.add(result.key)
+                if prepared.duplicate:
+                    return prepared
+                prepared.cached = self.transcriber.cache.get_transcript(result.key, self.transcriber.config.cache_tag)
+                if prepared.cached is not None:
+                    return prepared
+                start = time.perf_counter()
+                samples = self.transcriber.decode_audio(path, result.key, threads=1)
+                result.decode_s = time.perf_counter() - start
+                result.audio_s = len(samples) / SAMPLE_RATE
+                prepared.plan = self.transcriber.plan_reuse(samples, result.key)
+                if self.workers == 1:
+                    prepared.samples = samples
+                else:
+                    # Worker processes read a WAV instead of unpickling the array. It is a private
+                    # copy: the cached one can be evicted or replaced before the worker gets to it.
+                    fd, prepared.audio_path = tempfile.mkstemp(suffix='.wav', dir=self._temp_dir)
+                    os.close(fd)
+                    write_wav(prepared.audio_path, samples)
+            except Exception as e:
+                prepared.error = e
+        return prepared
+
+    def _hold_duplicate(self, prepared: _Prepared) -> bool:
+        """Decide on a copy of content another file claimed; True while it waits or is queued to retry.
+
+        Once the claiming file has finished without failing, the copy is
+        skipped (and False returned so it is finished as such).
+        """
+        key = prepared.result.key
+        if key in self._settled:
+            prepared.result.status = 'skipped'
+            return False
+        with self._claimed_lock:
+            claimed = key in self._claimed
+        if claimed:
+            self._waiting.setdefault(key, []).append(prepared)
+        else:
+            self._retry.append(prepared)
+        return True
+
+    def _release(self, prepared: _Prepared, progress=None):
+        """Settle the claim of a finished file: skip its waiting copies, or retry them if it failed."""
+        key = prepared.result.key
+        waiting = self._waiting.pop(key, [])
+        if prepared.result.status == 'failed':
+            with self._claimed_lock:
+                self._claimed.discard(key)
+            self._retry.extend(waiting)
+            return
+        self._settled.add(key)
+        for duplicate in waiting:
+            duplicate.result.status = 'skipped'
+            self._finish(duplicate, progress=progress)
+
+    def _update_plan(self, prepared: _Prepared):
+        """Settle what the file can reuse, just before it would go to Whisper.
+
+        Files decoded ahead were matched before the files in front of them
+        were recorded, so a file without matches is looked up once more. A
+        file heard entirely before needs no inference and counts as cached.
+        """
+        plan = prepared.plan
+        if plan is None or prepared.error is not None:
+            return
+        tag = self.transcriber.config.cache_tag
+        try:
+            if not plan.matches:
+                plan = prepared.plan = self.transcriber.fingerprints.plan_fingerprint(plan.fingerprint,
+                                                                                      prepared.result.key, tag)
+            prepared.result.reused_s = plan.reused_s
+            if plan.matches and not plan.regions:
+                prepared.cached = plan.complete(None)
+                self.transcriber.cache.put_transcript(prepared.result.key, tag, prepared.cached)
+                prepared.samples = None
+        except Exception as e:
+            prepared.error = e
+
+    def _transcribe_in_process(self, prepared: _Prepared) -> Dict:
+        result = self.transcriber.transcribe_samples(prepared.samples, prepared.result.key,
+                                                     threads=self.torch_threads, plan=prepared.plan)
+        prepared.samples = None
+        return result
+
+    def _record_worker_inference(self, prepared: _Prepared, offset: float):
+        """Account a worker process's inference as a stage of the file's trace."""
+        seconds = prepared.result.inference_s
+        get_metrics().observe('pipeline_stage_seconds', seconds, stage='inference')
+        prepared.trace.add({'stage': 'inference', 'offset_s': round(offset, 4), 'duration_s': round(seconds, 4),
+                            'thread': 'worker-process', 'model': self.transcriber.config.cache_tag,
+                            'audio_s': round(prepared.result.audio_s, 2)})
+
+    def _finish(self, prepared: _Prepared, whisper_result: Optional[Dict] = None, progress=None):
+        """Write the transcript (unless skipped or failed), record the outcome and close the trace."""
+        result = prepared.result
+        error = prepared.error
+        if prepared.audio_path is not None and os.path.exists(prepared.audio_path):
+            os.remove(prepared.audio_path)
+        with use_trace(prepared.trace):
+            if error is None and result.status != 'skipped':
+                try:
+                    whisper_result = whisper_result or prepared.cached
+                    output_dir = self.transcriber.create_output_directory(prepared.name, base_dir=self.output_dir)
+                    result.transcript_file = self.transcriber.save_transcript(whisper_result, prepared.name,
+                                                                              output_dir, result.key)
+                    self.store.update_status(result.key, whisper_done=True,
+                                             artifacts={'transcript': result.transcript_file, 'source': result.path})
+                    result.status = 'cached' if prepared.cached is not None else 'done'
+                except Exception as e:
+                    error = e
+            if error is not None:
+                result.status, result.error = 'failed', str(error)
+        prepared.trace.finish(error)
+
+        stats = self.stats
+        setattr(stats, result.status, getattr(stats, result.status) + 1)
+        stats.results.append(result)
+        stats.reused_seconds += result.reused_s
+        if result.status == 'done':
+            stats.audio_seconds += result.audio_s
+            stats.decode_seconds += result.decode_s
+            stats.inference_seconds += result.inference_s
+        metrics = get_metrics()
+        metrics.inc('ingest_files_total', status=result.status)
+        if result.audio_s and result.status == 'done':
+            metrics.inc('ingest_audio_seconds_total', result.audio_s)
+        log = logger.warning if result.status == 'failed' else logger.info
+        log("%s: %s%s", result.status, result.path, f" ({result.error})" if result.error else "")
+        if progress is not None:
+            progress('ingest', None, f"{len(stats.results)} files finished, last {prepared.name}: {result.status}")
+        if result.key is not None and not prepared.duplicate:
+            self._release(prepared, progress)
+
+    def run(self, paths: Iterable[str], progress=None) -> IngestStats:
+        """Transcribe every path in order and return the aggregate stats.
+
+        ``progress(stage, fraction, detail)`` is called as each file finishes
+        (``fraction`` is None: the number of files is not known up front).
+        """
+        from audio_chunking import init_worker_threads, transcribe_wav_file
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        paths = iter(paths)
+        decoding = deque()
+        inferring = {}
+        start = time.perf_counter()
+        logger.info("Ingesting with %d worker(s) x %d thread(s), %d decoder(s), %d file(s) ahead",
+                    self.workers, self.torch_threads, self.decode_workers, self.decode_ahead)
+
+        cpu_pool = None
+        if self.workers > 1:
+            self._temp_dir = tempfile.mkdtemp(prefix='folder_ingest-')
+            cpu_pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker_threads,
+                                           initargs=(self.torch_threads,))
+        try:
+            with ThreadPoolExecutor(max_workers=self.decode_workers, thread_name_prefix='decode') as decode_pool:
+                def refill():
+                    # Busy workers plus decode_ahead files waiting for them
+                    while len(decoding) < self.decode_ahead + 1:
+                        if self._retry:
+                            retry = self._retry.popleft().result
+                            decoding.append(decode_pool.submit(self._prepare, retry.path, retry.key))
+                            continue
+                        path = next(paths, None)
+                        if path is None:
+                            return
+                        self.stats.files += 1
+                        decoding.append(decode_pool.submit(self._prepare, path))
+
+                while True:
+                    refill()
+                    if not (decoding or inferring):
+                        break
+                    if decoding and len(inferring) < self.workers:
+                        prepared = decoding.popleft().result()
+                        refill()
+                        if prepared.duplicate and self._hold_duplicate(prepared):
+                            continue
+                        self._update_plan(prepared)
+                        if (prepared.error is not None or prepared.result.status == 'skipped'
+                                or prepared.cached is not None):
+                            self._finish(prepared, progress=progress)
+                        elif cpu_pool is None:
+                            # Inference runs here while the decode pool works on the next files
+                            began = time.perf_counter()
+                            try:
+                                with use_trace(prepared.trace):
+                                    whisper_result = self._transcribe_in_process(prepared)
+                            except Exception as e:
+                                prepared.error = e
+                                whisper_result = None
+                            prepared.result.inference_s = time.perf_counter() - began
+                            self._finish(prepared, whisper_result, progress)
+                        else:
+                            plan = prepared.plan
+                            regions = plan.regions if plan is not None and plan.matches else None
+                            future = cpu_pool.submit(transcribe_wav_file, prepared.audio_path,
+                                                     self.transcriber.config, self.transcriber.vad_aggressiveness,
+                                                     regions)
+                            inferring[future] = (prepared, time.perf_counter(), prepared.trace.elapsed())
+                        continue
+
+                    done, _ = wait(inferring, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        prepared, began, offset = inferring.pop(future)
+                        prepared.result.inference_s = time.perf_counter() - began
+                        whisper_result = None
+                        try:
+                            whisper_result = future.result()
+                            self._record_worker_inference(prepared, offset)
+                            if prepared.plan is not None:
+                                whisper_result = prepared.plan.complete(whisper_result)
+                            self.transcriber.cache.put_transcript(prepared.result.key,
+                                                                  self.transcriber.config.cache_tag, whisper_result)
+                        except Exception as e:
+                            prepared.error = e
+                        self._finish(prepared, whisper_result, progress)
+        finally:
+            if cpu_pool is not None:
+                cpu_pool.shutdown(cancel_futures=True)
+                shutil.rmtree(self._temp_dir, ignore_errors=True)
+            self.stats.wall_seconds = time.perf_counter() - start
+        return self.stats
+
+
+def main(argv=None):
+    from inference_backends import BACKENDS
+    from video_transcriber import VideoTranscriber
+
+    parser = argparse.ArgumentParser(description="Transcribe every recording in folders or glob patterns.")
+    parser.add_argument('sources', nargs='+', help="Folders, glob patterns (quote them) or files")
+    parser.add_argument('--output-dir', default="transcripts")
+    parser.add_argument('--workers', type=int, default=1, help="Whisper processes run at once")
+    parser.add_argument('--decode-workers', type=int, default=2, help="Files hashed and decoded at once")
+    parser.add_argument('--decode-ahead', type=int, default=2,
+                        help="Decoded files allowed to wait for a free Whisper worker")
+    parser.add_argument('--threads', type=int, default=None,
+                        help="Inference threads per worker (default: spare cores split between workers)")
+    parser.add_argument('--model', default=None, help="Whisper model size (default: WHISPER_MODEL or base)")
+    parser.add_argument('--backend', default=None, choices=BACKENDS,
+                        help="Inference backend (default: WHISPER_BACKEND or whisper)")
+    parser.add_argument('--no-recursive', action='store_true', help="Only look at the top level of folders")
+    parser.add_argument('--probe-unknown', action='store_true',
+                        help="Also ingest files with other extensions when ffprobe can read them")
+    parser.add_argument('--no-resume', action='store_true', help="Retranscribe files already recorded as done")
+    parser.add_argument('--report', default=None, help="Write the JSON report, with per-file results, here")
+    parser.add_argument('--metrics-file', default=None,
+                        help="Write Prometheus-format metrics here when the run ends")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    ingester = FolderIngester(VideoTranscriber(model_size=args.model, backend=args.backend),
+                              workers=args.workers, decode_workers=args.decode_workers,
+                              decode_ahead=args.decode_ahead, output_dir=args.output_dir, threads=args.threads,
+                              resume=not args.no_resume)
+    stats = ingester.run(find_media(args.sources, recursive=not args.no_recursive,
+                                    probe_unknown=args.probe_unknown))
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(stats.to_dict(include_results=True), f, indent=2)
+    if args.metrics_file:
+        get_metrics().write(args.metrics_file)
+    print(json.dumps(stats.to_dict(), indent=2))
+    return 0 if stats.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Whisper inference backends selectable per run or per node.
+
+``whisper`` is the reference PyTorch model. ``whisper-int8`` applies dynamic
+int8 quantization to its linear layers (the bulk of the encoder/decoder
+compute) and runs on the same code path. ``ctranslate2`` uses faster-whisper
+(CTranslate2) when it is installed, with int8 weights by default.
+
+The backend is encoded in the model registry's precision field, so every
+caller that loads models through ``model_registry.get_model`` picks it up,
+and each backend returns Whisper-shaped ``{'text', 'segments', 'language'}``
+results.
+"""
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+BACKENDS = ('whisper', 'whisper-int8', 'ctranslate2')
+CT2_PREFIX = 'ct2-'
+
+_threads: Optional[int] = None
+
+
+def set_threads(threads: Optional[int]):
+    """Limit intra-op threads for this process (torch now, CTranslate2 at model load)."""
+    global _threads
+    if not threads:
+        return
+    _threads = threads
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+@dataclass(frozen=True)
+class InferenceConfig:
+    model_size: str = "base"
+    backend: str = "whisper"
+    device: str = "cpu"
+    threads: Optional[int] = None
+    compute_type: str = "int8"
+
+    def __post_init__(self):
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {self.backend!r}; choose from {', '.join(BACKENDS)}")
+
+    @property
+    def precision(self) -> str:
+        """Registry precision key for this backend."""
+        if self.backend == 'whisper-int8':
+            return 'int8'
+        if self.backend == 'ctranslate2':
+            return CT2_PREFIX + self.compute_type
+        return 'fp16' if self.device != 'cpu' else 'fp32'
+
+    @property
+    def cache_tag(self) -> str:
+        """Transcript cache tag; the reference backend keeps the bare model size."""
+        return self.model_size if self.backend == 'whisper' else f"{self.model_size}-{self.precision}"
+
+    @classmethod
+    def from_env(cls, **overrides) -> "InferenceConfig":
+        """Read ``WHISPER_MODEL``, ``WHISPER_BACKEND``, ``WHISPER_DEVICE``, ``WHISPER_THREADS``
+        and ``WHISPER_COMPUTE_TYPE``; keyword arguments that are not None win."""
+        threads = os.getenv('WHISPER_THREADS')
+        values = {
+            'model_size': os.getenv('WHISPER_MODEL', 'base'),
+            'backend': os.getenv('WHISPER_BACKEND', 'whisper'),
+            'device': os.getenv('WHISPER_DEVICE', 'cpu'),
+            'threads': int(threads) if threads else None,
+            'compute_type': os.getenv('WHISPER_COMPUTE_TYPE', 'int8'),
+        }
+        values.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(**values)
+
+
+def quantize_int8(model):
+    """Dynamically quantize a Whisper model's linear layers to int8 (CPU only)."""
+    import torch
+    import whisper.model
+
+    # Whisper's Linear subclass only adds dtype casting for fp16; the quantizer
+    # matches exact types, so present them as plain nn.Linear first.
+    for module in model.modules():
+        if type(module) is whisper.model.Linear:
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class CTranslate2Model:
+    """faster-whisper model behind Whisper's ``transcribe`` interface."""
+
+    # Whisper options with a faster-whisper counterpart of the same name
+    PASSTHROUGH = ('language', 'task', 'beam_size', 'best_of', 'patience', 'temperature',
+                   'initial_prompt', 'word_timestamps', 'condition_on_previous_text',
+                   'compression_ratio_threshold', 'no_speech_threshold')
+
+    def __init__(self, size: str, device: str, compute_type: str):
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(size, device=device, compute_type=compute_type, cpu_threads=_threads or 0)
+
+    def transcribe(self, audio, progress=None, **options) -> Dict:
+        """``progress(fraction)`` is called as segments are decoded (Whisper reports it via tqdm)."""
+        kwargs = {k: v for k, v in options.items() if k in self.PASSTHROUGH and v is not None}
+        if 'logprob_threshold' in options:
+            kwargs['log_prob_threshold'] = options['logprob_threshold']
+        segments_iter, info = self.model.transcribe(audio, **kwargs)
+        segments = []
+        for index, seg in enumerate(segments_iter):
+            segment = {
+                'id': index, 'seek': seg.seek, 'start': seg.start, 'end': seg.end, 'text': seg.text,
+                'tokens': list(seg.tokens), 'temperature': seg.temperature, 'avg_logprob': seg.avg_logprob,
+                'compression_ratio': seg.compression_ratio, 'no_speech_prob': seg.no_speech_prob,
+            }
+            if seg.words:
+                segment['words'] = [{'word': w.word, 'start': w.start, 'end': w.end, 'probability': w.probability}
+                                    for w in seg.words]
+            segments.append(segment)
+            if progress is not None and info.duration:
+                progress(min(1.0, seg.end / info.duration))
+        return {'text': "".join(seg['text'] for seg in segments), 'segments': segments,
+                'language': info.language}
+
+
+def load_model(size: str, device: str, precision: str):
+    """Registry loader: build the model for a (size, device, precision) key."""
+    if precision.startswith(CT2_PREFIX):
+        return CTranslate2Model(size, device, precision[len(CT2_PREFIX):])
+
+    import whisper  # pulls in torch; deferred until a model is actually needed
+
+    if precision == 'int8':
+        if device != 'cpu':
+            raise ValueError("int8 dynamic quantization is only supported on CPU")
+        return quantize_int8(whisper.load_model(size, device='cpu'))
+    model = whisper.load_model(size, device=device)
+    if precision == "fp16" and device != "cpu":
+        model = model.half()
+    return model
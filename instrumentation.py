@@ -0,0 +1,309 @@
+"""Pipeline instrumentation: stage timings, metrics, per-video traces and profiling.
+
+Wrap each pipeline step in ``stage(name)``. The block is timed into the
+``pipeline_stage_seconds`` histogram, failures are counted, and the
+``bytes``/``tokens``/``retries`` values the block puts in the yielded dict
+are added to per-stage counters. When a ``Trace`` is active (see
+``trace()``), the stage is also appended to it as a span. Traces live in a
+context variable, so they follow a video through nested calls and asyncio
+tasks. Threads need ``use_trace`` to pick one up, since each thread starts
+with its own context.
+
+Environment:
+    LOG_LEVEL        logging level for ``configure_logging`` (default INFO)
+    TRACE_DIR        write one ``<video_id>.trace.json`` per finished trace
+    PROFILE_SLOW_S   cProfile every trace; keep the ``.prof`` dump (pstats
+                     format, e.g. for snakeviz) when the run took longer
+    PROFILE_DIR      where profile dumps go (default ``profiles``)
+
+Metrics are process-wide (``get_metrics``). ``Metrics.render()`` returns the
+Prometheus text exposition format, and ``write()`` saves it for a textfile
+collector. For sampling profiles, run py-spy against the process. Stage
+log lines carry the thread name, which lets you line them up with py-spy's
+per-thread output.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+# Numeric stage attributes that are also accumulated as counters
+COUNTED_ATTRS = ('bytes', 'tokens', 'prompt_tokens', 'completion_tokens', 'retries')
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('current_trace', default=None)
+
+
+def configure_logging(level: Optional[str] = None):
+    """Set up root logging for the entry points (level from ``LOG_LEVEL``, default INFO)."""
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s [%(threadName)s] %(name)s: %(message)s")
+
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Metrics:
+    """Thread-safe counters and histograms with labels, rendered for Prometheus."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, List]] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            # [per-bucket counts..., sum, count]
+            state = series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def counter_value(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    def render(self) -> str:
+        """Return all series in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, state in sorted(series.items()):
+                    for bound, count in zip(self.buckets, state):
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {state[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {state[-2]:g}")
+                    lines.append(f"{name}_count{_format_labels(key)} {state[-1]}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        """Atomically write ``render()`` to ``path`` (node_exporter textfile collector style)."""
+        # A private temp file: several processes (batch CLI, service) may write the same path
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self.render())
+            # mkstemp creates the file 0600; collectors often run as another user
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+_metrics = Metrics()
+_metrics.describe('pipeline_stage_seconds', "Wall time per pipeline stage")
+_metrics.describe('pipeline_stage_failures_total', "Pipeline stages that raised")
+_metrics.describe('pipeline_traces_total', "Finished per-video traces")
+
+
+def get_metrics() -> Metrics:
+    """Return the process-wide metrics registry."""
+    return _metrics
+
+
+class Trace:
+    """Timed spans of one video's trip through the pipeline."""
+
+    def __init__(self, video_id: Optional[str] = None):
+        self.video_id = video_id
+        self.started = time.time()
+        self.spans: List[Dict] = []
+        self.duration_s: Optional[float] = None
+        self.error: Optional[str] = None
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, span: Dict):
+        with self._lock:
+            self.spans.append(span)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._t0
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span['offset_s'])
+        totals: Dict[str, float] = {}
+        for span in spans:
+            totals[span['stage']] = totals.get(span['stage'], 0.0) + span['duration_s']
+        return {
+            'video_id': self.video_id,
+            'started': self.started,
+            'duration_s': self.duration_s,
+            'error': self.error,
+            'stage_totals_s': {k: round(v, 4) for k, v in totals.items()},
+            'spans': spans,
+        }
+
+    def finish(self, error: Optional[BaseException] = None, trace_dir: Optional[str] = None) -> Optional[str]:
+        """Close the trace and write it to ``trace_dir`` (default ``TRACE_DIR``); return the path."""
+        if self.duration_s is not None:
+            return None
+        self.duration_s = round(self.elapsed(), 4)
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        _metrics.inc('pipeline_traces_total', status='failed' if error is not None else 'done')
+        trace_dir = trace_dir or os.getenv('TRACE_DIR')
+        if not trace_dir:
+            return None
+        os.makedirs(trace_dir, exist_ok=True)
+        name = "".join(c for c in str(self.video_id or 'unknown') if c.isalnum() or c in "_-")
+        path = os.path.join(trace_dir, f"{name}-{int(self.started)}.trace.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=1)
+        return path
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextlib.contextmanager
+def use_trace(active: Optional[Trace]):
+    """Make ``active`` the current trace in this thread/task for the block."""
+    token = _current_trace.set(active)
+    try:
+        yield active
+    finally:
+        _current_trace.reset(token)
+
+
+@contextlib.contextmanager
+def trace(video_id: Optional[str] = None):
+    """Trace one video; inside an active trace this reuses it instead of nesting.
+
+    The outermost block finishes the trace (writing it under ``TRACE_DIR``)
+    and, with ``PROFILE_SLOW_S`` set, profiles the run.
+    """
+    active = _current_trace.get()
+    if active is not None:
+        if video_id and not active.video_id:
+            active.video_id = video_id
+        yield active
+        return
+    active = Trace(video_id)
+    with use_trace(active), profiled(lambda: active.video_id or 'run'):
+        try:
+            yield active
+        except BaseException as e:
+            active.finish(e)
+            raise
+    active.finish()
+
+
+@contextlib.contextmanager
+def stage(name: str, **attrs):
+    """Time a pipeline stage; the yielded dict collects attributes for the span.
+
+    Numeric ``bytes``, ``tokens``, ``prompt_tokens``, ``completion_tokens``
+    and ``retries`` attributes are also added to ``pipeline_stage_<attr>_total``.
+    """
+    active = _current_trace.get()
+    offset = active.elapsed() if active is not None else 0.0
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        _metrics.observe('pipeline_stage_seconds', seconds, stage=name)
+        if error is not None:
+            _metrics.inc('pipeline_stage_failures_total', stage=name)
+        for attr in COUNTED_ATTRS:
+            value = attrs.get(attr)
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and value:
+                _metrics.inc(f'pipeline_stage_{attr}_total', value, stage=name)
+        if active is not None:
+            span = {'stage': name, 'offset_s': round(offset, 4), 'duration_s': round(seconds, 4),
+                    'thread': threading.current_thread().name}
+            span.update(attrs)
+            if error is not None:
+                span['error'] = f"{type(error).__name__}: {error}"
+            active.add(span)
+        logger.debug("stage %s took %.3fs %s", name, seconds, attrs)
+
+
+@contextlib.contextmanager
+def profiled(name, slow_s: Optional[float] = None, profile_dir: Optional[str] = None):
+    """cProfile the block and dump it when it runs longer than ``slow_s`` (default ``PROFILE_SLOW_S``).
+
+    ``name`` may be a callable, evaluated at dump time. Does nothing when
+    no threshold is set or another profiler is already active.
+    """
+    if slow_s is None:
+        threshold = os.getenv('PROFILE_SLOW_S')
+        slow_s = float(threshold) if threshold else None
+    if slow_s is None:
+        yield None
+        return
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ allows one cProfile at a time per process
+        yield None
+        return
+    start = time.perf_counter()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        if elapsed >= slow_s:
+            profile_dir = profile_dir or os.getenv('PROFILE_DIR', 'profiles')
+            os.makedirs(profile_dir, exist_ok=True)
+            label = name() if callable(name) else name
+            label = "".join(c for c in str(label) if c.isalnum() or c in "_-")
+            path = os.path.join(profile_dir, f"{label}-{int(time.time())}.prof")
+            profiler.dump_stats(path)
+            logger.info("Slow run (%.1fs >= %.1fs): profile written to %s", elapsed, slow_s, path)
@@ -0,0 +1,152 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been cancelled."""
+
+
+class QueueFull(Exception):
+    """Raised by ``JobQueue.submit`` when ``max_pending`` is reached."""
+
+
+@dataclass
+class Job:
+    id: int
+    label: str
+    status: str = 'queued'
+    stage: str = ''
+    progress: Optional[float] = None
+    detail: str = ''
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    _cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    _on_update: Optional[Callable[["Job"], None]] = field(default=None, repr=False)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    def report(self, stage: str, progress: Optional[float] = None, detail: str = ''):
+        """Progress callback handed to pipeline functions; also a cancellation point."""
+        self.check_cancelled()
+        self.stage = stage
+        self.progress = progress
+        self.detail = detail
+        self._notify()
+
+    def _notify(self):
+        if self._on_update is not None:
+            self._on_update(self)
+
+
+class JobQueue:
+    """Runs pipeline jobs on background threads.
+
+    ``submit`` returns immediately with a ``Job`` whose status, stage and
+    progress are updated as the work runs. ``on_update`` is called from the
+    worker thread after every change, so GUI callers must hand it over to
+    their own thread (Tk: a queue drained with ``root.after``).
+    """
+
+    def __init__(self, max_workers: int = 2, on_update: Optional[Callable[[Job], None]] = None,
+                 max_pending: Optional[int] = None):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._on_update = on_update
+        self._jobs: Dict[int, Job] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def pending(self) -> int:
+        """Number of jobs queued or running."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status in ('queued', 'running'))
+
+    def submit(self, label: str, fn: Callable[..., Any], *args, **kwargs) -> Job:
+        """Queue ``fn(*args, job=job, **kwargs)`` and return its Job.
+
+        Raises ``QueueFull`` when ``max_pending`` jobs are already waiting or running.
+        """
+        with self._lock:
+            if self.max_pending is not None and sum(
+                    1 for job in self._jobs.values() if job.status in ('queued', 'running')) >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} jobs already pending")
+            job = Job(id=next(self._ids), label=label, _on_update=self._on_update)
+            self._jobs[job.id] = job
+        job._notify()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn, args, kwargs):
+        if job.cancelled:
+            self._finish(job, 'cancelled')
+            return
+        job.status = 'running'
+        job.started_at = time.time()
+        job._notify()
+        try:
+            job.result = fn(*args, job=job, **kwargs)
+        except JobCancelled:
+            self._finish(job, 'cancelled')
+        except Exception as e:
+            # Pipeline code may wrap the JobCancelled raised from a progress report
+            if job.cancelled:
+                self._finish(job, 'cancelled')
+                return
+            job.error = str(e)
+            self._finish(job, 'failed')
+        else:
+            self._finish(job, 'done')
+
+    def _finish(self, job: Job, status: str):
+        job.status = status
+        job.finished_at = time.time()
+        if status == 'done':
+            job.progress = 1.0
+        job._notify()
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def prune(self, max_age_s: float) -> int:
+        """Forget jobs that finished more than ``max_age_s`` ago; returns how many."""
+        cutoff = time.time() - max_age_s
+        with self._lock:
+            stale = [job_id for job_id, job in self._jobs.items()
+                     if job.finished_at is not None and job.finished_at < cutoff]
+            for job_id in stale:
+                del self._jobs[job_id]
+        return len(stale)
+
+    def cancel(self, job_id: int) -> bool:
+        """Request cancellation; running jobs stop at their next progress report."""
+        job = self.get(job_id)
+        if job is None or job.status not in ('queued', 'running'):
+            return False
+        job.cancel()
+        return True
+
+    def shutdown(self, wait: bool = False):
+        for job in self.jobs():
+            job.cancel()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,364 @@
+"""Incremental transcription of live streams and recordings still being written.
+
+``pcm_source`` yields 16 kHz float32 blocks as audio becomes available:
+
+- a 16-bit mono 16 kHz WAV or raw ``.pcm``/``.s16le`` file is tailed directly;
+- any other file is followed by ffmpeg (``-follow 1``), which works for
+  streamable containers (mkv, ts, flv, webm, ...) while they are written.
+  MP4/MOV recordings only become readable once finished, unless fragmented;
+- URLs (HLS, RTMP, HTTP, YouTube live links) are decoded by ffmpeg;
+- ``-`` reads raw s16le 16 kHz mono from stdin, e.g. piped from ffmpeg.
+
+Following a file stops after ``idle_timeout_s`` without new data.
+
+``LiveTranscriber.segments(blocks)`` buffers at most ``window_s`` of audio
+and re-transcribes the buffer every ``step_s`` seconds of new audio, with the
+tail of the committed text as Whisper's prompt. A segment is committed once
+it ends more than ``holdback_s`` before the end of the buffer (so later audio
+can no longer change it). Its audio is then dropped from the buffer.
+Committed segments are yielded with timestamps from the start of the
+stream, and nothing else is kept, so memory stays bounded however long the
+stream runs. ``MarkdownSink`` and ``JsonlSink`` append segments to files,
+and any callable taking a segment dict works as a callback.
+
+Usage:
+    python live_transcriber.py recording.mkv --follow --markdown live.md --jsonl live.jsonl
+    ffmpeg -i rtmp://host/live -f s16le -ac 1 -ar 16000 - | python live_transcriber.py - --markdown live.md
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from audio_stream import SAMPLE_RATE, ffmpeg_pcm_command, wav_data_offset
+from inference_backends import BACKENDS, InferenceConfig, set_threads
+from instrumentation import configure_logging, get_metrics, stage
+from transcript_model import format_clock
+
+logger = logging.getLogger(__name__)
+
+# 0.5 s of 16-bit samples: small reads keep latency low on pipes
+BLOCK_BYTES = SAMPLE_RATE
+RAW_EXTENSIONS = ('.pcm', '.raw', '.s16le')
+
+
+def pcm_blocks(stream, block_bytes: int = BLOCK_BYTES) -> Iterator[np.ndarray]:
+    """Yield float32 blocks from a binary stream of s16le samples until EOF."""
+    read = getattr(stream, 'read1', stream.read)
+    leftover = b''
+    while True:
+        data = read(block_bytes)
+        if not data:
+            return
+        data = leftover + data
+        usable = len(data) - (len(data) % 2)
+        leftover = data[usable:]
+        if usable:
+            yield np.frombuffer(data[:usable], dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def _pcm_offset(path: str) -> Optional[int]:
+    """Byte offset of the samples if ``path`` can be tailed without ffmpeg, else None."""
+    if path.lower().endswith(RAW_EXTENSIONS):
+        return 0
+    try:
+        with wave.open(path, 'rb') as f:
+            if f.getsampwidth() != 2 or f.getnchannels() != 1 or f.getframerate() != SAMPLE_RATE:
+                return None
+        return wav_data_offset(path)[0]
+    except (wave.Error, EOFError, ValueError):
+        return None
+
+
+def tail_pcm(path: str, offset: int = 0, follow: bool = True, idle_timeout_s: float = 30.0,
+             poll_s: float = 0.25, block_bytes: int = BLOCK_BYTES) -> Iterator[np.ndarray]:
+    """Yield float32 blocks from a raw s16le file, waiting for it to grow while ``follow``."""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        leftover = b''
+        idle_since = time.monotonic()
+        while True:
+            data = leftover + f.read(block_bytes)
+            usable = len(data) - (len(data) % 2)
+            leftover = data[usable:]
+            if usable:
+                idle_since = time.monotonic()
+                yield np.frombuffer(data[:usable], dtype=np.int16).astype(np.float32) / 32768.0
+            elif not follow or time.monotonic() - idle_since >= idle_timeout_s:
+                return
+            else:
+                time.sleep(poll_s)
+
+
+def ffmpeg_blocks(source: str, headers: Optional[Dict[str, str]] = None,
+                  input_options: Optional[List[str]] = None) -> Iterator[np.ndarray]:
+    """Decode ``source`` with ffmpeg and yield float32 blocks as they are produced."""
+    # A file, not a pipe: hours of ffmpeg warnings must not fill a pipe buffer and stall it
+    stderr = tempfile.TemporaryFile()
+    process = subprocess.Popen(ffmpeg_pcm_command(source, headers=headers, input_options=input_options),
+                               stdout=subprocess.PIPE, stderr=stderr)
+    try:
+        yield from pcm_blocks(process.stdout)
+        if process.wait() != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"ffmpeg failed to decode {source}: "
+                               f"{stderr.read().decode(errors='replace').strip()}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        stderr.close()
+
+
+def pcm_source(source: str, follow: bool = False, idle_timeout_s: float = 30.0) -> Iterator[np.ndarray]:
+    """Yield 16 kHz float32 blocks from a file, URL or ``-`` (raw s16le on stdin)."""
+    if source == '-':
+        return pcm_blocks(sys.stdin.buffer)
+    if '://' in source or not os.path.exists(source):
+        from download_manager import extract_video_id
+
+        try:
+            extract_video_id(source)
+        except ValueError:
+            return ffmpeg_blocks(source)
+        from audio_stream import youtube_stream_source
+
+        url, headers = youtube_stream_source(source)
+        return ffmpeg_blocks(url, headers=headers)
+    offset = _pcm_offset(source)
+    if offset is not None:
+        return tail_pcm(source, offset, follow=follow, idle_timeout_s=idle_timeout_s)
+    if not follow:
+        return ffmpeg_blocks(source)
+    # ffmpeg's file protocol waits at EOF with -follow; -rw_timeout (microseconds) ends the wait
+    return ffmpeg_blocks(f"file:{os.path.abspath(source)}",
+                         input_options=['-follow', '1', '-rw_timeout', str(int(idle_timeout_s * 1e6))])
+
+
+@dataclass
+class LiveStats:
+    steps: int = 0
+    segments: int = 0
+    audio_seconds: float = 0.0
+    inference_seconds: float = 0.0
+    dropped_seconds: float = 0.0
+
+    @property
+    def rtf(self) -> float:
+        """Inference time per second of stream audio; must stay below 1 to keep up."""
+        return self.inference_seconds / self.audio_seconds if self.audio_seconds else 0.0
+
+
+class LiveTranscriber:
+    def __init__(self, model_size: Optional[str] = None, device: Optional[str] = None,
+                 backend: Optional[str] = None, threads: Optional[int] = None, window_s: float = 30.0,
+                 step_s: float = 5.0, holdback_s: float = 2.0, prompt_chars: int = 200,
+                 language: Optional[str] = None, vad_aggressiveness: Optional[int] = None):
+        if not 0 < step_s <= window_s or holdback_s >= window_s:
+            raise ValueError("need 0 < step_s <= window_s and holdback_s < window_s")
+        self.config = InferenceConfig.from_env(model_size=model_size, device=device, backend=backend,
+                                               threads=threads)
+        self.window_s = window_s
+        self.step_s = step_s
+        self.holdback_s = holdback_s
+        self.prompt_chars = prompt_chars
+        # Detected from the first window with speech unless given, then kept for the stream
+        self.language = language
+        self.vad_aggressiveness = vad_aggressiveness
+        self.stats = LiveStats()
+
+    def _transcribe(self, samples: np.ndarray, prompt: str) -> Dict:
+        from model_registry import get_model
+
+        model = get_model(self.config.model_size, device=self.config.device, precision=self.config.precision)
+        return model.transcribe(samples, initial_prompt=prompt or None, language=self.language,
+                                condition_on_previous_text=False, fp16=self.config.precision == 'fp16')
+
+    def _has_speech(self, samples: np.ndarray) -> bool:
+        if self.vad_aggressiveness is None:
+            return True
+        from vad import detect_speech
+
+        return bool(detect_speech(samples, self.vad_aggressiveness))
+
+    def segments(self, blocks: Iterable[np.ndarray]) -> Iterator[Dict]:
+        """Transcribe a stream of float32 blocks, yielding each segment once it is final.
+
+        Segments are ``{'id', 'start', 'end', 'text', 'language'}`` with times
+        in seconds from the start of the stream.
+        """
+        set_threads(self.config.threads)
+        window = int(self.window_s * SAMPLE_RATE)
+        step = int(self.step_s * SAMPLE_RATE)
+        buffer = np.zeros(0, dtype=np.float32)
+        # Stream time of buffer[0], in samples
+        buffer_start = 0
+        new_samples = 0
+        prompt = ''
+        next_id = 0
+
+        def advance(final: bool):
+            """Transcribe the buffer and return (committed segments, samples to drop)."""
+            buffered_s = len(buffer) / SAMPLE_RATE
+            full = len(buffer) >= window
+            if not self._has_speech(buffer):
+                # Nothing to say about this audio; keep only the holdback for a word starting at the end
+                return [], len(buffer) if final else max(0, len(buffer) - int(self.holdback_s * SAMPLE_RATE))
+            started = time.perf_counter()
+            with stage('inference', model=self.config.cache_tag, live=True, audio_s=round(buffered_s, 2)):
+                result = self._transcribe(buffer, prompt)
+            self.stats.inference_seconds += time.perf_counter() - started
+            self.stats.steps += 1
+            if self.language is None and result['segments']:
+                self.language = result['language']
+            found = [seg for seg in result['segments'] if seg['text'].strip()]
+            if final:
+                return found, len(buffer)
+            committed = [seg for seg in found if seg['end'] <= buffered_s - self.holdback_s]
+            if not committed and full:
+                # A full window must move on: commit all but the segment still being spoken
+                committed = found[:-1] or found
+                if not committed:
+                    return [], len(buffer) - int(self.holdback_s * SAMPLE_RATE)
+            cut = min(len(buffer), int(committed[-1]['end'] * SAMPLE_RATE)) if committed else 0
+            return committed, cut
+
+        def emit(committed, offset_s):
+            nonlocal next_id, prompt
+            for seg in committed:
+                text = seg['text'].strip()
+                segment = {'id': next_id, 'start': round(offset_s + seg['start'], 3),
+                           'end': round(offset_s + seg['end'], 3), 'text': text, 'language': self.language}
+                next_id += 1
+                prompt = (prompt + ' ' + text)[-self.prompt_chars:] if self.prompt_chars else ''
+                self.stats.segments += 1
+                yield segment
+
+        metrics = get_metrics()
+        for block in blocks:
+            if not len(block):
+                continue
+            buffer = np.concatenate([buffer, block])
+            new_samples += len(block)
+            self.stats.audio_seconds += len(block) / SAMPLE_RATE
+            if new_samples < step and len(buffer) < window:
+                continue
+            new_samples = 0
+            committed, cut = advance(final=False)
+            yield from emit(committed, buffer_start / SAMPLE_RATE)
+            buffer, buffer_start = buffer[cut:], buffer_start + cut
+            if len(buffer) > window:
+                # Only when inference produces no usable cut; never hold more than one window
+                excess = len(buffer) - window
+                self.stats.dropped_seconds += excess / SAMPLE_RATE
+                logger.warning("Dropping %.1fs of untranscribed audio to bound memory", excess / SAMPLE_RATE)
+                buffer, buffer_start = buffer[excess:], buffer_start + excess
+            metrics.observe('live_commit_lag_seconds', len(buffer) / SAMPLE_RATE)
+
+        if len(buffer) >= SAMPLE_RATE // 10:
+            committed, _ = advance(final=True)
+            yield from emit(committed, buffer_start / SAMPLE_RATE)
+
+    def run(self, blocks: Iterable[np.ndarray], sinks: Iterable[Callable[[Dict], None]] = ()) -> LiveStats:
+        """Transcribe the stream, passing each committed segment to every sink."""
+        sinks = list(sinks)
+        for segment in self.segments(blocks):
+            for sink in sinks:
+                sink(segment)
+        return self.stats
+
+
+class JsonlSink:
+    """Append one JSON object per committed segment (flushed, so it can be tailed)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __call__(self, segment: Dict):
+        self._file.write(json.dumps(segment, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class MarkdownSink:
+    """Append ``[HH:MM:SS] text`` paragraphs, the layout of the markdown transcripts."""
+
+    def __init__(self, path: str, title: Optional[str] = None):
+        self.path = path
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', encoding='utf-8')
+        if is_new:
+            self._file.write(f"# Transcript: {title or os.path.splitext(os.path.basename(path))[0]}\n\n")
+            self._file.write(f"Started on: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n## Content\n\n")
+            self._file.flush()
+
+    def __call__(self, segment: Dict):
+        self._file.write(f"[{format_clock(segment['start'])}] {segment['text']}\n\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe a live stream or a growing recording as it arrives.")
+    parser.add_argument('source', help="File, URL, YouTube link or '-' for raw s16le 16 kHz mono on stdin")
+    parser.add_argument('--follow', action='store_true', help="Keep reading as the file grows")
+    parser.add_argument('--idle-timeout', type=float, default=30.0,
+                        help="Stop following after this many seconds without new audio")
+    parser.add_argument('--markdown', default=None, help="Append committed segments to this markdown file")
+    parser.add_argument('--jsonl', default=None, help="Append committed segments to this JSON-lines file")
+    parser.add_argument('--window', type=float, default=30.0, help="Seconds of audio transcribed at once")
+    parser.add_argument('--step', type=float, default=5.0, help="New audio (seconds) between transcriptions")
+    parser.add_argument('--holdback', type=float, default=2.0,
+                        help="Segments ending this close to the newest audio wait for the next step")
+    parser.add_argument('--language', default=None, help="Skip language detection (e.g. en)")
+    parser.add_argument('--model', default=None, help="Whisper model size (default: WHISPER_MODEL or base)")
+    parser.add_argument('--backend', default=None, choices=BACKENDS,
+                        help="Inference backend (default: WHISPER_BACKEND or whisper)")
+    parser.add_argument('--threads', type=int, default=None, help="Inference threads")
+    parser.add_argument('--vad', type=int, default=None, choices=range(4),
+                        help="Skip windows without speech (aggressiveness 0-3)")
+    parser.add_argument('--quiet', action='store_true', help="Don't print segments to stdout")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    transcriber = LiveTranscriber(model_size=args.model, backend=args.backend, threads=args.threads,
+                                  window_s=args.window, step_s=args.step, holdback_s=args.holdback,
+                                  language=args.language, vad_aggressiveness=args.vad)
+    sinks = []
+    if args.markdown:
+        sinks.append(MarkdownSink(args.markdown))
+    if args.jsonl:
+        sinks.append(JsonlSink(args.jsonl))
+    if not args.quiet:
+        sinks.append(lambda segment: print(f"[{format_clock(segment['start'])}] {segment['text']}", flush=True))
+    try:
+        stats = transcriber.run(pcm_source(args.source, follow=args.follow, idle_timeout_s=args.idle_timeout),
+                                sinks)
+    except KeyboardInterrupt:
+        stats = transcriber.stats
+    finally:
+        for sink in sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
+    logger.info("Live transcription ended: %d segments from %.1fs of audio, real-time factor %.2f%s",
+                stats.segments, stats.audio_seconds, stats.rtf,
+                f", {stats.dropped_seconds:.1f}s dropped" if stats.dropped_seconds else "")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from media_cache import DEFAULT_CACHE_DIR
+
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+
+def request_key(model: str, messages: List[Dict[str, str]], params: Optional[Dict] = None) -> str:
+    """Stable hash of everything that determines a chat completion."""
+    payload = json.dumps({'model': model, 'messages': messages, 'params': params or {}},
+                         sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class LLMCacheStats:
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    writes: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class LLMResponseCache:
+    """Disk-backed cache of chat completion results keyed by request hash.
+
+    Entries older than ``ttl_seconds`` are treated as misses and the least
+    recently used entries are dropped once the stored responses exceed
+    ``max_bytes``. With ``read_only`` the cache is consulted but never
+    written, so a run can replay a previous run's responses exactly.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: Optional[float] = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES, read_only: bool = False):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, 'llm_cache.db')
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.read_only = read_only
+        self.stats = LLMCacheStats()
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn().execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _count(self, field_name: str):
+        with self._stats_lock:
+            setattr(self.stats, field_name, getattr(self.stats, field_name) + 1)
+
+    def get(self, model: str, messages: List[Dict[str, str]], params: Optional[Dict] = None) -> Optional[str]:
+        key = request_key(model, messages, params)
+        conn = self._conn()
+        row = conn.execute('SELECT response, created_at FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is not None and self.ttl_seconds is not None and time.time() - row[1] > self.ttl_seconds:
+            self._count('expired')
+            if not self.read_only:
+                conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            row = None
+        if row is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        if not self.read_only:
+            conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (time.time(), key))
+        return row[0]
+
+    def put(self, model: str, messages: List[Dict[str, str]], response: str, params: Optional[Dict] = None):
+        if self.read_only:
+            return
+        key = request_key(model, messages, params)
+        now = time.time()
+        self._conn().execute(
+            'INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_access) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (key, model, response, len(response.encode('utf-8')), now, now),
+        )
+        self._count('writes')
+        self.evict(keep=key)
+
+    def total_bytes(self) -> int:
+        return self._conn().execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def evict(self, keep: Optional[str] = None):
+        """Drop expired entries, then least recently used ones until under ``max_bytes``."""
+        conn = self._conn()
+        if self.ttl_seconds is not None:
+            conn.execute('DELETE FROM responses WHERE created_at < ?', (time.time() - self.ttl_seconds,))
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute('SELECT key, size FROM responses ORDER BY last_access').fetchall():
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            total -= size
+            self._count('evictions')
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_llm_cache() -> Optional[LLMResponseCache]:
+    """Return the shared response cache, or None when ``LLM_CACHE=off``.
+
+    Configured with ``LLM_CACHE_PATH``, ``LLM_CACHE_TTL`` (seconds),
+    ``LLM_CACHE_MAX_BYTES`` and ``LLM_CACHE_READONLY=1``.
+    """
+    global _default_cache
+    if os.getenv('LLM_CACHE', 'on').lower() in ('off', '0', 'false'):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            ttl = os.getenv('LLM_CACHE_TTL')
+            _default_cache = LLMResponseCache(
+                path=os.getenv('LLM_CACHE_PATH'),
+                ttl_seconds=float(ttl) if ttl else None,
+                max_bytes=int(os.getenv('LLM_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+                read_only=os.getenv('LLM_CACHE_READONLY', '').lower() in ('1', 'true', 'yes'),
+            )
+        return _default_cache
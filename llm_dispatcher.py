@@ -0,0 +1,215 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from openai import (
+    AsyncOpenAI, APIConnectionError, APIStatusError, APITimeoutError, InternalServerError, RateLimitError
+)
+
+from instrumentation import stage
+from llm_cache import LLMResponseCache
+from llm_tokens import count_tokens
+
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+# Completion size assumed when reserving TPM budget for a call without max_tokens
+DEFAULT_COMPLETION_ESTIMATE = 512
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``per_minute / 60`` per second.
+
+    Thread-safe, and usable from any event loop since it holds no
+    loop-bound primitives.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    def adjust(self, delta: float):
+        """Return (positive) or charge (negative) tokens after the real cost is known."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + delta)
+
+
+@dataclass
+class DispatcherStats:
+    calls: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    failures: int = 0
+    cache_hits: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    call_seconds: List[float] = field(default_factory=list)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read ``retry-after-ms`` / ``retry-after`` from an API error response, if any."""
+    if not isinstance(error, APIStatusError):
+        return None
+    headers = error.response.headers
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000.0
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        return None
+    return None
+
+
+class LLMDispatcher:
+    """Rate-limit-aware async front end for chat completions.
+
+    Requests wait for both the requests-per-minute and tokens-per-minute
+    buckets before being sent, at most ``max_concurrency`` are in flight,
+    and only transient errors are retried, with full-jitter exponential
+    backoff or the server's Retry-After. A rate-limit response pauses every
+    caller sharing the dispatcher, not just the one that hit it.
+    """
+
+    def __init__(
+        self,
+        client: Optional[AsyncOpenAI] = None,
+        model: str = "gpt-4",
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 30000,
+        max_concurrency: int = 16,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        cache: Optional[LLMResponseCache] = None,
+    ):
+        self.client = client
+        self.cache = cache
+        self.model = model
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = DispatcherStats()
+        self._paused_until = 0.0
+        self._stats_lock = threading.Lock()
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # asyncio primitives belong to one loop; keep one per running loop
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def estimate_tokens(self, messages: Sequence[Dict[str, str]], model: str, max_tokens: Optional[int]) -> int:
+        prompt = sum(count_tokens(m['content'], model) + 4 for m in messages)
+        return prompt + (max_tokens or DEFAULT_COMPLETION_ESTIMATE)
+
+    async def chat(self, messages: List[Dict[str, str]], client: Optional[AsyncOpenAI] = None,
+                   model: Optional[str] = None, **params) -> str:
+        """Send one chat completion and return the message content.
+
+        Identical requests are answered from ``cache`` when one is configured.
+        Each call is recorded as an ``llm_call`` stage with its tokens and retries.
+        """
+        client = client or self.client
+        model = model or self.model
+        with stage('llm_call', model=model) as span:
+            if self.cache is not None:
+                cached = self.cache.get(model, messages, params)
+                if cached is not None:
+                    with self._stats_lock:
+                        self.stats.cache_hits += 1
+                    span['cached'] = True
+                    return cached
+            return await self._send(messages, client, model, params, span)
+
+    async def _send(self, messages, client, model, params, span) -> str:
+        estimate = self.estimate_tokens(messages, model, params.get('max_tokens'))
+
+        for attempt in range(self.max_retries + 1):
+            span['retries'] = attempt
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self.request_bucket.acquire(1)
+            await self.token_bucket.acquire(estimate)
+
+            async with self._semaphore():
+                start = time.perf_counter()
+                try:
+                    response = await client.chat.completions.create(model=model, messages=messages, **params)
+                except RETRYABLE_ERRORS as e:
+                    error = e
+                else:
+                    self._record_success(response, estimate, time.perf_counter() - start)
+                    usage = getattr(response, 'usage', None)
+                    if usage:
+                        span.update(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens,
+                                    tokens=usage.total_tokens)
+                    content = response.choices[0].message.content
+                    if self.cache is not None and content is not None:
+                        self.cache.put(model, messages, content, params)
+                    return content
+
+            if attempt == self.max_retries:
+                with self._stats_lock:
+                    self.stats.failures += 1
+                raise error
+            delay = retry_after_seconds(error)
+            with self._stats_lock:
+                self.stats.retries += 1
+                if isinstance(error, RateLimitError):
+                    self.stats.rate_limited += 1
+            if delay is None:
+                delay = self._backoff(attempt)
+            if isinstance(error, RateLimitError):
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            await asyncio.sleep(delay)
+
+    def _record_success(self, response, estimate: int, seconds: float):
+        usage = getattr(response, 'usage', None)
+        with self._stats_lock:
+            self.stats.calls += 1
+            self.stats.call_seconds.append(seconds)
+            if usage:
+                self.stats.prompt_tokens += usage.prompt_tokens
+                self.stats.completion_tokens += usage.completion_tokens
+        if usage:
+            self.token_bucket.adjust(estimate - usage.total_tokens)
+
+    async def map_chat(self, message_lists: Sequence[List[Dict[str, str]]],
+                       client: Optional[AsyncOpenAI] = None, **params) -> List[str]:
+        """Run many chats concurrently; results keep the input order."""
+        return list(await asyncio.gather(*(self.chat(messages, client=client, **params)
+                                           for messages in message_lists)))
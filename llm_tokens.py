@@ -0,0 +1,52 @@
+import re
+from functools import lru_cache
+
+# Context windows (prompt + completion tokens) of the chat models we use
+CONTEXT_WINDOWS = {
+    'gpt-3.5-turbo': 16385,
+    'gpt-4': 8192,
+    'gpt-4-32k': 32768,
+    'gpt-4-turbo': 128000,
+    'gpt-4o': 128000,
+    'gpt-4o-mini': 128000,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+_APPROX_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+class ApproximateEncoding:
+    """Stand-in used when tiktoken's BPE files can't be loaded (e.g. offline).
+
+    Counts words and punctuation marks, which tracks cl100k token counts
+    closely enough for chunk budgeting on English text.
+    """
+    name = 'approximate'
+
+    def encode(self, text):
+        return _APPROX_TOKEN_RE.findall(text)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """Return the tiktoken encoding for ``model``, falling back to an approximation."""
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding('cl100k_base')
+    except Exception:
+        return ApproximateEncoding()
+
+
+def count_tokens(text: str, model: str) -> int:
+    return len(get_encoding(model).encode(text))
+
+
+def context_window(model: str) -> int:
+    """Return the context window for ``model`` (matching dated variants by prefix)."""
+    for name in sorted(CONTEXT_WINDOWS, key=len, reverse=True):
+        if model == name or model.startswith(name + '-'):
+            return CONTEXT_WINDOWS[name]
+    return DEFAULT_CONTEXT_WINDOW
@@ -0,0 +1,134 @@
+import asyncio
+from typing import Callable, Dict, List, Optional, Sequence
+
+from openai import AsyncOpenAI
+
+from llm_cache import LLMResponseCache
+from llm_dispatcher import LLMDispatcher
+from llm_tokens import context_window, count_tokens
+from transcript_chunker import TranscriptChunker
+
+SINGLE_PROMPT = "Please summarize the following text:\n\n{text}"
+MAP_PROMPT = ("The following is part {index} of {total} of a longer transcript. "
+              "Summarize this part, keeping every important point:\n\n{text}")
+REDUCE_PROMPT = ("The following are summaries of consecutive parts of one transcript. "
+                 "Combine them into a single coherent summary:\n\n{text}")
+
+
+class MapReduceSummarizer:
+    """Token-aware summarizer for transcripts of any length.
+
+    Text that fits in one request is summarized with a single call, as
+    before. Longer text is split on segment or sentence boundaries into
+    chunks of at most ``chunk_tokens``, the chunks are summarized
+    concurrently through an ``LLMDispatcher`` (which enforces concurrency,
+    rate limits and retries), and the partial summaries are combined level
+    by level until they fit in one final call.
+    """
+
+    def __init__(
+        self,
+        client: Optional[AsyncOpenAI] = None,
+        model: str = "gpt-3.5-turbo",
+        chunk_tokens: Optional[int] = None,
+        max_output_tokens: int = 1024,
+        max_concurrency: int = 8,
+        max_retries: int = 5,
+        initial_wait_time: float = 1.0,
+        requests_per_minute: float = 3500,
+        tokens_per_minute: float = 160000,
+        dispatcher: Optional[LLMDispatcher] = None,
+        cache: Optional[LLMResponseCache] = None,
+    ):
+        # Retries are handled per chunk by the dispatcher, not inside the client
+        self.client = client or AsyncOpenAI(max_retries=0)
+        self.model = model
+        self.max_output_tokens = max_output_tokens
+        # Leave room for the instructions and the completion in every call
+        self.input_budget = context_window(model) - max_output_tokens - 200
+        self.chunk_tokens = min(chunk_tokens or 4000, self.input_budget)
+        self.chunker = TranscriptChunker(model, max_tokens=self.chunk_tokens,
+                                         reserved_tokens=max_output_tokens + 200)
+        self.dispatcher = dispatcher or LLMDispatcher(
+            model=model,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            max_concurrency=max_concurrency,
+            max_retries=max_retries,
+            base_delay=initial_wait_time,
+            cache=cache,
+        )
+        self.levels = 0
+
+    def count_tokens(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    def split(self, text: str, segments: Optional[Sequence[str]] = None) -> List[str]:
+        """Group segments (or sentences of ``text``) into chunks within ``chunk_tokens``."""
+        return [chunk.text for chunk in self.chunker.chunks(text, segments)]
+
+    async def _complete(self, prompt: str) -> str:
+        messages = [{"role": "user", "content": prompt}]
+        return await self.dispatcher.chat(messages, client=self.client, model=self.model,
+                                          max_tokens=self.max_output_tokens)
+
+    async def asummarize(self, text: str, segments: Optional[Sequence[str]] = None,
+                         progress: Optional[Callable[[int, int], None]] = None) -> str:
+        """Summarize ``text``; ``progress(done, total)`` is called as chunk summaries finish."""
+        if self.count_tokens(text) <= self.input_budget:
+            self.levels = 1
+            return await self._complete(SINGLE_PROMPT.format(text=text))
+
+        chunks = self.split(text, segments)
+        if len(chunks) == 1:
+            self.levels = 1
+            return await self._complete(SINGLE_PROMPT.format(text=chunks[0]))
+
+        done = 0
+
+        async def summarize_chunk(i, chunk):
+            nonlocal done
+            summary = await self._complete(MAP_PROMPT.format(index=i + 1, total=len(chunks), text=chunk))
+            done += 1
+            if progress is not None:
+                progress(done, len(chunks))
+            return summary
+
+        summaries = await asyncio.gather(*(summarize_chunk(i, chunk) for i, chunk in enumerate(chunks)))
+        self.levels = 1
+
+        while True:
+            self.levels += 1
+            combined = "\n\n".join(summaries)
+            if self.count_tokens(combined) <= self.input_budget:
+                return await self._complete(REDUCE_PROMPT.format(text=combined))
+            groups = self.split(combined, summaries)
+            if len(groups) >= len(summaries):
+                # Summaries didn't shrink enough to group; merge pairwise
+                groups = ["\n\n".join(summaries[i:i + 2]) for i in range(0, len(summaries), 2)]
+            summaries = await asyncio.gather(*(
+                self._complete(REDUCE_PROMPT.format(text=group)) for group in groups
+            ))
+
+    def summarize(self, text: str, segments: Optional[Sequence[str]] = None,
+                  progress: Optional[Callable[[int, int], None]] = None) -> str:
+        """Synchronous wrapper around ``asummarize``."""
+        return asyncio.run(self.asummarize(text, segments, progress))
+
+    def report(self) -> Dict:
+        """Token and latency accounting for the calls made so far."""
+        stats = self.dispatcher.stats
+        seconds = sorted(stats.call_seconds)
+        return {
+            'calls': stats.calls,
+            'retries': stats.retries,
+            'failures': stats.failures,
+            'cache_hits': stats.cache_hits,
+            'levels': self.levels,
+            'prompt_tokens': stats.prompt_tokens,
+            'completion_tokens': stats.completion_tokens,
+            'total_tokens': stats.prompt_tokens + stats.completion_tokens,
+            'call_seconds_total': sum(seconds),
+            'call_seconds_p50': seconds[len(seconds) // 2] if seconds else None,
+            'call_seconds_max': seconds[-1] if seconds else None,
+        }
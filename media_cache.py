@@ -0,0 +1,260 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'yt-transcript-extractor')
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3
+
+AUDIO_SAMPLE_RATE = 16000
+
+
+def youtube_key(video_id: str) -> str:
+    return f"yt:{video_id}"
+
+
+def file_key(path: str, block_size: int = 1024 * 1024) -> str:
+    """Content key for a local file (SHA-256 of its bytes)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return f"file:{digest.hexdigest()}"
+
+
+def convert_to_compact_wav(source_path: str, output_path: str):
+    """Re-encode any ffmpeg-readable input as 16 kHz mono 16-bit WAV."""
+    subprocess.run(
+        ['ffmpeg', '-nostdin', '-y', '-loglevel', 'error', '-i', source_path,
+         '-vn', '-ac', '1', '-ar', str(AUDIO_SAMPLE_RATE), '-c:a', 'pcm_s16le', output_path],
+        check=True, capture_output=True,
+    )
+
+
+@dataclass
+class CacheStats:
+    audio_hits: int = 0
+    audio_misses: int = 0
+    transcript_hits: int = 0
+    transcript_misses: int = 0
+    evictions: int = 0
+    evicted_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        hits = self.audio_hits + self.transcript_hits
+        total = hits + self.audio_misses + self.transcript_misses
+        return hits / total if total else 0.0
+
+
+class MediaCache:
+    """Persistent cache of compact audio and Whisper results.
+
+    Entries are keyed by ``yt:<video_id>`` or ``file:<sha256>`` and live in
+    ``root/objects``; an SQLite index tracks their size and last access so
+    the least recently used entries are evicted once ``max_bytes`` is exceeded.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root or os.getenv('TRANSCRIPT_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        os.makedirs(os.path.join(self.root, 'objects'), exist_ok=True)
+        self._conn().execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                name TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.root, 'index.db'), timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _count(self, field_name: str, amount: int = 1):
+        with self._stats_lock:
+            setattr(self.stats, field_name, getattr(self.stats, field_name) + amount)
+
+    def _object_path(self, key: str, filename: str) -> str:
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        directory = os.path.join(self.root, 'objects', digest[:2], digest)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, filename)
+
+    def _lookup(self, name: str) -> Optional[str]:
+        conn = self._conn()
+        row = conn.execute('SELECT path FROM entries WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return None
+        if not os.path.exists(row[0]):
+            conn.execute('DELETE FROM entries WHERE name = ?', (name,))
+            return None
+        conn.execute('UPDATE entries SET last_access = ? WHERE name = ?', (time.time(), name))
+        return row[0]
+
+    def _record(self, name: str, path: str):
+        self._conn().execute(
+            'INSERT OR REPLACE INTO entries (name, path, size, last_access) VALUES (?, ?, ?, ?)',
+            (name, path, os.path.getsize(path), time.time()),
+        )
+        self.evict(keep=name)
+
+    @staticmethod
+    def _temp_path(target: str) -> str:
+        """A new private file next to ``target``, so concurrent writers never share one."""
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(target)[1] + '.tmp', dir=os.path.dirname(target))
+        os.close(fd)
+        return path
+
+    def audio_path(self, key: str) -> Optional[str]:
+        """Return the cached 16 kHz mono WAV for ``key``, if present."""
+        path = self._lookup(f"{key}|audio")
+        self._count('audio_hits' if path else 'audio_misses')
+        return path
+
+    def store_audio(self, key: str, source_path: str, convert: bool = True) -> str:
+        """Add audio to the cache and return its cached path.
+
+        With ``convert`` the source is re-encoded to 16 kHz mono first;
+        otherwise it is moved in as-is (for files already in that format).
+        """
+        target = self._object_path(key, 'audio.wav')
+        tmp_path = self._temp_path(target)
+        try:
+            if convert:
+                convert_to_compact_wav(source_path, tmp_path)
+            else:
+                shutil.move(source_path, tmp_path)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._record(f"{key}|audio", target)
+        return target
+
+    def store_audio_array(self, key: str, samples) -> str:
+        """Add decoded float32 16 kHz samples to the cache as WAV and return the path."""
+        from audio_stream import write_wav
+
+        target = self._object_path(key, 'audio.wav')
+        tmp_path = self._temp_path(target)
+        try:
+            write_wav(tmp_path, samples, AUDIO_SAMPLE_RATE)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._record(f"{key}|audio", target)
+        return target
+
+    def get_transcript(self, key: str, model: str) -> Optional[Dict]:
+        """Return the cached transcription result for ``key`` and model, if present."""
+        path = self._lookup(f"{key}|transcript:{model}")
+        self._count('transcript_hits' if path else 'transcript_misses')
+        if path is None:
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def put_transcript(self, key: str, model: str, result: Dict):
+        target = self._object_path(key, f'transcript_{model}.json')
+        tmp_path = self._temp_path(target)
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'text': result['text'], 'segments': result.get('segments', []),
+                           'language': result.get('language')}, f, ensure_ascii=False)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._record(f"{key}|transcript:{model}", target)
+
+    def total_bytes(self) -> int:
+        return self._conn().execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def evict(self, max_bytes: Optional[int] = None, keep: Optional[str] = None):
+        """Drop least recently used entries until the cache fits in ``max_bytes``.
+
+        ``keep`` names an entry that must survive, e.g. the one just added.
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        conn = self._conn()
+        total = self.total_bytes()
+        if total <= limit:
+            return
+        for name, path, size in conn.execute(
+                'SELECT name, path, size FROM entries ORDER BY last_access').fetchall():
+            if total <= limit:
+                break
+            if name == keep:
+                continue
+            if os.path.exists(path):
+                os.remove(path)
+            conn.execute('DELETE FROM entries WHERE name = ?', (name,))
+            total -= size
+            self._count('evictions')
+            self._count('evicted_bytes', size)
+
+    def prewarm(self, youtube_links: Iterable[str], model: Optional[str] = None, max_workers: int = 4):
+        """Download (and with ``model`` also transcribe) links that aren't cached yet."""
+        from yt_transcript_extractor import cached_transcription, get_youtube_audio
+
+        def warm(link):
+            if model:
+                cached_transcription(link, model_size=model, cache=self)
+            else:
+                get_youtube_audio(link, cache=self)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(warm, youtube_links))
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> MediaCache:
+    """Return the shared cache (``TRANSCRIPT_CACHE_DIR`` / ``TRANSCRIPT_CACHE_MAX_BYTES``)."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            max_bytes = int(os.getenv('TRANSCRIPT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+            _default_cache = MediaCache(max_bytes=max_bytes)
+        return _default_cache
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or prewarm the transcript media cache.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help="Show cache size")
+    prewarm_parser = subparsers.add_parser('prewarm', help="Download (and optionally transcribe) links")
+    prewarm_parser.add_argument('links_file', help="File with one YouTube link per line")
+    prewarm_parser.add_argument('--model', default=None, help="Also transcribe with this Whisper model")
+    prewarm_parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    cache = get_default_cache()
+    if args.command == 'prewarm':
+        with open(args.links_file, 'r', encoding='utf-8') as f:
+            links = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        cache.prewarm(links, model=args.model, max_workers=args.workers)
+        print(f"Prewarmed {len(links)} links (hit rate {cache.stats.hit_rate:.0%})")
+    print(f"Cache at {cache.root}: {cache.total_bytes() / 1024 ** 2:.1f} MB of {cache.max_bytes / 1024 ** 2:.0f} MB")
@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from instrumentation import stage
+
+DEFAULT_MODEL_SIZE = "base"
+DEFAULT_DEVICE = "cpu"
+DEFAULT_PRECISION = "fp32"
+
+ModelKey = Tuple[str, str, str]
+
+
+@dataclass
+class RegistryStats:
+    loads: int = 0
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    load_seconds: Dict[ModelKey, float] = field(default_factory=dict)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def _load_whisper_model(size: str, device: str, precision: str):
+    """Load a Whisper model from disk for the given key.
+
+    Besides fp32/fp16, ``precision`` selects the int8 and CTranslate2
+    backends (see ``inference_backends``).
+    """
+    from inference_backends import load_model
+
+    return load_model(size, device, precision)
+
+
+class WhisperModelRegistry:
+    """Process-wide cache of loaded Whisper models.
+
+    Models are keyed by (model size, device, precision), loaded lazily on
+    first use and kept resident up to ``max_models``; the least recently
+    used model is dropped when the cap is exceeded.
+    """
+
+    def __init__(self, max_models: int = 2, loader: Callable = _load_whisper_model):
+        self.max_models = max_models
+        self._loader = loader
+        self._models: "OrderedDict[ModelKey, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[ModelKey, threading.Lock] = {}
+        self.stats = RegistryStats()
+
+    @staticmethod
+    def make_key(size: str = DEFAULT_MODEL_SIZE, device: str = DEFAULT_DEVICE,
+                 precision: str = DEFAULT_PRECISION) -> ModelKey:
+        return (size, device, precision)
+
+    def get(self, size: str = DEFAULT_MODEL_SIZE, device: str = DEFAULT_DEVICE,
+            precision: str = DEFAULT_PRECISION):
+        """Return the model for the key, loading it if it is not resident."""
+        key = self.make_key(size, device, precision)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.stats.hits += 1
+                return model
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock so other keys stay available; the
+        # per-key lock makes concurrent callers for the same key wait for a
+        # single load instead of each reading the weights from disk.
+        with key_lock:
+            with self._lock:
+                model = self._models.get(key)
+                if model is not None:
+                    self._models.move_to_end(key)
+                    self.stats.hits += 1
+                    return model
+                self.stats.misses += 1
+
+            start = time.perf_counter()
+            with stage('model_load', model=f"{size}/{device}/{precision}"):
+                model = self._loader(size, device, precision)
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                self._models[key] = model
+                self._models.move_to_end(key)
+                self.stats.loads += 1
+                self.stats.load_seconds[key] = self.stats.load_seconds.get(key, 0.0) + elapsed
+                self._evict_locked()
+            return model
+
+    def warm_up(self, keys: Optional[List[ModelKey]] = None):
+        """Load the given models ahead of time (defaults to the base CPU model)."""
+        for key in keys or [self.make_key()]:
+            self.get(*key)
+
+    def evict(self, size: str = DEFAULT_MODEL_SIZE, device: str = DEFAULT_DEVICE,
+              precision: str = DEFAULT_PRECISION) -> bool:
+        """Drop a model from the registry. Returns True if it was resident."""
+        with self._lock:
+            if self._models.pop(self.make_key(size, device, precision), None) is not None:
+                self.stats.evictions += 1
+                return True
+            return False
+
+    def clear(self):
+        with self._lock:
+            self.stats.evictions += len(self._models)
+            self._models.clear()
+
+    def resident(self) -> List[ModelKey]:
+        with self._lock:
+            return list(self._models.keys())
+
+    def _evict_locked(self):
+        while len(self._models) > self.max_models:
+            self._models.popitem(last=False)
+            self.stats.evictions += 1
+
+
+_registry = WhisperModelRegistry()
+
+
+def get_registry() -> WhisperModelRegistry:
+    """Return the shared process-wide registry."""
+    return _registry
+
+
+def get_model(size: str = DEFAULT_MODEL_SIZE, device: str = DEFAULT_DEVICE,
+              precision: str = DEFAULT_PRECISION):
+    """Shortcut for ``get_registry().get(...)``."""
+    return _registry.get(size, device, precision)
+
+
+def warm_up(keys: Optional[List[ModelKey]] = None):
+    """Shortcut for ``get_registry().warm_up(...)``."""
+    _registry.warm_up(keys)
@@ -0,0 +1,225 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+DEFAULT_TEXT_PATH = 'processed_videos.txt'
+DEFAULT_DB_PATH = 'processed_videos.db'
+
+STATUS_FLAGS = ('processed', 'captions_done', 'whisper_done', 'summary_done')
+
+
+@dataclass
+class VideoStatus:
+    video_id: str
+    processed: bool = False
+    captions_done: bool = False
+    whisper_done: bool = False
+    summary_done: bool = False
+    created_at: Optional[float] = None
+    updated_at: Optional[float] = None
+    artifacts: Dict[str, str] = field(default_factory=dict)
+
+
+class ProcessedStore(ABC):
+    """Interface for recording which videos have been processed."""
+
+    @abstractmethod
+    def is_processed(self, video_id: str) -> bool:
+        """Return whether the video has been marked processed."""
+
+    def mark_processed(self, video_id: str):
+        self.update_status(video_id, processed=True)
+
+    @abstractmethod
+    def get_status(self, video_id: str) -> Optional[VideoStatus]:
+        """Return the video's status, or None when it has never been recorded."""
+
+    @abstractmethod
+    def update_status(self, video_id: str, artifacts: Optional[Dict[str, str]] = None, **flags):
+        """Set any of ``STATUS_FLAGS`` and merge ``artifacts`` (name -> path)."""
+
+    def close(self):
+        pass
+
+
+class TextFileProcessedStore(ProcessedStore):
+    """The original ``processed_videos.txt`` format, held in a set for O(1) lookups.
+
+    Only the processed flag is persisted. Each ID is written with a single
+    ``O_APPEND`` write so concurrent writers never interleave partial lines.
+    """
+
+    def __init__(self, path: str = DEFAULT_TEXT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ids = set()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self._ids.update(line for line in f.read().splitlines() if line)
+
+    def is_processed(self, video_id: str) -> bool:
+        return video_id in self._ids
+
+    def get_status(self, video_id: str) -> Optional[VideoStatus]:
+        if video_id not in self._ids:
+            return None
+        return VideoStatus(video_id=video_id, processed=True)
+
+    def update_status(self, video_id: str, artifacts: Optional[Dict[str, str]] = None, **flags):
+        if not flags.get('processed'):
+            return
+        with self._lock:
+            if video_id in self._ids:
+                return
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, (video_id + '\n').encode('utf-8'))
+            finally:
+                os.close(fd)
+            self._ids.add(video_id)
+
+
+class SQLiteProcessedStore(ProcessedStore):
+    """SQLite-backed store with per-video stage flags and artifact paths.
+
+    Uses WAL mode so readers never block and several processes can write;
+    each thread gets its own connection.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, migrate_from: Optional[str] = DEFAULT_TEXT_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS videos (
+                video_id TEXT PRIMARY KEY,
+                processed INTEGER NOT NULL DEFAULT 0,
+                captions_done INTEGER NOT NULL DEFAULT 0,
+                whisper_done INTEGER NOT NULL DEFAULT 0,
+                summary_done INTEGER NOT NULL DEFAULT 0,
+                created_at REAL,
+                updated_at REAL,
+                artifacts TEXT NOT NULL DEFAULT '{}'
+            );
+            CREATE TABLE IF NOT EXISTS migrations (
+                source TEXT PRIMARY KEY,
+                migrated_at REAL,
+                count INTEGER
+            );
+        """)
+        if migrate_from:
+            self.migrate_from_text(migrate_from)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def migrate_from_text(self, text_path: str) -> int:
+        """Import IDs from a ``processed_videos.txt`` file once. Returns the number imported."""
+        if not os.path.exists(text_path):
+            return 0
+        conn = self._conn()
+        source = os.path.abspath(text_path)
+        if conn.execute('SELECT 1 FROM migrations WHERE source = ?', (source,)).fetchone():
+            return 0
+        with open(text_path, 'r', encoding='utf-8') as f:
+            ids = [line for line in f.read().splitlines() if line]
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT INTO videos (video_id, processed, created_at, updated_at) VALUES (?, 1, ?, ?) '
+                'ON CONFLICT(video_id) DO UPDATE SET processed = 1',
+                ((video_id, now, now) for video_id in ids),
+            )
+            conn.execute('INSERT OR IGNORE INTO migrations (source, migrated_at, count) VALUES (?, ?, ?)',
+                         (source, now, len(ids)))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return len(ids)
+
+    def is_processed(self, video_id: str) -> bool:
+        row = self._conn().execute('SELECT processed FROM videos WHERE video_id = ?', (video_id,)).fetchone()
+        return bool(row and row[0])
+
+    def get_status(self, video_id: str) -> Optional[VideoStatus]:
+        row = self._conn().execute(
+            'SELECT processed, captions_done, whisper_done, summary_done, created_at, updated_at, artifacts '
+            'FROM videos WHERE video_id = ?', (video_id,)).fetchone()
+        if row is None:
+            return None
+        return VideoStatus(
+            video_id=video_id,
+            processed=bool(row[0]),
+            captions_done=bool(row[1]),
+            whisper_done=bool(row[2]),
+            summary_done=bool(row[3]),
+            created_at=row[4],
+            updated_at=row[5],
+            artifacts=json.loads(row[6]),
+        )
+
+    def update_status(self, video_id: str, artifacts: Optional[Dict[str, str]] = None, **flags):
+        unknown = set(flags) - set(STATUS_FLAGS)
+        if unknown:
+            raise ValueError(f"Unknown status flags: {', '.join(sorted(unknown))}")
+        conn = self._conn()
+        now = time.time()
+        # BEGIN IMMEDIATE takes the write lock up front so the artifact
+        # read-modify-write below can't race another writer.
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT artifacts FROM videos WHERE video_id = ?', (video_id,)).fetchone()
+            merged = json.loads(row[0]) if row else {}
+            merged.update(artifacts or {})
+            if row is None:
+                conn.execute('INSERT INTO videos (video_id, created_at) VALUES (?, ?)', (video_id, now))
+            assignments = ''.join(f', {name} = ?' for name in flags)
+            conn.execute(
+                f'UPDATE videos SET updated_at = ?, artifacts = ?{assignments} WHERE video_id = ?',
+                (now, json.dumps(merged), *(int(bool(v)) for v in flags.values()), video_id),
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store() -> ProcessedStore:
+    """Return the shared store selected by ``PROCESSED_STORE`` (``sqlite`` or ``text``).
+
+    The SQLite store imports ``processed_videos.txt`` the first time it is opened.
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            backend = os.getenv('PROCESSED_STORE', 'sqlite').lower()
+            if backend == 'text':
+                _default_store = TextFileProcessedStore(os.getenv('PROCESSED_STORE_PATH', DEFAULT_TEXT_PATH))
+            elif backend == 'sqlite':
+                _default_store = SQLiteProcessedStore(os.getenv('PROCESSED_STORE_PATH', DEFAULT_DB_PATH))
+            else:
+                raise ValueError(f"Unknown PROCESSED_STORE backend: {backend}")
+        return _default_store
@@ -1,9 +1,10 @@
-import openai
-import time
+import asyncio
 from typing import List, Dict, Optional
 from dataclasses import dataclass
-from openai import OpenAI
-import os
+from openai import AsyncOpenAI
+from llm_cache import LLMResponseCache, get_default_llm_cache
+from llm_dispatcher import LLMDispatcher
+from transcript_chunker import ChunkPlan, TranscriptChunker
 
 @dataclass
 class Point:
@@ -12,51 +13,71 @@ class Point:
     content: Optional[str] = None
 
 class SinekStyleAnalyzer:
-    def __init__(self, api_key: str, model: str = "gpt-4", max_retries: int = 5, initial_wait_time: int = 2):
+    def __init__(self, api_key: str, model: str = "gpt-4", max_retries: int = 5, initial_wait_time: int = 2,
+                 requests_per_minute: int = 500, tokens_per_minute: int = 30000, max_concurrency: int = 16,
+                 cache: Optional[LLMResponseCache] = None):
         """Initialize the analyzer with OpenAI credentials and configuration."""
-        self.client = OpenAI(api_key=api_key)
+        self.api_key = api_key
         self.model = model
         self.max_retries = max_retries
         self.initial_wait_time = initial_wait_time
+        # Shared rate limiter; replaces the fixed sleeps between calls
+        self.dispatcher = LLMDispatcher(
+            model=model,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            max_concurrency=max_concurrency,
+            max_retries=max_retries,
+            base_delay=initial_wait_time,
+            # Identical prompts are answered from disk on re-runs
+            cache=cache if cache is not None else get_default_llm_cache(),
+        )
+
+    def _run(self, make_coro):
+        """Run ``make_coro(client)`` on a fresh event loop with its own async client."""
+        async def runner():
+            async with AsyncOpenAI(api_key=self.api_key, max_retries=0) as client:
+                return await make_coro(client)
+        return asyncio.run(runner())
 
     def _api_call_with_retry(self, messages: List[Dict[str, str]]) -> str:
-        """Make an API call with retries on failure."""
-        retries = 0
-        wait_time = self.initial_wait_time
-        
-        while retries < self.max_retries:
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages
-                )
-                return response.choices[0].message.content
-            except Exception as e:
-                print(f"API call failed: {str(e)}. Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-                retries += 1
-                wait_time *= 2
-        raise Exception("Max retries reached. Exiting.")
+        """Make an API call, retrying transient failures within the rate limits."""
+        return self._run(lambda client: self.dispatcher.chat(messages, client=client))
 
-    def process_transcript(self, transcript: str, chunk_size: int = 1000) -> List[Point]:
-        """Process transcript and return structured points."""
-        chunks = [transcript[i:i+chunk_size] for i in range(0, len(transcript), chunk_size)]
-        points: List[Point] = []
-        main_point_count = 0
+    def _chunker(self, chunk_size: Optional[int], overlap_tokens: int) -> TranscriptChunker:
+        return TranscriptChunker(self.model, max_tokens=chunk_size, overlap_tokens=overlap_tokens)
 
-        for chunk in chunks:
-            messages = [
-                {"role": "system", "content": "You are a helpful assistant that analyzes content in Simon Sinek's style."},
-                {"role": "user", "content": f"Starting from point {main_point_count + 1}, analyze this text and extract main points and sub-points:\n\n{chunk}"}
-            ]
-            
-            response = self._api_call_with_retry(messages)
-            chunk_points = self._parse_points(response)
-            points.extend(chunk_points)
-            main_point_count += len(chunk_points)
-            time.sleep(1)  # Rate limiting
+    def plan_transcript(self, transcript: str, chunk_size: Optional[int] = None, overlap_tokens: int = 0,
+                        segments: Optional[List[str]] = None) -> ChunkPlan:
+        """Report how many extraction calls and tokens ``process_transcript`` would use."""
+        return self._chunker(chunk_size, overlap_tokens).plan(transcript, segments)
 
-        return points
+    def process_transcript(self, transcript: str, chunk_size: Optional[int] = None, overlap_tokens: int = 0,
+                           segments: Optional[List[str]] = None) -> List[Point]:
+        """Process transcript and return structured points.
+
+        ``chunk_size`` is a token budget per request (defaults to what the
+        model's context allows); chunks end on sentence boundaries, or on
+        caption/Whisper segment boundaries when ``segments`` is given.
+        """
+        chunker = self._chunker(chunk_size, overlap_tokens)
+
+        async def process(client) -> List[Point]:
+            points: List[Point] = []
+            main_point_count = 0
+            # Sequential on purpose: each prompt continues the numbering of the previous chunk
+            for chunk in chunker.chunks(transcript, segments):
+                messages = [
+                    {"role": "system", "content": "You are a helpful assistant that analyzes content in Simon Sinek's style."},
+                    {"role": "user", "content": f"Starting from point {main_point_count + 1}, analyze this text and extract main points and sub-points:\n\n{chunk.text}"}
+                ]
+                response = await self.dispatcher.chat(messages, client=client)
+                chunk_points = self._parse_points(response)
+                points.extend(chunk_points)
+                main_point_count += len(chunk_points)
+            return points
+
+        return self._run(process)
 
     def _parse_points(self, response: str) -> List[Point]:
         """Parse the response into structured points."""
@@ -87,15 +108,17 @@ class SinekStyleAnalyzer:
 
     def generate_detailed_content(self, points: List[Point]) -> List[Point]:
         """Generate detailed content for each point in Simon Sinek's style."""
-        for point in points:
-            messages = [
+        message_lists = [
+            [
                 {"role": "system", "content": "You are Simon Sinek, explaining concepts in your characteristic style."},
                 {"role": "user", "content": f"Elaborate on this point and its sub-points in your style:\n\nMain point: {point.main_point}\nSub-points: {', '.join(point.sub_points)}"}
             ]
-            
-            detailed_content = self._api_call_with_retry(messages)
+            for point in points
+        ]
+        # All points are elaborated concurrently; results come back in input order
+        contents = self._run(lambda client: self.dispatcher.map_chat(message_lists, client=client))
+        for point, detailed_content in zip(points, contents):
             point.content = detailed_content
-            time.sleep(1)  # Rate limiting
         
         return points
 
@@ -0,0 +1,147 @@
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from llm_tokens import context_window, count_tokens
+from transcript_model import Transcript
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+# Tokens kept free in every request for the instructions and the reply
+DEFAULT_RESERVED_TOKENS = 1024 + 200
+MAX_DEFAULT_CHUNK_TOKENS = 4000
+
+
+def iter_sentences(text: str) -> Iterator[str]:
+    """Yield sentences of ``text`` lazily (no list of slices is built)."""
+    start = 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        sentence = text[start:match.start()]
+        if sentence.strip():
+            yield sentence
+        start = match.end()
+    if text[start:].strip():
+        yield text[start:]
+
+
+@dataclass
+class Chunk:
+    index: int
+    text: str
+    tokens: int
+    first_unit: int
+    last_unit: int
+
+
+@dataclass
+class ChunkPlan:
+    model: str
+    max_tokens: int
+    chunks: int
+    transcript_tokens: int
+    chunk_tokens: int
+    prompt_overhead_tokens: int
+
+    @property
+    def calls(self) -> int:
+        return self.chunks
+
+    @property
+    def estimated_prompt_tokens(self) -> int:
+        return self.chunk_tokens + self.chunks * self.prompt_overhead_tokens
+
+
+class TranscriptChunker:
+    """Split transcripts into token-budgeted chunks on sentence or segment boundaries.
+
+    ``max_tokens`` defaults to half of what the model's context window
+    leaves after ``reserved_tokens``, capped at ``MAX_DEFAULT_CHUNK_TOKENS``.
+    Up to ``overlap_tokens`` worth of trailing units from each chunk are
+    repeated at the start of the next one.
+    """
+
+    def __init__(self, model: str = "gpt-4", max_tokens: Optional[int] = None, overlap_tokens: int = 0,
+                 reserved_tokens: int = DEFAULT_RESERVED_TOKENS):
+        self.model = model
+        available = context_window(model) - reserved_tokens
+        self.max_tokens = min(max_tokens or min(available // 2, MAX_DEFAULT_CHUNK_TOKENS), available)
+        if overlap_tokens >= self.max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.overlap_tokens = overlap_tokens
+
+    def count_tokens(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    def units(self, text: Optional[str] = None, segments: Optional[Iterable[str]] = None) -> Iterator[str]:
+        """Yield caption/Whisper segments if given, otherwise sentences of ``text``.
+
+        ``segments`` may be a Transcript, whose segment texts are used directly.
+        """
+        if isinstance(segments, Transcript):
+            return segments.texts()
+        if segments is not None:
+            return (segment for segment in segments if segment.strip())
+        return iter_sentences(text or "")
+
+    def _fit(self, unit: str) -> Iterator[Tuple[str, int]]:
+        """Yield ``(text, tokens)`` pieces of a unit, cutting between words if it is over budget."""
+        tokens = self.count_tokens(unit)
+        if tokens <= self.max_tokens:
+            yield unit, tokens
+            return
+        words: List[str] = []
+        piece_tokens = 0
+        for word in unit.split():
+            word_tokens = self.count_tokens(" " + word)
+            if words and piece_tokens + word_tokens > self.max_tokens:
+                yield " ".join(words), piece_tokens
+                words, piece_tokens = [], 0
+            words.append(word)
+            piece_tokens += word_tokens
+        if words:
+            yield " ".join(words), piece_tokens
+
+    def chunks(self, text: Optional[str] = None, segments: Optional[Iterable[str]] = None) -> Iterator[Chunk]:
+        """Lazily yield chunks; only the chunk being built is held in memory."""
+        current: List[Tuple[str, int, int]] = []
+        current_tokens = 0
+        index = 0
+        for unit_index, unit in enumerate(self.units(text, segments)):
+            for piece, piece_tokens in self._fit(unit):
+                if current and current_tokens + piece_tokens > self.max_tokens:
+                    yield self._make_chunk(index, current, current_tokens)
+                    index += 1
+                    current, current_tokens = self._overlap(current, piece_tokens)
+                current.append((piece, piece_tokens, unit_index))
+                current_tokens += piece_tokens
+        if current:
+            yield self._make_chunk(index, current, current_tokens)
+
+    @staticmethod
+    def _make_chunk(index: int, pieces: List[Tuple[str, int, int]], tokens: int) -> Chunk:
+        text = " ".join(piece.strip() for piece, _, _ in pieces)
+        return Chunk(index, text, tokens, pieces[0][2], pieces[-1][2])
+
+    def _overlap(self, previous: List[Tuple[str, int, int]], incoming_tokens: int):
+        """Carry trailing pieces of the previous chunk that fit the overlap budget."""
+        budget = min(self.overlap_tokens, self.max_tokens - incoming_tokens)
+        carried: List[Tuple[str, int, int]] = []
+        total = 0
+        for item in reversed(previous):
+            if total + item[1] > budget:
+                break
+            carried.insert(0, item)
+            total += item[1]
+        return carried, total
+
+    def plan(self, text: Optional[str] = None, segments: Optional[Iterable[str]] = None,
+             prompt_overhead_tokens: int = 60) -> ChunkPlan:
+        """Count chunks and tokens without keeping the chunks, e.g. to preview API cost."""
+        chunks = 0
+        chunk_tokens = 0
+        for chunk in self.chunks(text, segments):
+            chunks += 1
+            chunk_tokens += chunk.tokens
+        transcript_tokens = self.count_tokens(text) if text is not None else chunk_tokens
+        return ChunkPlan(self.model, self.max_tokens, chunks, transcript_tokens, chunk_tokens,
+                         prompt_overhead_tokens)
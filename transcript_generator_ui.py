@@ -1,17 +1,26 @@
+import os
+import queue
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from pytube import YouTube
+from job_queue import JobQueue
+from instrumentation import configure_logging, trace
 from yt_transcript_extractor import (
     process_video_transcript, summarize_text, create_markdown_files, 
     mark_video_processed, check_ffmpeg_installed
 )
 from video_transcriber import VideoTranscriber
+from folder_ingest import MEDIA_EXTENSIONS, FolderIngester, find_media
 
 class TranscriptGeneratorUI:
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("Transcript Generator")
+        # Jobs run on background threads; their updates reach Tk through this queue
+        self.updates = queue.Queue()
+        self.jobs = JobQueue(max_workers=2, on_update=self.updates.put)
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.root.after(100, self.poll_updates)
         
     def setup_ui(self):
         # Create notebook for tabs
@@ -31,6 +40,55 @@ class TranscriptGeneratorUI:
         
         # Setup Local video tab
         self.setup_local_tab(local_frame)
+        
+        self.setup_jobs_panel()
+    
+    def setup_jobs_panel(self):
+        frame = ttk.LabelFrame(self.root, text="Jobs")
+        frame.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+        
+        columns = ("video", "stage", "progress", "status")
+        self.job_list = ttk.Treeview(frame, columns=columns, show="headings", height=6)
+        for column, width in zip(columns, (260, 100, 80, 90)):
+            self.job_list.heading(column, text=column.capitalize())
+            self.job_list.column(column, width=width)
+        self.job_list.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        tk.Button(frame, text="Cancel Selected", 
+                 command=self.cancel_selected).pack(pady=5)
+    
+    def poll_updates(self):
+        """Apply job updates on the Tk thread, then reschedule."""
+        try:
+            while True:
+                self.refresh_job(self.updates.get_nowait())
+        except queue.Empty:
+            pass
+        self.root.after(100, self.poll_updates)
+    
+    def refresh_job(self, job):
+        row = str(job.id)
+        progress = f"{job.progress:.0%}" if job.progress is not None else ""
+        values = (job.label, job.stage, progress, job.status)
+        if self.job_list.exists(row):
+            if self.job_list.set(row, "status") in ("done", "failed", "cancelled"):
+                return
+            self.job_list.item(row, values=values)
+        else:
+            self.job_list.insert("", tk.END, iid=row, values=values)
+        
+        if job.status == "done":
+            messagebox.showinfo("Success", job.result)
+        elif job.status == "failed":
+            messagebox.showerror("Error", f"Failed to process {job.label}: {job.error}")
+    
+    def cancel_selected(self):
+        for row in self.job_list.selection():
+            self.jobs.cancel(int(row))
+    
+    def close(self):
+        self.jobs.shutdown()
+        self.root.destroy()
     
     def setup_youtube_tab(self, parent):
         # YouTube URL entry
@@ -52,9 +110,13 @@ class TranscriptGeneratorUI:
         self.file_path_var = tk.StringVar()
         tk.Label(parent, textvariable=self.file_path_var, wraplength=400).pack(pady=10)
         
-        # Browse button
-        tk.Button(parent, text="Browse Video File", 
-                 command=self.browse_file).pack(pady=10)
+        # Browse buttons
+        browse_frame = tk.Frame(parent)
+        browse_frame.pack(pady=10)
+        tk.Button(browse_frame, text="Browse Video File", 
+                 command=self.browse_file).pack(side=tk.LEFT, padx=5)
+        tk.Button(browse_frame, text="Browse Folder", 
+                 command=self.browse_folder).pack(side=tk.LEFT, padx=5)
         
         # Process button
         tk.Button(parent, text="Generate Transcript", 
@@ -62,11 +124,17 @@ class TranscriptGeneratorUI:
     
     def browse_file(self):
         file_path = filedialog.askopenfilename(
-            filetypes=[("Video files", "*.mp4")]
+            filetypes=[("Media files", " ".join(f"*{ext}" for ext in sorted(MEDIA_EXTENSIONS))),
+                       ("All files", "*.*")]
         )
         if file_path:
             self.file_path_var.set(file_path)
     
+    def browse_folder(self):
+        folder_path = filedialog.askdirectory()
+        if folder_path:
+            self.file_path_var.set(folder_path)
+    
     def process_youtube(self, export_only=False):
         if not check_ffmpeg_installed():
             self.show_ffmpeg_instructions()
@@ -77,49 +145,59 @@ class TranscriptGeneratorUI:
             messagebox.showerror("Input Error", "Please enter a YouTube link.")
             return
 
-        try:
+        self.jobs.submit(youtube_link, self.youtube_job, youtube_link, export_only)
+    
+    @staticmethod
+    def youtube_job(youtube_link, export_only, job):
+        """Runs on a worker thread; returns the message shown on success."""
+        # One trace covers transcription, summary and file writes
+        with trace():
             # Process video and get transcript
-            result = process_video_transcript(youtube_link)
+            result = process_video_transcript(youtube_link, progress=job.report)
             
             # Handle export-only mode
             if export_only:
-                messagebox.showinfo("Success", 
-                    f"Transcript exported successfully to:\n{result['output_file']}")
-                return
+                return f"Transcript exported successfully to:\n{result['output_file']}"
 
             # Generate summary and create files
-            try:
-                summary = summarize_text(result['transcript'])
-                create_markdown_files(result['video_id'], result['transcript'], summary)
-                mark_video_processed(result['video_id'])
-                
-                messagebox.showinfo("Success", 
-                    f"Processing completed successfully!\n\n"
-                    f"Video ID: {result['video_id']}\n"
-                    f"Transcript: {result['output_file']}")
-                    
-            except Exception as e:
-                messagebox.showerror("Processing Error", f"Error during text processing: {str(e)}")
-                
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to process video: {str(e)}")
+            summary = summarize_text(result['transcript'], result['structured'], progress=job.report)
+            job.check_cancelled()
+            job.report('writing')
+            create_markdown_files(result['video_id'], result['transcript'], summary)
+            mark_video_processed(result['video_id'])
+        
+        return (f"Processing completed successfully!\n\n"
+                f"Video ID: {result['video_id']}\n"
+                f"Transcript: {result['output_file']}")
     
     def process_local_video(self):
         video_path = self.file_path_var.get()
         if not video_path:
-            messagebox.showerror("Input Error", "Please select a video file.")
+            messagebox.showerror("Input Error", "Please select a video file or folder.")
             return
         
-        try:
-            transcriber = VideoTranscriber()
-            transcript_path = transcriber.process_video(video_path)
-            
-            messagebox.showinfo("Success", 
-                f"Video processed successfully!\n\n"
+        if os.path.isdir(video_path):
+            self.jobs.submit(os.path.basename(video_path), self.folder_job, video_path)
+        else:
+            self.jobs.submit(os.path.basename(video_path), self.local_video_job, video_path)
+    
+    @staticmethod
+    def local_video_job(video_path, job):
+        job.report('loading model')
+        transcriber = VideoTranscriber()
+        transcript_path = transcriber.process_video(video_path, progress=job.report)
+        return (f"Video processed successfully!\n\n"
                 f"Transcript saved to: {transcript_path}")
-                
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to process video: {str(e)}")
+    
+    @staticmethod
+    def folder_job(folder_path, job):
+        job.report('loading model')
+        ingester = FolderIngester(VideoTranscriber(), output_dir=os.path.join(folder_path, "transcripts"))
+        stats = ingester.run(find_media([folder_path]), progress=job.report)
+        return (f"Folder processed: {stats.done} transcribed, {stats.cached} from cache, "
+                f"{stats.skipped} skipped, {stats.failed} failed\n\n"
+                f"Real-time factor: {stats.rtf:.2f}\n"
+                f"Transcripts saved to: {ingester.output_dir}")
     
     def show_ffmpeg_instructions(self):
         message = """FFmpeg is not installed or not found in system PATH. Please follow these steps:
@@ -138,5 +216,6 @@ For detailed instructions, visit: https://windowsloop.com/install-ffmpeg-windows
         self.root.mainloop()
 
 if __name__ == "__main__":
+    configure_logging()
     app = TranscriptGeneratorUI()
     app.run() 
\ No newline at end of file
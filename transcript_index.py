@@ -0,0 +1,647 @@
+"""Search index over every transcript the pipelines write.
+
+Transcripts are indexed as they are saved (``save_transcript_file``,
+``create_markdown_files`` and ``VideoTranscriber.save_transcript`` call
+``index_transcript``), and ``reindex`` backfills existing output folders.
+Each transcript segment is a row with its start/end time. An SQLite FTS5
+table (porter stemming, diacritics folded) over the segment texts answers
+keyword, phrase and prefix queries ranked by BM25. ``search`` asks FTS5 for the top
+hits before joining the metadata, so queries stay in the millisecond range
+with hundreds of thousands of transcripts.
+
+The optional embedding index groups segments into chunks of about
+``chunk_chars`` characters and stores one normalized float32 vector per
+chunk. ``semantic_search`` loads the vectors into a single NumPy matrix
+once (reloaded only after writes) and scores a query with one matrix-vector
+product. Embedders are pluggable: ``hashing`` (feature-hashed words and
+word pairs, offline, no model) or ``openai:<model>`` (the embeddings API,
+following ``OPENAI_BASE_URL``).
+
+Environment:
+    TRANSCRIPT_INDEX     index database path (default ``transcript_index.db``), or ``off``
+    TRANSCRIPT_EMBEDDER  also embed transcripts as they are indexed, e.g. ``hashing``
+
+Usage:
+    python transcript_index.py search "gradient descent" --limit 10
+    python transcript_index.py search "why leaders eat last" --semantic
+    python transcript_index.py reindex . batch_output
+    python transcript_index.py embed --embedder hashing
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from instrumentation import configure_logging
+from transcript_model import Transcript, format_clock
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = 'transcript_index.db'
+DEFAULT_CHUNK_CHARS = 600
+# Plain-text transcripts (no timestamps) are split into segments of about this size
+TEXT_SEGMENT_CHARS = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    doc_key TEXT NOT NULL UNIQUE,
+    video_id TEXT,
+    kind TEXT NOT NULL,
+    title TEXT,
+    path TEXT,
+    language TEXT,
+    duration REAL,
+    mtime REAL,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_video ON documents(video_id);
+CREATE INDEX IF NOT EXISTS documents_path ON documents(path);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    doc_id INTEGER NOT NULL,
+    start_s REAL,
+    end_s REAL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_doc ON segments(doc_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    text, content='segments', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS segments_insert AFTER INSERT ON segments BEGIN
+    INSERT INTO segments_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS segments_delete AFTER DELETE ON segments BEGIN
+    INSERT INTO segments_fts(segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    doc_id INTEGER NOT NULL,
+    embedder TEXT NOT NULL,
+    start_s REAL,
+    end_s REAL,
+    text TEXT NOT NULL,
+    vector BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_doc ON chunks(doc_id, embedder);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+_WORD_RE = re.compile(r"\w+")
+_QUERY_RE = re.compile(r'"([^"]+)"|(\w+\*?)')
+_CLOCK_LINE_RE = re.compile(r'^\[(\d+):(\d\d):(\d\d)\]\s*(.*)$')
+
+
+def fts_query(query: str) -> str:
+    """Turn free text into an FTS5 query: every word (or ``"quoted phrase"``) must match.
+
+    A trailing ``*`` keeps prefix matching; any other FTS5 syntax is treated as text.
+    """
+    terms = []
+    for phrase, word in _QUERY_RE.findall(query):
+        if phrase:
+            words = _WORD_RE.findall(phrase)
+            if words:
+                terms.append('"' + ' '.join(words) + '"')
+        elif word.endswith('*'):
+            terms.append(f'"{word[:-1]}"*')
+        else:
+            terms.append(f'"{word}"')
+    return ' '.join(terms)
+
+
+class HashingEmbedder:
+    """Offline embedder: signed feature hashing of lowercased words and word pairs."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = _WORD_RE.findall(text.lower())
+            features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            if not features:
+                continue
+            # crc32 is stable across processes, unlike hash()
+            hashes = np.fromiter((zlib.crc32(f.encode('utf-8')) for f in features), dtype=np.uint32,
+                                 count=len(features))
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(vectors[row], hashes % self.dim, signs)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class OpenAIEmbedder:
+    """Embeddings API (``text-embedding-3-small`` by default), in batches."""
+
+    def __init__(self, model: str = 'text-embedding-3-small', client=None, batch_size: int = 256):
+        self.model = model
+        self.name = f"openai:{model}"
+        self.batch_size = batch_size
+        self._client = client
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        if self._client is None:
+            from openai import OpenAI
+
+            self._client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        rows = []
+        for start in range(0, len(texts), self.batch_size):
+            response = self._client.embeddings.create(model=self.model, input=texts[start:start + self.batch_size])
+            rows.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        vectors = np.asarray(rows, dtype=np.float32).reshape(len(texts), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+def get_embedder(spec: Optional[str]):
+    """``hashing``, ``hashing:<dim>`` or ``openai[:<model>]``; None or ``off`` gives None."""
+    if not spec or spec.lower() == 'off':
+        return None
+    name, _, arg = spec.partition(':')
+    if name == 'hashing':
+        return HashingEmbedder(int(arg) if arg else 256)
+    if name == 'openai':
+        return OpenAIEmbedder(arg or 'text-embedding-3-small')
+    raise ValueError(f"Unknown embedder {spec!r}; use hashing[:dim] or openai[:model]")
+
+
+@dataclass
+class SearchHit:
+    video_id: Optional[str]
+    kind: str
+    title: Optional[str]
+    path: Optional[str]
+    start: Optional[float]
+    end: Optional[float]
+    text: str
+    score: float
+
+    @property
+    def url(self) -> Optional[str]:
+        """Link to the moment in the video, for YouTube transcripts."""
+        if self.kind not in ('youtube', 'full_text') or not self.video_id:
+            return None
+        return f"https://youtu.be/{self.video_id}" + (f"?t={int(self.start)}" if self.start else "")
+
+
+def _text_segments(text: str) -> List[Dict]:
+    """Split an untimed transcript into paragraph-sized segments."""
+    segments = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = ' '.join(paragraph.split())
+        while paragraph:
+            if len(paragraph) <= TEXT_SEGMENT_CHARS:
+                cut = len(paragraph)
+            else:
+                cut = paragraph.rfind(' ', 0, TEXT_SEGMENT_CHARS)
+                cut = cut if cut > 0 else TEXT_SEGMENT_CHARS
+            segments.append({'start': None, 'end': None, 'text': paragraph[:cut]})
+            paragraph = paragraph[cut:].strip()
+    return segments
+
+
+def read_markdown_transcript(path: str) -> List[Dict]:
+    """Segments of a markdown transcript: ``[HH:MM:SS] text`` paragraphs, else plain paragraphs."""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    segments = []
+    for line in text.splitlines():
+        match = _CLOCK_LINE_RE.match(line.strip())
+        if match:
+            hours, minutes, seconds, body = match.groups()
+            start = int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+            if segments and segments[-1]['end'] is None:
+                segments[-1]['end'] = start
+            segments.append({'start': start, 'end': None, 'text': body})
+    if segments:
+        return [seg for seg in segments if seg['text'].strip()]
+    # Skip the generated header of the local transcripts
+    body = text.split('## Content', 1)[-1] if text.startswith('# Transcript:') else text
+    return _text_segments(body)
+
+
+class TranscriptIndex:
+    def __init__(self, path: str = DEFAULT_INDEX_PATH, embedder=None, chunk_chars: int = DEFAULT_CHUNK_CHARS):
+        self.path = path
+        self.embedder = embedder
+        self.chunk_chars = chunk_chars
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._matrices: Dict[str, Tuple[int, np.ndarray, np.ndarray]] = {}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _generation(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()
+        return row[0] if row else 0
+
+    def add_segments(self, doc_key: str, segments: Iterable[Dict], kind: str, video_id: Optional[str] = None,
+                     title: Optional[str] = None, path: Optional[str] = None,
+                     language: Optional[str] = None) -> int:
+        """Index (or replace) one transcript given as ``{'start', 'end', 'text'}`` dicts; returns its row id.
+
+        A document indexed earlier from the same ``path`` under another key is replaced as well.
+        """
+        rows = [(seg.get('start'), seg.get('end'), seg['text'].strip()) for seg in segments if seg['text'].strip()]
+        ends = [end for _, end, _ in rows if end is not None]
+        mtime = os.path.getmtime(path) if path and os.path.exists(path) else None
+        vectors = None
+        if self.embedder is not None:
+            chunks = self._chunks(rows)
+            vectors = (chunks, self.embedder([text for _, _, text in chunks])) if chunks else None
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for old in conn.execute('SELECT id FROM documents WHERE doc_key = ? OR path = ?',
+                                        (doc_key, path)).fetchall():
+                    conn.execute('DELETE FROM segments WHERE doc_id = ?', (old[0],))
+                    conn.execute('DELETE FROM chunks WHERE doc_id = ?', (old[0],))
+                    conn.execute('DELETE FROM documents WHERE id = ?', (old[0],))
+                doc_id = conn.execute(
+                    'INSERT INTO documents (doc_key, video_id, kind, title, path, language, duration, mtime, '
+                    'indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (doc_key, video_id, kind, title, path, language, max(ends) if ends else None, mtime, time.time()),
+                ).lastrowid
+                conn.executemany('INSERT INTO segments (doc_id, start_s, end_s, text) VALUES (?, ?, ?, ?)',
+                                 [(doc_id, start, end, text) for start, end, text in rows])
+                if vectors is not None:
+                    self._insert_chunks(conn, doc_id, self.embedder.name, *vectors)
+                conn.execute("INSERT INTO meta (name, value) VALUES ('generation', 1) "
+                             "ON CONFLICT(name) DO UPDATE SET value = value + 1")
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        return doc_id
+
+    def add_transcript(self, doc_key: str, transcript: Transcript, kind: str, **fields) -> int:
+        segments = ({'start': seg.start, 'end': seg.end, 'text': seg.text} for seg in transcript)
+        return self.add_segments(doc_key, segments, kind, language=transcript.language, **fields)
+
+    def add_text(self, doc_key: str, text: str, kind: str, **fields) -> int:
+        """Index an untimed transcript (e.g. ``_full_text.md``), split into paragraph segments."""
+        return self.add_segments(doc_key, _text_segments(text), kind, **fields)
+
+    def remove(self, doc_key: str) -> bool:
+        with self._write_lock:
+            conn = self._conn()
+            row = conn.execute('SELECT id FROM documents WHERE doc_key = ?', (doc_key,)).fetchone()
+            if row is None:
+                return False
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM segments WHERE doc_id = ?', (row[0],))
+            conn.execute('DELETE FROM chunks WHERE doc_id = ?', (row[0],))
+            conn.execute('DELETE FROM documents WHERE id = ?', (row[0],))
+            conn.execute("INSERT INTO meta (name, value) VALUES ('generation', 1) "
+                         "ON CONFLICT(name) DO UPDATE SET value = value + 1")
+            conn.execute('COMMIT')
+        return True
+
+    def _chunks(self, rows: List[Tuple]) -> List[Tuple]:
+        """Group consecutive segments into ``(start, end, text)`` chunks of about ``chunk_chars``."""
+        chunks = []
+        start = end = None
+        parts: List[str] = []
+        size = 0
+        for seg_start, seg_end, text in rows:
+            if parts and size + len(text) > self.chunk_chars:
+                chunks.append((start, end, ' '.join(parts)))
+                parts, size = [], 0
+            if not parts:
+                start = seg_start
+            parts.append(text)
+            size += len(text) + 1
+            end = seg_end
+        if parts:
+            chunks.append((start, end, ' '.join(parts)))
+        return chunks
+
+    @staticmethod
+    def _insert_chunks(conn, doc_id: int, embedder_name: str, chunks: List[Tuple], vectors: np.ndarray):
+        conn.executemany(
+            'INSERT INTO chunks (doc_id, embedder, start_s, end_s, text, vector) VALUES (?, ?, ?, ?, ?, ?)',
+            [(doc_id, embedder_name, start, end, text, vector.astype(np.float32).tobytes())
+             for (start, end, text), vector in zip(chunks, vectors)],
+        )
+
+    def embed_missing(self, embedder=None, batch_docs: int = 64) -> int:
+        """Embed every document without vectors for ``embedder``; returns the number embedded."""
+        embedder = embedder or self.embedder
+        if embedder is None:
+            raise ValueError("No embedder configured")
+        conn = self._conn()
+        doc_ids = [row[0] for row in conn.execute(
+            'SELECT id FROM documents WHERE id NOT IN (SELECT DISTINCT doc_id FROM chunks WHERE embedder = ?)',
+            (embedder.name,))]
+        for start in range(0, len(doc_ids), batch_docs):
+            batch = []
+            for doc_id in doc_ids[start:start + batch_docs]:
+                rows = conn.execute('SELECT start_s, end_s, text FROM segments WHERE doc_id = ? ORDER BY id',
+                                    (doc_id,)).fetchall()
+                batch.extend((doc_id, chunk) for chunk in self._chunks(rows))
+            if not batch:
+                continue
+            vectors = embedder([chunk[2] for _, chunk in batch])
+            with self._write_lock:
+                conn.execute('BEGIN IMMEDIATE')
+                for (doc_id, chunk), vector in zip(batch, vectors):
+                    self._insert_chunks(conn, doc_id, embedder.name, [chunk], vector[None, :])
+                conn.execute("INSERT INTO meta (name, value) VALUES ('generation', 1) "
+                             "ON CONFLICT(name) DO UPDATE SET value = value + 1")
+                conn.execute('COMMIT')
+        return len(doc_ids)
+
+    def _hits(self, conn, rows) -> List[SearchHit]:
+        """Attach document metadata to ``(doc_id, start, end, text, score)`` rows."""
+        doc_ids = sorted({row[0] for row in rows})
+        docs = {}
+        if doc_ids:
+            placeholders = ','.join('?' * len(doc_ids))
+            for doc in conn.execute(f'SELECT id, video_id, kind, title, path FROM documents '
+                                    f'WHERE id IN ({placeholders})', doc_ids):
+                docs[doc[0]] = doc[1:]
+        return [SearchHit(*docs.get(doc_id, (None, '', None, None)), start, end, text, score)
+                for doc_id, start, end, text, score in rows]
+
+    def search(self, query: str, limit: int = 20, video_id: Optional[str] = None,
+               kind: Optional[str] = None, raw: bool = False) -> List[SearchHit]:
+        """Best-matching segments by BM25; ``text`` holds a snippet with ``[matches]`` marked.
+
+        ``raw`` passes ``query`` to FTS5 unchanged (operators, ``NEAR``, column filters).
+        """
+        match = query if raw else fts_query(query)
+        if not match:
+            return []
+        conn = self._conn()
+        if video_id is None and kind is None:
+            # Let FTS5 rank and cut to the top hits before anything is joined
+            rows = conn.execute(
+                "SELECT s.doc_id, s.start_s, s.end_s, hit.snippet, hit.score FROM ("
+                " SELECT rowid, snippet(segments_fts, 0, '[', ']', '…', 16) AS snippet, rank AS score"
+                " FROM segments_fts WHERE segments_fts MATCH ? ORDER BY rank LIMIT ?"
+                ") AS hit JOIN segments s ON s.id = hit.rowid ORDER BY hit.score",
+                (match, limit)).fetchall()
+        else:
+            filters, params = [], [match]
+            if video_id is not None:
+                filters.append('d.video_id = ?')
+                params.append(video_id)
+            if kind is not None:
+                filters.append('d.kind = ?')
+                params.append(kind)
+            rows = conn.execute(
+                "SELECT s.doc_id, s.start_s, s.end_s, snippet(segments_fts, 0, '[', ']', '…', 16), rank"
+                " FROM segments_fts JOIN segments s ON s.id = segments_fts.rowid"
+                " JOIN documents d ON d.id = s.doc_id"
+                f" WHERE segments_fts MATCH ? AND {' AND '.join(filters)} ORDER BY rank LIMIT ?",
+                params + [limit]).fetchall()
+        return self._hits(conn, rows)
+
+    def _matrix(self, embedder_name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """``(chunk ids, vectors)`` for an embedder, reloaded only when the index changed."""
+        conn = self._conn()
+        generation = self._generation(conn)
+        cached = self._matrices.get(embedder_name)
+        if cached is not None and cached[0] == generation:
+            return cached[1], cached[2]
+        ids, blobs = [], []
+        for chunk_id, blob in conn.execute('SELECT id, vector FROM chunks WHERE embedder = ? ORDER BY id',
+                                           (embedder_name,)):
+            ids.append(chunk_id)
+            blobs.append(blob)
+        if blobs:
+            matrix = np.frombuffer(b''.join(blobs), dtype=np.float32).reshape(len(blobs), -1)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        ids = np.asarray(ids, dtype=np.int64)
+        self._matrices[embedder_name] = (generation, ids, matrix)
+        return ids, matrix
+
+    def semantic_search(self, query: str, limit: int = 20, embedder=None) -> List[SearchHit]:
+        """Chunks closest to ``query`` by cosine similarity (vectors are normalized)."""
+        embedder = embedder or self.embedder
+        if embedder is None:
+            raise ValueError("No embedder configured")
+        ids, matrix = self._matrix(embedder.name)
+        if not len(ids):
+            return []
+        scores = matrix @ embedder([query])[0]
+        top = np.argpartition(-scores, min(limit, len(scores) - 1))[:limit]
+        top = top[np.argsort(-scores[top])]
+        conn = self._conn()
+        placeholders = ','.join('?' * len(top))
+        chunks = {row[0]: row[1:] for row in conn.execute(
+            f'SELECT id, doc_id, start_s, end_s, text FROM chunks WHERE id IN ({placeholders})',
+            [int(ids[i]) for i in top])}
+        rows = [chunks[int(ids[i])] + (float(scores[i]),) for i in top if int(ids[i]) in chunks]
+        return self._hits(conn, rows)
+
+    def indexed_mtime(self, path: str) -> Optional[float]:
+        row = self._conn().execute('SELECT mtime FROM documents WHERE path = ?', (path,)).fetchone()
+        return row[0] if row else None
+
+    def indexed_key(self, path: str) -> Optional[str]:
+        """The ``doc_key`` the file at ``path`` is indexed under (e.g. by content, from the save hook)."""
+        row = self._conn().execute('SELECT doc_key FROM documents WHERE path = ?', (path,)).fetchone()
+        return row[0] if row else None
+
+    def stats(self) -> Dict:
+        conn = self._conn()
+        counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                  for table in ('documents', 'segments', 'chunks')}
+        counts['bytes'] = os.path.getsize(self.path)
+        return counts
+
+
+def _classify(path: str) -> Optional[Tuple[str, str, str]]:
+    """``(kind, video_id or title, doc_key prefix)`` for the transcript files the pipelines write."""
+    name = os.path.basename(path)
+    for suffix, kind in (('_transcriptOnly.md', 'youtube'), ('_full_text.md', 'full_text'),
+                         ('_transcript.md', 'local')):
+        if name.endswith(suffix):
+            return kind, name[:-len(suffix)], suffix
+    return None
+
+
+def find_transcripts(roots: Iterable[str]) -> Iterator[Tuple[str, str, str]]:
+    """Yield ``(path, kind, stem)`` for transcripts under ``roots``."""
+    for root in roots:
+        for directory, dirs, files in os.walk(root):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(files):
+                classified = _classify(name)
+                if classified is not None:
+                    yield os.path.join(directory, name), classified[0], classified[1]
+
+
+def _load_segments(path: str, kind: str, stem: str) -> Tuple[List[Dict], Optional[str]]:
+    """Segments of a saved transcript, from the JSON copy when there is one (it has end times)."""
+    json_path = os.path.join(os.path.dirname(path), f"{stem}_transcript.json")
+    if kind != 'full_text' and os.path.exists(json_path):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            transcript = Transcript.from_dict(json.load(f))
+        return [{'start': seg.start, 'end': seg.end, 'text': seg.text} for seg in transcript], transcript.language
+    return read_markdown_transcript(path), None
+
+
+def doc_key(kind: str, video_id: Optional[str] = None, path: Optional[str] = None) -> str:
+    """YouTube transcripts are keyed by video (a re-run replaces them), others by file."""
+    if video_id and kind in ('youtube', 'full_text'):
+        return f"{kind}:{video_id}"
+    return f"{kind}:{video_id or os.path.realpath(path)}"
+
+
+def reindex(index: TranscriptIndex, roots: Iterable[str], force: bool = False) -> Dict[str, int]:
+    """Index the transcripts under ``roots`` that are new or changed since they were indexed."""
+    counts = {'indexed': 0, 'unchanged': 0, 'failed': 0}
+    for path, kind, stem in find_transcripts(roots):
+        path = os.path.abspath(path)
+        mtime = index.indexed_mtime(path)
+        if not force and mtime is not None and mtime >= os.path.getmtime(path):
+            counts['unchanged'] += 1
+            continue
+        try:
+            segments, language = _load_segments(path, kind, stem)
+            video_id = stem if kind in ('youtube', 'full_text') else None
+            # Keep the key the file was indexed under when it was saved
+            key = index.indexed_key(path) or doc_key(kind, video_id, path)
+            index.add_segments(key, segments, kind, video_id=video_id, title=stem, path=path, language=language)
+            counts['indexed'] += 1
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Could not index %s: %s", path, e)
+            counts['failed'] += 1
+    return counts
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_default_index() -> Optional[TranscriptIndex]:
+    """Shared index at ``TRANSCRIPT_INDEX`` (None when set to ``off``), embedding with ``TRANSCRIPT_EMBEDDER``."""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            path = os.getenv('TRANSCRIPT_INDEX', DEFAULT_INDEX_PATH)
+            if path.lower() in ('off', 'false', '0', ''):
+                return None
+            _default_index = TranscriptIndex(path, embedder=get_embedder(os.getenv('TRANSCRIPT_EMBEDDER')))
+        return _default_index
+
+
+def index_transcript(path: str, transcript, kind: str, video_id: Optional[str] = None,
+                     title: Optional[str] = None, key: Optional[str] = None):
+    """Save hook: add a just-written transcript (Transcript or plain text) to the default index.
+
+    Indexing problems are logged and never fail the save.
+    """
+    try:
+        index = get_default_index()
+        if index is None:
+            return
+        fields = dict(video_id=video_id, title=title or video_id, path=os.path.abspath(path))
+        key = doc_key(kind, key or video_id, path)
+        if isinstance(transcript, Transcript):
+            index.add_transcript(key, transcript, kind, **fields)
+        else:
+            index.add_text(key, transcript, kind, **fields)
+    except Exception as e:
+        logger.warning("Could not index %s: %s", path, e)
+
+
+def _print_hits(hits: List[SearchHit]):
+    for hit in hits:
+        when = f" [{format_clock(hit.start)}]" if hit.start is not None else ""
+        where = hit.url or hit.path
+        print(f"{hit.title or hit.video_id}{when} ({hit.kind}, {hit.score:.3f}) {where}\n    {hit.text}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search and maintain the transcript index.")
+    parser.add_argument('--index', default=None,
+                        help=f"Index database (default: TRANSCRIPT_INDEX or {DEFAULT_INDEX_PATH})")
+    commands = parser.add_subparsers(dest='command', required=True)
+    search = commands.add_parser('search', help="Full-text (or --semantic) search")
+    search.add_argument('query')
+    search.add_argument('--limit', type=int, default=10)
+    search.add_argument('--video', default=None, help="Only this video ID")
+    search.add_argument('--kind', default=None, choices=('youtube', 'full_text', 'local'))
+    search.add_argument('--raw', action='store_true', help="Pass the query to FTS5 unchanged")
+    search.add_argument('--semantic', action='store_true', help="Search the embedding index instead")
+    search.add_argument('--embedder', default=None,
+                        help="hashing[:dim] or openai[:model] (default: TRANSCRIPT_EMBEDDER)")
+    search.add_argument('--json', action='store_true', help="Print hits as JSON")
+    rebuild = commands.add_parser('reindex', help="Index transcripts already on disk")
+    rebuild.add_argument('roots', nargs='*', default=['.'])
+    rebuild.add_argument('--force', action='store_true', help="Reindex unchanged files too")
+    embed = commands.add_parser('embed', help="Embed documents that have no vectors yet")
+    embed.add_argument('--embedder', default=None,
+                       help="hashing[:dim] or openai[:model] (default: TRANSCRIPT_EMBEDDER)")
+    commands.add_parser('stats', help="Document, segment and chunk counts")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    index = TranscriptIndex(args.index or os.getenv('TRANSCRIPT_INDEX', DEFAULT_INDEX_PATH))
+    embedder = get_embedder(getattr(args, 'embedder', None) or os.getenv('TRANSCRIPT_EMBEDDER'))
+    if args.command == 'search':
+        started = time.perf_counter()
+        if args.semantic:
+            if embedder is None:
+                parser.error("--semantic needs --embedder or TRANSCRIPT_EMBEDDER")
+            hits = index.semantic_search(args.query, args.limit, embedder)
+        else:
+            hits = index.search(args.query, args.limit, video_id=args.video, kind=args.kind, raw=args.raw)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if args.json:
+            print(json.dumps({'query': args.query, 'ms': round(elapsed_ms, 2),
+                              'hits': [dict(asdict(hit), url=hit.url) for hit in hits]}, indent=2,
+                             ensure_ascii=False))
+        else:
+            _print_hits(hits)
+            print(f"{len(hits)} hits in {elapsed_ms:.1f} ms")
+    elif args.command == 'reindex':
+        print(json.dumps(reindex(index, args.roots, force=args.force)))
+    elif args.command == 'embed':
+        if embedder is None:
+            parser.error("embed needs --embedder or TRANSCRIPT_EMBEDDER")
+        print(json.dumps({'embedded': index.embed_missing(embedder), 'embedder': embedder.name}))
+    else:
+        print(json.dumps(index.stats()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
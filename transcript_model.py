@@ -0,0 +1,180 @@
+"""Compact timestamped transcript shared by captions, Whisper and all writers.
+
+Segment texts live in one string (``Transcript.text``, segments joined by a
+space) and each segment is a pair of character offsets into it, with start
+and end times and a confidence held in typed arrays. The full text can be
+handed to the summarizer as-is, and exports stream slices of the buffer to
+a file instead of building per-segment strings and lists first.
+"""
+import io
+import json
+import math
+from array import array
+from typing import Dict, Iterable, Iterator, Optional, TextIO
+
+UNKNOWN_CONFIDENCE = float('nan')
+
+
+class Segment:
+    __slots__ = ('start', 'end', 'text', 'confidence')
+
+    def __init__(self, start: float, end: float, text: str, confidence: float = UNKNOWN_CONFIDENCE):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.confidence = confidence
+
+    def __repr__(self):
+        return f"Segment({self.start:.2f}-{self.end:.2f}, {self.text!r})"
+
+
+class Transcript:
+    __slots__ = ('text', 'starts', 'ends', 'text_starts', 'text_ends', 'confidences', 'language', 'source')
+
+    def __init__(self, language: Optional[str] = None, source: str = ''):
+        self.text = ''
+        self.starts = array('d')
+        self.ends = array('d')
+        self.text_starts = array('L')
+        self.text_ends = array('L')
+        self.confidences = array('f')
+        self.language = language
+        self.source = source
+
+    @classmethod
+    def from_segments(cls, segments: Iterable[Dict], language: Optional[str] = None,
+                      source: str = '') -> "Transcript":
+        """Build from dicts with ``text``, ``start`` and ``end`` or ``duration``.
+
+        Whisper's ``avg_logprob`` becomes the confidence when present.
+        """
+        transcript = cls(language, source)
+        parts = []
+        position = 0
+        for segment in segments:
+            text = segment['text'].strip()
+            if not text:
+                continue
+            if parts:
+                position += 1
+            start = float(segment['start'])
+            end = float(segment['end']) if 'end' in segment else start + float(segment.get('duration', 0.0))
+            if 'confidence' in segment:
+                confidence = segment['confidence']
+            elif 'avg_logprob' in segment:
+                confidence = math.exp(segment['avg_logprob'])
+            else:
+                confidence = UNKNOWN_CONFIDENCE
+            transcript.starts.append(start)
+            transcript.ends.append(end)
+            transcript.text_starts.append(position)
+            transcript.text_ends.append(position + len(text))
+            transcript.confidences.append(UNKNOWN_CONFIDENCE if confidence is None else confidence)
+            parts.append(text)
+            position += len(text)
+        transcript.text = ' '.join(parts)
+        return transcript
+
+    @classmethod
+    def from_whisper(cls, result: Dict, source: str = 'whisper') -> "Transcript":
+        """Build from a Whisper ``transcribe`` result (or a cached copy of one)."""
+        segments = result.get('segments')
+        if not segments:
+            segments = [{'text': result.get('text', ''), 'start': 0.0, 'end': 0.0}]
+        return cls.from_segments(segments, result.get('language'), source)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Transcript":
+        return cls.from_segments(data['segments'], data.get('language'), data.get('source', ''))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, index: int) -> Segment:
+        return Segment(self.starts[index], self.ends[index], self.segment_text(index), self.confidences[index])
+
+    def __iter__(self) -> Iterator[Segment]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def segment_text(self, index: int) -> str:
+        return self.text[self.text_starts[index]:self.text_ends[index]]
+
+    def texts(self) -> Iterator[str]:
+        """Yield segment texts, e.g. as chunking units for the LLM stages."""
+        for index in range(len(self)):
+            yield self.segment_text(index)
+
+    @property
+    def duration(self) -> float:
+        return self.ends[-1] if len(self) else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'language': self.language,
+            'source': self.source,
+            'segments': [
+                {'start': self.starts[i], 'end': self.ends[i], 'text': self.segment_text(i),
+                 'confidence': None if math.isnan(self.confidences[i]) else round(self.confidences[i], 4)}
+                for i in range(len(self))
+            ],
+        }
+
+    def write_srt(self, f: TextIO):
+        for index in range(len(self)):
+            f.write(f"{index + 1}\n{format_timestamp(self.starts[index], ',')} --> "
+                    f"{format_timestamp(self.ends[index], ',')}\n")
+            f.write(self.segment_text(index))
+            f.write("\n\n")
+
+    def write_vtt(self, f: TextIO):
+        f.write("WEBVTT\n\n")
+        for index in range(len(self)):
+            f.write(f"{format_timestamp(self.starts[index], '.')} --> {format_timestamp(self.ends[index], '.')}\n")
+            f.write(self.segment_text(index))
+            f.write("\n\n")
+
+    def write_markdown(self, f: TextIO):
+        """Write ``[HH:MM:SS] text`` paragraphs, the layout of the markdown transcripts."""
+        for index in range(len(self)):
+            f.write(f"[{format_clock(self.starts[index])}] ")
+            f.write(self.segment_text(index))
+            f.write("\n\n")
+
+    def write_json(self, f: TextIO):
+        json.dump(self.to_dict(), f, ensure_ascii=False)
+
+    def export(self, fmt: str) -> str:
+        """Render as ``srt``, ``vtt``, ``json`` or ``md``."""
+        buffer = io.StringIO()
+        WRITERS[fmt](self, buffer)
+        return buffer.getvalue()
+
+    def save(self, path: str, fmt: Optional[str] = None) -> str:
+        """Write the transcript to ``path``; the format defaults to the file extension."""
+        fmt = fmt or path.rsplit('.', 1)[-1].lower()
+        with open(path, 'w', encoding='utf-8') as f:
+            WRITERS[fmt](self, f)
+        return path
+
+
+WRITERS = {
+    'srt': Transcript.write_srt,
+    'vtt': Transcript.write_vtt,
+    'json': Transcript.write_json,
+    'md': Transcript.write_markdown,
+}
+
+
+def format_timestamp(seconds: float, decimal_marker: str) -> str:
+    """``HH:MM:SS,mmm`` (SRT) or ``HH:MM:SS.mmm`` (VTT)."""
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02}:{minutes:02}:{secs:02}{decimal_marker}{millis:03}"
+
+
+def format_clock(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:02}:{seconds % 3600 // 60:02}:{seconds % 60:02}"
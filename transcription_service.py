@@ -0,0 +1,324 @@
+"""Local HTTP service in front of the transcription pipelines.
+
+One long-running process keeps the Whisper model (and the OpenAI clients)
+warm for every caller. Jobs are submitted asynchronously and polled:
+
+    POST   /jobs            {"kind": "youtube", "url": "...", "export_only": false}
+                            {"kind": "local", "path": "/videos/talk.mp4"}
+                            {"kind": "analyze", "video_id": "..."}
+                            -> 202 {"job": {...}, "coalesced": false}
+    GET    /jobs/<id>       job status, stage, progress and result (?wait=<s> long-polls)
+    GET    /jobs            all known jobs
+    DELETE /jobs/<id>       cancel
+    GET    /healthz         liveness and queue depth
+    GET    /metrics         Prometheus metrics (see ``instrumentation``)
+
+A request for a video that is already queued or running returns the
+existing job (``"coalesced": true``) instead of starting a second one,
+unless that job has been cancelled. At
+most ``max_pending`` jobs may be queued or running; beyond that POST
+returns 429 with ``Retry-After``.
+
+Everything can run offline: pipelines are injectable, ``--caption-fixture``
+replays recorded captions (see ``caption_provider``), and the OpenAI calls
+follow ``OPENAI_BASE_URL``, so they can go to ``fake_openai_server``.
+
+Usage:
+    python transcription_service.py --port 8765 --workers 2 --max-pending 8 --warm
+"""
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from instrumentation import configure_logging, get_metrics, trace
+from job_queue import Job, JobQueue, QueueFull
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = ('queued', 'running')
+MAX_WAIT_S = 60.0
+
+
+@dataclass
+class Pipeline:
+    """``key(params)`` names the work for coalescing (ValueError on bad input);
+    ``run(params, job=job)`` does it and returns a JSON-serializable result."""
+    key: Callable[[Dict], str]
+    run: Callable[..., Dict]
+
+
+def _youtube_key(params: Dict) -> str:
+    from download_manager import extract_video_id
+
+    if not params.get('url'):
+        raise ValueError("'url' is required")
+    mode = 'export' if params.get('export_only') else 'full'
+    return f"{extract_video_id(params['url'])}:{mode}"
+
+
+def _run_youtube(params: Dict, job: Job) -> Dict:
+    from yt_transcript_extractor import (
+        create_markdown_files, mark_video_processed, process_video_transcript, summarize_text
+    )
+
+    with trace():
+        result = process_video_transcript(params['url'], progress=job.report)
+        response = {'video_id': result['video_id'], 'output_file': result['output_file'],
+                    'detected_lang': result['detected_lang']}
+        if params.get('export_only'):
+            return response
+        summary = summarize_text(result['transcript'], result['structured'], progress=job.report)
+        job.check_cancelled()
+        job.report('writing')
+        create_markdown_files(result['video_id'], result['transcript'], summary)
+        mark_video_processed(result['video_id'])
+        return dict(response, summary=summary)
+
+
+def _local_key(params: Dict) -> str:
+    path = params.get('path')
+    if not path or not os.path.isfile(path):
+        raise ValueError(f"'path' must be an existing file: {path!r}")
+    return os.path.realpath(path)
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def _shared_instance(name: str, factory: Callable):
+    """Create pipeline objects (and their models) once per service."""
+    with _shared_lock:
+        if name not in _shared:
+            _shared[name] = factory()
+        return _shared[name]
+
+
+def _run_local(params: Dict, job: Job) -> Dict:
+    from video_transcriber import VideoTranscriber
+
+    job.report('loading model')
+    transcriber = _shared_instance('transcriber', VideoTranscriber)
+    return {'transcript_file': transcriber.process_video(params['path'], progress=job.report)}
+
+
+def _analyze_key(params: Dict) -> str:
+    if not params.get('video_id'):
+        raise ValueError("'video_id' is required")
+    return params['video_id']
+
+
+def _run_analyze(params: Dict, job: Job) -> Dict:
+    from youtube_content_analyzer import create_analyzer_from_env
+
+    job.report('analyzing')
+    analyzer = _shared_instance('analyzer', create_analyzer_from_env)
+    analysis = analyzer.analyze_video(params['video_id'], output_dir=params.get('output_dir', 'output'))
+    return {'video_id': analysis.video_id, 'points': len(analysis.points),
+            'raw_output_path': analysis.raw_output_path, 'summary_path': analysis.summary_path}
+
+
+def default_pipelines() -> Dict[str, Pipeline]:
+    return {
+        'youtube': Pipeline(_youtube_key, _run_youtube),
+        'local': Pipeline(_local_key, _run_local),
+        'analyze': Pipeline(_analyze_key, _run_analyze),
+    }
+
+
+def job_to_dict(job: Job) -> Dict:
+    return {
+        'id': job.id, 'label': job.label, 'status': job.status, 'stage': job.stage,
+        'progress': job.progress, 'detail': job.detail, 'result': job.result, 'error': job.error,
+        'created_at': job.created_at, 'started_at': job.started_at, 'finished_at': job.finished_at,
+    }
+
+
+class TranscriptionService:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, workers: int = 2, max_pending: int = 8,
+                 pipelines: Optional[Dict[str, Pipeline]] = None, keep_finished_s: float = 3600,
+                 retry_after_s: int = 5):
+        self.pipelines = pipelines if pipelines is not None else default_pipelines()
+        self.jobs = JobQueue(max_workers=workers, max_pending=max_pending)
+        self.workers = workers
+        self.keep_finished_s = keep_finished_s
+        self.retry_after_s = retry_after_s
+        self._inflight: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "TranscriptionService":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self, wait: bool = False):
+        self._server.shutdown()
+        self._server.server_close()
+        self.jobs.shutdown(wait=wait)
+
+    def submit(self, kind: str, params: Dict) -> Tuple[Job, bool]:
+        """Start (or join) the job for a request; returns ``(job, coalesced)``.
+
+        Raises ValueError for unknown kinds or bad parameters and
+        ``QueueFull`` when ``max_pending`` jobs are already queued or running.
+        """
+        pipeline = self.pipelines.get(kind)
+        if pipeline is None:
+            raise ValueError(f"unknown kind {kind!r}; choose from {', '.join(sorted(self.pipelines))}")
+        key = f"{kind}:{pipeline.key(params)}"
+        metrics = get_metrics()
+        with self._lock:
+            existing = self._inflight.get(key)
+            # A cancelled job stays queued/running until its next progress report; don't join it
+            if existing is not None and existing.status in ACTIVE and not existing.cancelled:
+                metrics.inc('service_requests_total', kind=kind, outcome='coalesced')
+                return existing, True
+            for stale_key in [k for k, job in self._inflight.items() if job.status not in ACTIVE or job.cancelled]:
+                del self._inflight[stale_key]
+            self.jobs.prune(self.keep_finished_s)
+            try:
+                job = self.jobs.submit(key, pipeline.run, params)
+            except QueueFull:
+                metrics.inc('service_requests_total', kind=kind, outcome='rejected')
+                raise
+            self._inflight[key] = job
+        metrics.inc('service_requests_total', kind=kind, outcome='accepted')
+        return job, False
+
+    def wait(self, job: Job, timeout: float) -> Job:
+        """Block until the job leaves the queued/running states or ``timeout`` passes."""
+        deadline = time.monotonic() + min(timeout, MAX_WAIT_S)
+        while job.status in ACTIVE and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return job
+
+    def _handler_class(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logger.debug("%s %s", self.address_string(), format % args)
+
+            def _send(self, status, payload, headers=None, content_type='application/json'):
+                data = payload.encode('utf-8') if isinstance(payload, str) else json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _job(self, path):
+                parts = path.strip('/').split('/')
+                if len(parts) != 2 or parts[0] != 'jobs' or not parts[1].isdigit():
+                    return None
+                return service.jobs.get(int(parts[1]))
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                path = url.path.rstrip('/')
+                if path == '/healthz':
+                    self._send(200, {'status': 'ok', 'pending': service.jobs.pending(),
+                                     'max_pending': service.jobs.max_pending, 'workers': service.workers})
+                elif path == '/metrics':
+                    self._send(200, get_metrics().render(), content_type='text/plain; version=0.0.4')
+                elif path == '/jobs':
+                    self._send(200, {'jobs': [job_to_dict(job) for job in service.jobs.jobs()]})
+                else:
+                    job = self._job(path)
+                    if job is None:
+                        self._send(404, {'error': 'not found'})
+                        return
+                    wait = parse_qs(url.query).get('wait')
+                    if wait:
+                        try:
+                            service.wait(job, float(wait[0]))
+                        except ValueError:
+                            self._send(400, {'error': "'wait' must be a number of seconds"})
+                            return
+                    self._send(200, {'job': job_to_dict(job)})
+
+            def do_POST(self):
+                if urlparse(self.path).path.rstrip('/') != '/jobs':
+                    self._send(404, {'error': 'not found'})
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                    params = json.loads(self.rfile.read(length) or b'{}')
+                    if not isinstance(params, dict):
+                        raise ValueError("request body must be a JSON object")
+                    job, coalesced = service.submit(params.get('kind', 'youtube'), params)
+                except QueueFull as e:
+                    self._send(429, {'error': str(e)}, {'Retry-After': str(service.retry_after_s)})
+                    return
+                except ValueError as e:
+                    self._send(400, {'error': str(e)})
+                    return
+                self._send(202, {'job': job_to_dict(job), 'coalesced': coalesced},
+                           {'Location': f"/jobs/{job.id}"})
+
+            def do_DELETE(self):
+                job = self._job(urlparse(self.path).path)
+                if job is None:
+                    self._send(404, {'error': 'not found'})
+                    return
+                cancelled = service.jobs.cancel(job.id)
+                self._send(202 if cancelled else 409, {'job': job_to_dict(job), 'cancelled': cancelled})
+
+        return Handler
+
+
+def warm_models():
+    """Load the configured Whisper model into the shared registry before the first request."""
+    from inference_backends import InferenceConfig, set_threads
+    from model_registry import warm_up
+
+    config = InferenceConfig.from_env()
+    set_threads(config.threads)
+    warm_up([(config.model_size, config.device, config.precision)])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the local transcription HTTP service.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2, help="Jobs processed at once")
+    parser.add_argument('--max-pending', type=int, default=8,
+                        help="Queued plus running jobs before new requests get 429")
+    parser.add_argument('--warm', action='store_true', help="Load the Whisper model at start-up")
+    parser.add_argument('--caption-fixture', help="Serve captions from this fixture file (offline runs)")
+    args = parser.parse_args()
+
+    configure_logging()
+    if args.caption_fixture:
+        from caption_provider import CaptionProvider, FixtureCaptionSource, set_default_caption_provider
+
+        set_default_caption_provider(CaptionProvider(FixtureCaptionSource(args.caption_fixture)))
+    if args.warm:
+        warm_models()
+    service = TranscriptionService(args.host, args.port, workers=args.workers, max_pending=args.max_pending)
+    logger.info("Transcription service listening on %s", service.base_url)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        service.stop()
@@ -0,0 +1,174 @@
+"""Energy/spectral voice activity detection over decoded 16 kHz PCM.
+
+Frames of ``FRAME_MS`` are classed as speech when they are loud enough
+relative to the recording's noise floor, carry most of their energy in the
+speech band and are not noise-like (low spectral flatness). Everything is
+computed with NumPy over blocks of frames. The speech regions are packed
+into one shorter array for Whisper, and a ``TimeMap`` converts timestamps
+on the packed timeline back to the original one.
+"""
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+SPEECH_BAND_HZ = (300, 3400)
+# Frames per FFT block; bounds memory on multi-hour inputs
+BLOCK_FRAMES = 8192
+# Silence inserted between packed regions so words at the seams stay apart
+JOIN_GAP_S = 0.3
+
+
+@dataclass(frozen=True)
+class VadSettings:
+    energy_margin_db: float
+    energy_ceiling_db: float
+    min_band_ratio: float
+    max_flatness: float
+    min_silence_ms: int
+    min_speech_ms: int
+    pad_ms: int
+
+
+# Aggressiveness 0 keeps almost anything above the noise floor; 3 cuts music and noise hardest
+AGGRESSIVENESS = {
+    0: VadSettings(6.0, -35.0, 0.20, 0.65, 1500, 200, 400),
+    1: VadSettings(9.0, -32.0, 0.30, 0.55, 1000, 250, 300),
+    2: VadSettings(12.0, -30.0, 0.40, 0.45, 700, 250, 200),
+    3: VadSettings(15.0, -28.0, 0.50, 0.35, 400, 300, 150),
+}
+
+
+def default_aggressiveness() -> Optional[int]:
+    """Aggressiveness from ``VAD_AGGRESSIVENESS`` (0-3, default 1); None when set to ``off``."""
+    value = os.getenv('VAD_AGGRESSIVENESS', '1').strip().lower()
+    if value in ('off', 'none', 'false', ''):
+        return None
+    if value not in {str(level) for level in AGGRESSIVENESS}:
+        raise ValueError(f"VAD_AGGRESSIVENESS must be 0-3 or 'off', not {value!r}")
+    return int(value)
+
+
+def frame_features(samples: np.ndarray, sample_rate: int = SAMPLE_RATE,
+                   frame_ms: int = FRAME_MS) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return per-frame energy (dBFS), speech-band energy ratio and spectral flatness."""
+    frame_len = sample_rate * frame_ms // 1000
+    n_frames = len(samples) // frame_len
+    frames = np.asarray(samples[:n_frames * frame_len], dtype=np.float32).reshape(n_frames, frame_len)
+
+    energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    band_ratio = np.empty(n_frames, dtype=np.float32)
+    flatness = np.empty(n_frames, dtype=np.float32)
+
+    window = np.hanning(frame_len).astype(np.float32)
+    freqs = np.fft.rfftfreq(frame_len, 1.0 / sample_rate)
+    band = (freqs >= SPEECH_BAND_HZ[0]) & (freqs <= SPEECH_BAND_HZ[1])
+    for start in range(0, n_frames, BLOCK_FRAMES):
+        block = frames[start:start + BLOCK_FRAMES] * window
+        power = np.abs(np.fft.rfft(block, axis=1)) ** 2 + 1e-12
+        total = power.sum(axis=1)
+        band_ratio[start:start + len(block)] = power[:, band].sum(axis=1) / total
+        flatness[start:start + len(block)] = np.exp(np.mean(np.log(power), axis=1)) / (total / power.shape[1])
+    return energy_db, band_ratio, flatness
+
+
+def _runs(mask: np.ndarray) -> np.ndarray:
+    """Return ``(start, end)`` frame index pairs of the True runs in ``mask``."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.column_stack((np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def detect_speech(samples: np.ndarray, aggressiveness: int = 1,
+                  sample_rate: int = SAMPLE_RATE) -> List[Tuple[int, int]]:
+    """Return speech regions of ``samples`` as ``(start_sample, end_sample)`` pairs."""
+    settings = AGGRESSIVENESS[aggressiveness]
+    frame_len = sample_rate * FRAME_MS // 1000
+    if len(samples) < frame_len:
+        return [(0, len(samples))] if len(samples) else []
+
+    energy_db, band_ratio, flatness = frame_features(samples, sample_rate)
+    noise_floor = np.percentile(energy_db, 10)
+    # The ceiling keeps recordings that are speech almost throughout from raising the floor past the speech
+    threshold = min(noise_floor + settings.energy_margin_db, settings.energy_ceiling_db)
+    speech = (energy_db > threshold) & (band_ratio > settings.min_band_ratio) & (flatness < settings.max_flatness)
+
+    # Fill short pauses, then drop blips too short to be words
+    min_gap = settings.min_silence_ms // FRAME_MS
+    for start, end in _runs(~speech):
+        if end - start < min_gap and start > 0 and end < len(speech):
+            speech[start:end] = True
+    min_run = settings.min_speech_ms // FRAME_MS
+    pad = settings.pad_ms * sample_rate // 1000
+
+    regions = []
+    for start, end in _runs(speech):
+        if end - start < min_run:
+            continue
+        start_sample = max(0, int(start) * frame_len - pad)
+        end_sample = min(len(samples), int(end) * frame_len + pad)
+        if regions and start_sample <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end_sample)
+        else:
+            regions.append((start_sample, end_sample))
+    return regions
+
+
+class TimeMap:
+    """Maps times on the packed (speech-only) timeline back to the original audio."""
+
+    def __init__(self, regions: List[Tuple[int, int]], gap_s: float = JOIN_GAP_S,
+                 sample_rate: int = SAMPLE_RATE):
+        lengths = np.array([(end - start) / sample_rate for start, end in regions])
+        self.original_starts = np.array([start / sample_rate for start, _ in regions])
+        self.packed_starts = np.concatenate(([0.0], np.cumsum(lengths + gap_s)[:-1])) if regions else np.zeros(0)
+        self.lengths = lengths
+
+    def __call__(self, t):
+        """Original time of packed time ``t`` (scalar or array); gap times snap to the region end."""
+        if not len(self.packed_starts):
+            return t
+        index = np.clip(np.searchsorted(self.packed_starts, t, side='right') - 1, 0, len(self.packed_starts) - 1)
+        offset = np.minimum(np.maximum(np.asarray(t) - self.packed_starts[index], 0.0), self.lengths[index])
+        mapped = self.original_starts[index] + offset
+        return float(mapped) if np.ndim(mapped) == 0 else mapped
+
+
+def pack_speech(samples: np.ndarray, regions: List[Tuple[int, int]], gap_s: float = JOIN_GAP_S,
+                sample_rate: int = SAMPLE_RATE) -> Tuple[np.ndarray, TimeMap]:
+    """Concatenate the speech regions (with short silences between them)."""
+    gap = np.zeros(int(gap_s * sample_rate), dtype=np.float32)
+    parts = []
+    for start, end in regions:
+        if parts:
+            parts.append(gap)
+        parts.append(samples[start:end])
+    packed = np.concatenate(parts).astype(np.float32, copy=False) if parts else np.zeros(0, dtype=np.float32)
+    return packed, TimeMap(regions, gap_s, sample_rate)
+
+
+def remap_result(result: Dict, time_map: TimeMap) -> Dict:
+    """Rewrite a Whisper result's segment (and word) timestamps onto the original timeline."""
+    segments = []
+    for seg in result['segments']:
+        seg = dict(seg, start=time_map(seg['start']), end=time_map(seg['end']))
+        if 'seek' in seg:
+            seg['seek'] = int(time_map(seg['seek'] / 100) * 100)
+        if 'words' in seg:
+            seg['words'] = [dict(w, start=time_map(w['start']), end=time_map(w['end'])) for w in seg['words']]
+        segments.append(seg)
+    return dict(result, segments=segments)
+
+
+def vad_report(regions: List[Tuple[int, int]], total_samples: int, sample_rate: int = SAMPLE_RATE) -> Dict:
+    total_s = total_samples / sample_rate
+    speech_s = sum(end - start for start, end in regions) / sample_rate
+    return {
+        'total_s': round(total_s, 2),
+        'speech_s': round(speech_s, 2),
+        'skipped_s': round(total_s - speech_s, 2),
+        'skipped_fraction': round(1 - speech_s / total_s, 4) if total_s else 0.0,
+        'regions': len(regions),
+    }
@@ -1,19 +1,45 @@
+import logging
 import os
-from moviepy.editor import VideoFileClip
-import whisper
 from datetime import datetime
+from model_registry import get_model
+from media_cache import get_default_cache, file_key
+from audio_stream import load_pcm, read_wav
+from audio_fingerprint import get_default_fingerprint_store, transcribe_with_reuse
+from transcript_model import Transcript
+from transcript_index import index_transcript
+from vad import default_aggressiveness
+from inference_backends import InferenceConfig
+from instrumentation import stage, trace
+
+logger = logging.getLogger(__name__)
 
 class VideoTranscriber:
-    def __init__(self):
-        # Initialize the Whisper model (using the base model for faster processing)
-        self.model = whisper.load_model("base")
+    def __init__(self, model_size=None, device=None, cache=None, vad_aggressiveness="env",
+                 backend=None, threads=None, fingerprints="env"):
+        # Model size, backend and threads default to the WHISPER_* settings (base model on CPU)
+        self.config = InferenceConfig.from_env(model_size=model_size, device=device, backend=backend,
+                                               threads=threads)
+        self.model_size = self.config.model_size
+        self.device = self.config.device
+        # Silence/music skipping before Whisper (0-3, None disables; defaults to VAD_AGGRESSIVENESS)
+        self.vad_aggressiveness = default_aggressiveness() if vad_aggressiveness == "env" else vad_aggressiveness
+        self.cache = cache or get_default_cache()
+        # Earlier transcripts of overlapping audio (None disables reuse; defaults to FINGERPRINT_DB)
+        self.fingerprints = get_default_fingerprint_store() if fingerprints == "env" else fingerprints
+
+    @property
+    def model(self):
+        # Loaded on first use and shared through the registry
+        return get_model(self.model_size, device=self.device, precision=self.config.precision)
         
-    def create_output_directory(self, video_name):
+    def create_output_directory(self, video_name, base_dir=None):
         """
-        Create a timestamped directory for outputs
+        Create a timestamped directory for outputs (under base_dir if given)
         """
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         dir_name = f"{video_name}_{timestamp}"
+        if base_dir:
+            dir_name = os.path.join(base_dir, dir_name)
         os.makedirs(dir_name, exist_ok=True)
         return dir_name
         
@@ -27,6 +53,8 @@ class VideoTranscriber:
             # Create output path for MP3
             output_path = os.path.join(output_dir, f"{filename}.mp3")
             
+            from moviepy.editor import VideoFileClip
+
             # Load the video file
             video = VideoFileClip(video_path)
             # Extract the audio
@@ -40,17 +68,31 @@ class VideoTranscriber:
         except Exception as e:
             raise Exception(f"Error converting video to audio: {str(e)}")
 
-    def transcribe_audio(self, audio_path, output_dir):
+    def transcribe_audio(self, audio_path, output_dir, base_name=None):
         """
         Transcribe an audio file using Whisper and save as markdown
         """
+        from audio_chunking import transcribe_chunked
+
         try:
-            # Transcribe the audio file
-            result = self.model.transcribe(audio_path)
+            # Transcribe the audio file (long files are chunked across processes)
+            result = transcribe_chunked(audio_path, model_size=self.model_size, device=self.device,
+                                        precision=self.config.precision, threads=self.config.threads,
+                                        vad_aggressiveness=self.vad_aggressiveness)
             
             # Get the base filename
-            base_name = os.path.splitext(os.path.basename(audio_path))[0]
-            
+            base_name = base_name or os.path.splitext(os.path.basename(audio_path))[0]
+            return self.save_transcript(result, base_name, output_dir)
+        except Exception as e:
+            raise Exception(f"Error transcribing audio: {str(e)}")
+
+    def save_transcript(self, result, base_name, output_dir, key=None):
+        """
+        Save a Whisper result as a markdown transcript and add it to the search index
+
+        ``key`` (the media file's content key) lets a re-run replace the indexed copy.
+        """
+        try:
             # Create output paths for different formats
             transcript_path = os.path.join(output_dir, f"{base_name}_transcript.md")
             
@@ -59,51 +101,117 @@ class VideoTranscriber:
             markdown_content += f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
             markdown_content += "## Content\n\n"
             
-            # Add segments with timestamps if available
-            if 'segments' in result:
-                for segment in result['segments']:
-                    start_time = str(datetime.utcfromtimestamp(segment['start']).strftime('%H:%M:%S'))
-                    markdown_content += f"[{start_time}] {segment['text']}\n\n"
-            else:
-                markdown_content += result["text"]
-            
-            # Save the markdown transcript
-            with open(transcript_path, "w", encoding="utf-8") as f:
-                f.write(markdown_content)
+            # Save the markdown transcript, with timestamps when segments are available
+            transcript = Transcript.from_whisper(result)
+            json_path = os.path.join(output_dir, f"{base_name}_transcript.json")
+            with stage('write') as span:
+                with open(transcript_path, "w", encoding="utf-8") as f:
+                    f.write(markdown_content)
+                    transcript.write_markdown(f)
+                transcript.save(json_path)
+                span['bytes'] = os.path.getsize(transcript_path) + os.path.getsize(json_path)
+            index_transcript(transcript_path, transcript, 'local', title=base_name, key=key)
             
             return transcript_path
         except Exception as e:
-            raise Exception(f"Error transcribing audio: {str(e)}")
+            raise Exception(f"Error saving transcript: {str(e)}")
 
-    def process_video(self, video_path):
+    def process_video(self, video_path, progress=None):
         """
         Process a video file: convert to audio and transcribe
+
+        progress(stage, fraction, detail) is called as decoding and
+        transcription advance.
         """
         try:
             # Get video filename without extension
             video_name = os.path.splitext(os.path.basename(video_path))[0]
-            
-            # Create output directory
-            output_dir = self.create_output_directory(video_name)
-            
-            # Convert video to audio
-            print("Converting video to audio...")
-            audio_path = self.convert_mp4_to_mp3(video_path, output_dir)
-            
-            # Transcribe the audio
-            print("Transcribing audio...")
-            transcript_path = self.transcribe_audio(audio_path, output_dir)
-            
-            # Clean up the temporary audio file
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
-            
-            return transcript_path
+            with trace(video_name):
+                return self._process_video(video_path, video_name, progress)
         except Exception as e:
             raise Exception(f"Error processing video: {str(e)}")
 
+    def _process_video(self, video_path, video_name, progress):
+        """Body of ``process_video``, run inside the video's trace"""
+        # Create output directory
+        output_dir = self.create_output_directory(video_name)
+        
+        # Reuse earlier results for identical file contents
+        key = file_key(video_path)
+        result = self.cache.get_transcript(key, self.config.cache_tag)
+        if result is not None:
+            logger.info("Using cached transcript...")
+            return self.save_transcript(result, video_name, output_dir, key)
+        
+        samples = self.decode_audio(video_path, key, progress)
+        logger.info("Transcribing audio...")
+        result = self.transcribe_samples(samples, key, progress)
+        
+        return self.save_transcript(result, video_name, output_dir, key)
+
+    def decode_audio(self, video_path, key, progress=None, threads=0):
+        """
+        Return the 16 kHz samples of a file's audio track, from the cache when possible
+
+        Newly decoded audio is added to the cache under ``key``; ``threads``
+        is passed to ffmpeg.
+        """
+        audio_path = self.cache.audio_path(key)
+        if audio_path is not None:
+            return read_wav(audio_path)
+        # Decode the video's audio track straight into memory
+        logger.info("Decoding audio of %s...", os.path.basename(video_path))
+        decode_progress = None
+        if progress:
+            decode_progress = lambda bytes_read, fraction: progress('decode', fraction)
+        with stage('decode') as span:
+            samples = load_pcm(video_path, progress=decode_progress, threads=threads)
+            span.update(bytes=os.path.getsize(video_path), audio_s=round(len(samples) / 16000, 2))
+        self.cache.store_audio_array(key, samples)
+        return samples
+
+    def plan_reuse(self, samples, key):
+        """
+        Fingerprint decoded samples and find the parts already transcribed in other recordings
+
+        Returns None when fingerprinting is disabled.
+        """
+        if self.fingerprints is None:
+            return None
+        return self.fingerprints.plan(samples, key, self.config.cache_tag)
+
+    def transcribe_samples(self, samples, key, progress=None, threads=None, plan=None):
+        """
+        Transcribe decoded samples and cache the result under ``key``
+
+        Parts of the audio that match earlier recordings reuse their segments
+        (``plan`` from ``plan_reuse``, computed here if not given); only the
+        rest goes through Whisper. ``threads`` overrides the configured
+        inference thread count.
+        """
+        from audio_chunking import transcribe_chunked
+
+        transcribe_progress = (lambda fraction: progress('transcribe', fraction)) if progress else None
+
+        def transcribe(audio):
+            with stage('inference', model=self.config.cache_tag, audio_s=round(len(audio) / 16000, 2)) as span:
+                result = transcribe_chunked(audio, model_size=self.model_size, device=self.device,
+                                            precision=self.config.precision, threads=threads or self.config.threads,
+                                            progress=transcribe_progress,
+                                            vad_aggressiveness=self.vad_aggressiveness)
+                if 'vad' in result:
+                    span['vad_skipped_s'] = result['vad']['skipped_s']
+            return result
+
+        result = transcribe_with_reuse(samples, transcribe, plan or self.plan_reuse(samples, key))
+        self.cache.put_transcript(key, self.config.cache_tag, result)
+        return result
+
 # Example usage:
 if __name__ == "__main__":
+    from instrumentation import configure_logging
+
+    configure_logging()
     transcriber = VideoTranscriber()
     # Replace with your video path
     video_path = "path/to/your/video.mp4"
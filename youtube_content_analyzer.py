@@ -1,10 +1,15 @@
+import logging
 from typing import Optional, List
 from dataclasses import dataclass
-from youtube_transcript_api import YouTubeTranscriptApi
+from caption_provider import get_default_caption_provider
+from transcript_model import Transcript
 from sinek_style_analyzer import create_analyzer, Point
+from instrumentation import configure_logging, stage, trace
 import os
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
 @dataclass
 class VideoAnalysis:
     video_id: str
@@ -26,18 +31,19 @@ class YouTubeContentAnalyzer:
             model=model
         )
 
-    def get_transcript(self, video_id: str) -> str:
-        """Retrieve and format YouTube video transcript."""
-        try:
-            transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
-            return " ".join([entry['text'] for entry in transcript_list])
-        except Exception as e:
-            raise ValueError(f"Failed to get transcript for video {video_id}: {str(e)}")
+    def get_transcript(self, video_id: str) -> Transcript:
+        """Retrieve the YouTube video's captions as a timestamped transcript."""
+        with stage('captions') as span:
+            captions = get_default_caption_provider().fetch(video_id)
+            span['hit'] = captions is not None
+        if captions is None:
+            raise ValueError(f"Failed to get transcript for video {video_id}: no usable captions")
+        return captions.transcript
 
     def analyze_video(
         self, 
         video_id: str, 
-        chunk_size: int = 1000,
+        chunk_size: Optional[int] = None,
         save_output: bool = True,
         output_dir: str = "output"
     ) -> VideoAnalysis:
@@ -45,45 +51,52 @@ class YouTubeContentAnalyzer:
         
         Args:
             video_id: YouTube video ID
-            chunk_size: Size of text chunks for processing
+            chunk_size: Token budget per analysis request (default: sized to the model)
             save_output: Whether to save output to files
             output_dir: Directory to save output files
         
         Returns:
             VideoAnalysis object containing results
         """
-        # Get transcript
-        transcript = self.get_transcript(video_id)
+        with trace(video_id):
+            # Get transcript
+            timed = self.get_transcript(video_id)
+            transcript = timed.text
         
-        # Process transcript to get points
-        points = self.analyzer.process_transcript(transcript, chunk_size)
+            # Process transcript to get points, chunked on caption segment boundaries
+            plan = self.analyzer.plan_transcript(transcript, chunk_size, segments=timed)
+            logger.info("Analyzing %d tokens in %d requests (~%d prompt tokens)",
+                        plan.transcript_tokens, plan.calls, plan.estimated_prompt_tokens)
+            with stage('analysis_points', calls=plan.calls):
+                points = self.analyzer.process_transcript(transcript, chunk_size, segments=timed)
         
-        # Generate detailed content
-        points = self.analyzer.generate_detailed_content(points)
+            # Generate detailed content
+            with stage('analysis_details', calls=len(points)):
+                points = self.analyzer.generate_detailed_content(points)
         
-        # Create analysis object
-        analysis = VideoAnalysis(
-            video_id=video_id,
-            transcript=transcript,
-            points=points
-        )
+            # Create analysis object
+            analysis = VideoAnalysis(
+                video_id=video_id,
+                transcript=transcript,
+                points=points
+            )
         
-        # Save output if requested
-        if save_output:
-            os.makedirs(output_dir, exist_ok=True)
+            # Save output if requested
+            if save_output:
+                os.makedirs(output_dir, exist_ok=True)
             
-            # Save raw transcript
-            raw_path = os.path.join(output_dir, f"{video_id}_transcript.txt")
-            with open(raw_path, "w", encoding='utf-8') as f:
-                f.write(transcript)
-            analysis.raw_output_path = raw_path
+                # Save raw transcript
+                raw_path = os.path.join(output_dir, f"{video_id}_transcript.txt")
+                with open(raw_path, "w", encoding='utf-8') as f:
+                    f.write(transcript)
+                analysis.raw_output_path = raw_path
             
-            # Save analyzed content
-            summary_path = os.path.join(output_dir, f"{video_id}_analysis.md")
-            self.analyzer.save_to_file(points, summary_path)
-            analysis.summary_path = summary_path
+                # Save analyzed content
+                summary_path = os.path.join(output_dir, f"{video_id}_analysis.md")
+                self.analyzer.save_to_file(points, summary_path)
+                analysis.summary_path = summary_path
             
-        return analysis
+            return analysis
 
 def create_analyzer_from_env() -> YouTubeContentAnalyzer:
     """Create analyzer using environment variables."""
@@ -95,6 +108,7 @@ def create_analyzer_from_env() -> YouTubeContentAnalyzer:
 
 # Example usage
 if __name__ == "__main__":
+    configure_logging()
     # Create analyzer from environment variables
     analyzer = create_analyzer_from_env()
     
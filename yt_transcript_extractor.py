@@ -1,59 +1,99 @@
+import asyncio
+import logging
 import os
 from dotenv import load_dotenv
-from pytube import YouTube
-import speech_recognition as sr
-from pydub import AudioSegment
-from openai import OpenAI
-import yt_dlp
-import whisper
+from processed_store import get_default_store
+from media_cache import get_default_cache, youtube_key
+from llm_cache import get_default_llm_cache
+from caption_provider import get_default_caption_provider
+from transcript_model import Transcript
+from transcript_index import index_transcript
+from vad import default_aggressiveness
+from inference_backends import InferenceConfig
+from instrumentation import stage, trace
+from download_manager import extract_video_id, get_default_download_manager
 from datetime import datetime
 import subprocess
 
+# yt_dlp, openai and Whisper (torch) are imported inside the functions that
+# use them so the UIs and caption-only runs start quickly. Video IDs are
+# parsed locally (``extract_video_id``), without pytube.
+
 # Load environment variables from .env file
 load_dotenv()
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+logger = logging.getLogger(__name__)
+_client = None
 
-# TODO: Implement audio chunking to decrease the number of tokens in each request
-def extract_captions(youtube_link):
-    try:
-        print(f"Processing YouTube link: {youtube_link}")  # Debugging statement
-        # Create YouTube object
-        yt = YouTube(youtube_link)
-
-        # Check for available captions
-        if yt.captions:
-            print(f"Available captions: {[caption.code for caption in yt.captions]}")  # Log available captions
-            caption = yt.captions.get_by_language_code('en')
-            if caption:
-                return caption.generate_srt_captions()
-            else:
-                print("No English captions available.")
-                return None
-        else:
-            print("No captions available for this video.")
-            return None
-        
-    except Exception as e:
-        return f"Error extracting captions: {str(e)}"
+def get_client():
+    """Return the shared OpenAI client, creating it on first use"""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    return _client
+
+def fetch_caption_transcript(youtube_link, provider=None):
+    """Return the video's captions as a Transcript, or None when Whisper is needed.
+
+    Manual, auto-generated and translated tracks are tried in the order of
+    the provider's language preferences (``CAPTION_LANGUAGES``).
+    """
+    logger.info("Processing YouTube link: %s", youtube_link)
+    provider = provider or get_default_caption_provider()
+    with stage('captions') as span:
+        captions = provider.fetch(extract_video_id(youtube_link))
+        span['hit'] = captions is not None
+        if captions is not None:
+            span.update(kind=captions.kind, language=captions.language_code, segments=len(captions.segments))
+    if captions is None:
+        logger.info("No usable captions available for this video.")
+        return None
+    logger.info("Using %s captions (%s)", captions.kind, captions.language_code)
+    return captions.transcript
+
+def extract_captions(youtube_link, provider=None):
+    """Return the video's captions as SRT text, or None"""
+    transcript = fetch_caption_transcript(youtube_link, provider)
+    return transcript.export('srt') if transcript is not None else None
 
 def audio_to_text(audio_file):
+    from audio_chunking import transcribe_chunked
+
     try:
-        model = whisper.load_model("base")  # You can choose a different model size if needed
-        result = model.transcribe(audio_file)
+        # Long audio is split at silences and transcribed in parallel
+        config = InferenceConfig.from_env()
+        result = transcribe_chunked(audio_file, model_size=config.model_size, device=config.device,
+                                    precision=config.precision, threads=config.threads,
+                                    vad_aggressiveness=default_aggressiveness())
         return result['text']
     except Exception as e:
         return f"Error converting audio to text: {str(e)}"
 
-def summarize_text(full_text):
+def summarize_text(full_text, segments=None, progress=None):
+    from openai import AsyncOpenAI
+    from map_reduce_summarizer import MapReduceSummarizer
+
     try:
-        print(f"Summarizing text: {full_text[:50]}...")  # Debugging statement
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "user", "content": f"Please summarize the following text:\n\n{full_text}"}
-            ]
-        )
-        return response.choices[0].message.content
+        logger.debug("Summarizing text: %s...", full_text[:50])
+        chunk_progress = None
+        if progress:
+            chunk_progress = lambda done, total: progress('summarize', done / total, f"{done}/{total} chunks")
+
+        async def run():
+            # The client's connections are closed before the event loop goes away
+            async with AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'), max_retries=0) as client:
+                # Long transcripts are summarized in concurrent chunks and then combined
+                summarizer = MapReduceSummarizer(client=client, model="gpt-3.5-turbo",
+                                                 cache=get_default_llm_cache())
+                summary = await summarizer.asummarize(full_text, segments, chunk_progress)
+                return summary, summarizer.report()
+
+        with stage('summarize') as span:
+            summary, report = asyncio.run(run())
+            span.update(calls=report['calls'], retries=report['retries'], tokens=report['total_tokens'],
+                        cache_hits=report['cache_hits'])
+        logger.info("Summary usage: %s", report)
+        return summary
     except Exception as e:
         return f"Error summarizing text: {str(e)}"
 
@@ -64,32 +104,36 @@ def create_markdown_files(video_id, full_text, summary):
     # Use video ID for file naming
     safe_id = "".join(c for c in video_id if c.isalnum() or c in ("_", "-")).rstrip()
 
-    # Save full text file in output folder
-    full_text_path = os.path.join(output_folder, f'{safe_id}_full_text.md')
-    with open(full_text_path, 'w', encoding='utf-8') as f:
-        f.write(full_text)
+    with stage('write') as span:
+        # Save full text file in output folder
+        full_text_path = os.path.join(output_folder, f'{safe_id}_full_text.md')
+        with open(full_text_path, 'w', encoding='utf-8') as f:
+            f.write(full_text)
 
-    # Save summary file in output folder 
-    summary_path = os.path.join(output_folder, f'{safe_id}_summary.md')
-    with open(summary_path, 'w', encoding='utf-8') as f:
-        f.write(summary)
+        # Save summary file in output folder 
+        summary_path = os.path.join(output_folder, f'{safe_id}_summary.md')
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write(summary)
+        span['bytes'] = os.path.getsize(full_text_path) + os.path.getsize(summary_path)
+    index_transcript(full_text_path, full_text, 'full_text', video_id=video_id)
+
+    get_default_store().update_status(
+        video_id, summary_done=True,
+        artifacts={'full_text': full_text_path, 'summary': summary_path}
+    )
 
 def check_video_processed(video_id):
-    processed_videos_file = 'processed_videos.txt'
-    if os.path.exists(processed_videos_file):
-        with open(processed_videos_file, 'r', encoding='utf-8') as f:
-            processed_videos = f.read().splitlines()
-            return video_id in processed_videos
-    return False
+    return get_default_store().is_processed(video_id)
 
 def mark_video_processed(video_id):
-    with open('processed_videos.txt', 'a', encoding='utf-8') as f:
-        f.write(video_id + '\n')
+    get_default_store().mark_processed(video_id)
 
-def create_output_folder(video_id):
+def create_output_folder(video_id, base_dir=None):
     """Create a dated output folder for a video"""
     today_date = datetime.now().date().isoformat()
     folder_name = f"{video_id}_{today_date}"
+    if base_dir:
+        folder_name = os.path.join(base_dir, folder_name)
     os.makedirs(folder_name, exist_ok=True)
     return folder_name
 
@@ -98,27 +142,114 @@ def check_audio_exists(temp_audio_path):
     wav_path = f"{temp_audio_path}"
     return os.path.exists(wav_path)
 
-def download_audio(youtube_link, temp_audio_path):
-    """Download audio from YouTube link"""
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'outtmpl': temp_audio_path,
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'wav',
-            'preferredquality': '192',
-        }],
-        'keepvideo': True,
-    }
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([youtube_link])
+def download_audio(youtube_link, temp_audio_path, downloader=None):
+    """Download audio from YouTube link as 16 kHz mono WAV (what Whisper consumes)
+
+    Only the smallest adequate audio-only stream is fetched (see ``download_manager``).
+    """
+    from audio_stream import write_wav
+
+    samples, _ = (downloader or get_default_download_manager()).fetch_samples(youtube_link)
+    write_wav(temp_audio_path, samples)
+
+def _download_progress(progress):
+    """Adapt a pipeline progress callback to load_pcm's (bytes_read, fraction) reports"""
+    if not progress:
+        return None
+    return lambda bytes_read, fraction: progress('download', fraction, f"{bytes_read / 1024 ** 2:.1f} MB")
+
+def _download_samples(youtube_link, video_id, span, downloader=None, progress=None):
+    """Fetch and decode a video's audio through the download manager, recording throughput"""
+    downloader = downloader or get_default_download_manager()
+    samples, download = downloader.fetch_samples(youtube_link, video_id, progress=_download_progress(progress))
+    span.update(bytes=download.bytes - download.resumed_from, resumed_from=download.resumed_from,
+                throughput_bps=round(download.throughput_bps), format_id=download.format_id,
+                audio_s=round(len(samples) / 16000, 2))
+    return samples
+
+def get_youtube_samples(youtube_link, cache=None, video_id=None, progress=None, downloader=None):
+    """Return a video's audio as 16 kHz float32 samples, downloading it on a cache miss"""
+    from audio_stream import read_wav
+
+    cache = cache or get_default_cache()
+    video_id = video_id or extract_video_id(youtube_link)
+    key = youtube_key(video_id)
+    with stage('download') as span:
+        audio_path = cache.audio_path(key)
+        span['cached'] = audio_path is not None
+        if audio_path is not None:
+            return read_wav(audio_path)
+        samples = _download_samples(youtube_link, video_id, span, downloader, progress)
+        cache.store_audio_array(key, samples)
+        return samples
+
+def get_youtube_audio(youtube_link, cache=None, video_id=None, downloader=None):
+    """Return the path of the cached audio for a video, downloading it on a cache miss"""
+    cache = cache or get_default_cache()
+    video_id = video_id or extract_video_id(youtube_link)
+    key = youtube_key(video_id)
+    with stage('download') as span:
+        audio_path = cache.audio_path(key)
+        span['cached'] = audio_path is not None
+        if audio_path is None:
+            audio_path = cache.store_audio_array(key, _download_samples(youtube_link, video_id, span, downloader))
+        return audio_path
+
+def cached_transcription(youtube_link, model_size=None, cache=None, video_id=None, progress=None, config=None):
+    """Return the Whisper result for a video, reusing cached audio and transcripts
+
+    The model size and backend come from ``config`` (default: ``InferenceConfig.from_env``).
+    Audio that matches earlier videos (re-uploads, clips; see ``audio_fingerprint``)
+    reuses their segments, and only the rest is transcribed.
+    """
+    from audio_chunking import transcribe_chunked
+    from audio_fingerprint import get_default_fingerprint_store, transcribe_with_reuse
+
+    config = config or InferenceConfig.from_env(model_size=model_size)
+    cache = cache or get_default_cache()
+    video_id = video_id or extract_video_id(youtube_link)
+    key = youtube_key(video_id)
+    result = cache.get_transcript(key, config.cache_tag)
+    if result is None:
+        samples = get_youtube_samples(youtube_link, cache=cache, video_id=video_id, progress=progress)
+        transcribe_progress = (lambda fraction: progress('transcribe', fraction)) if progress else None
+
+        def transcribe(audio):
+            with stage('inference', model=config.cache_tag, audio_s=round(len(audio) / 16000, 2)) as span:
+                result = transcribe_chunked(audio, model_size=config.model_size, device=config.device,
+                                            precision=config.precision, threads=config.threads,
+                                            progress=transcribe_progress,
+                                            vad_aggressiveness=default_aggressiveness())
+                if 'vad' in result:
+                    span['vad_skipped_s'] = result['vad']['skipped_s']
+            return result
+
+        fingerprints = get_default_fingerprint_store()
+        plan = fingerprints.plan(samples, key, config.cache_tag) if fingerprints is not None else None
+        result = transcribe_with_reuse(samples, transcribe, plan)
+        cache.put_transcript(key, config.cache_tag, result)
+    else:
+        logger.info("Using cached transcript...")
+    return result
 
 def save_transcript_file(output_folder, video_id, video, youtube_link, transcript, detected_lang=None):
-    """Save transcript to a formatted md file"""
+    """Save transcript to a formatted md file
+
+    A Transcript is written with timestamps, plus a JSON copy of its segments.
+    """
     output_file = os.path.join(output_folder, f'{video_id}_transcriptOnly.md')
-    print(f"Saving transcript to: {output_file}")
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(transcript)
+    logger.info("Saving transcript to: %s", output_file)
+    with stage('write') as span:
+        if isinstance(transcript, Transcript):
+            json_file = os.path.join(output_folder, f'{video_id}_transcript.json')
+            transcript.save(output_file, 'md')
+            transcript.save(json_file)
+            span['bytes'] = os.path.getsize(output_file) + os.path.getsize(json_file)
+        else:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(transcript)
+            span['bytes'] = os.path.getsize(output_file)
+    index_transcript(output_file, transcript, 'youtube', video_id=video_id)
     return output_file
 
 def check_ffmpeg_installed():
@@ -129,80 +260,79 @@ def check_ffmpeg_installed():
     except FileNotFoundError:
         return False
 
-def process_video_transcript(youtube_link, output_folder=None):
-    """Process video and return transcript. Core logic separated from UI."""
-    video = YouTube(youtube_link)
-    video_id = video.video_id
+def process_video_transcript(youtube_link, output_folder=None, progress=None):
+    """Process video and return transcript. Core logic separated from UI.
+
+    ``progress(stage, fraction, detail)`` is called as stages advance; it may
+    raise to abort the run (the UI uses this for cancellation). The run is
+    traced (see ``instrumentation.trace``), joining the caller's trace if any.
+    """
+    video_id = extract_video_id(youtube_link)
+    with trace(video_id):
+        return _process_video_transcript(youtube_link, video_id, output_folder, progress)
+
+def _process_video_transcript(youtube_link, video_id, output_folder, progress):
     detected_lang = None
     
     if not output_folder:
         output_folder = create_output_folder(video_id)
     
     # Try getting captions first
-    transcript = extract_captions(youtube_link)
+    if progress:
+        progress('captions', None)
+    transcript = fetch_caption_transcript(youtube_link)
     
     # If no captions available, use whisper
     if transcript is None:
-        print("No captions found. Converting audio to text with language detection...")
-        temp_audio_path = os.path.join(output_folder, 'temp_audio.wav')
-        
-        if check_audio_exists(temp_audio_path):
-            print("Using existing audio file...")
-        else:
-            print("Downloading audio file...")
-            download_audio(youtube_link, temp_audio_path)
-        
-        model = whisper.load_model("base", device="cpu")
-        result = model.transcribe(f"{temp_audio_path}", fp16=False)
-        transcript = result["text"]
-        detected_lang = result["language"]
-        print(f"Detected language: {detected_lang}")
+        logger.info("No captions found. Converting audio to text with language detection...")
+        result = cached_transcription(youtube_link, video_id=video_id, progress=progress)
+        transcript = Transcript.from_whisper(result)
+        detected_lang = transcript.language
+        logger.info("Detected language: %s", detected_lang)
     
     # Save and return transcript
     output_file = save_transcript_file(
         output_folder, 
         video_id, 
-        video, 
+        None, 
         youtube_link, 
         transcript, 
         detected_lang
     )
+    stage_flag = 'captions_done' if detected_lang is None else 'whisper_done'
+    get_default_store().update_status(video_id, artifacts={'transcript': output_file}, **{stage_flag: True})
     
     return {
-        'transcript': transcript,
+        'transcript': transcript.text,
+        'structured': transcript,
         'video_id': video_id,
         'output_file': output_file,
         'detected_lang': detected_lang
     }
 
 if __name__ == "__main__":
+    from instrumentation import configure_logging
+
+    configure_logging()
+
     youtube_link = input("Enter YouTube link: ")
-    yt = YouTube(youtube_link)
-    video_id = yt.video_id
-    video_language = yt.captions.get_by_language_code('en').name if yt.captions else "Unknown"
+    video_id = extract_video_id(youtube_link)
+    tracks = get_default_caption_provider().tracks(video_id)
+    video_language = ", ".join(track.language or track.language_code for track in tracks) or "Unknown"
 
-    print(f"Video Language: {video_language}")
+    print(f"Caption languages: {video_language}")
 
     if check_video_processed(video_id):
         print(f"The video '{video_id}' has already been processed.")
     else:
-        full_text = extract_captions(youtube_link)
+        captions = fetch_caption_transcript(youtube_link)
+        full_text = captions.text if captions is not None else None
         
         if full_text is None:
             # If no captions, attempt to download audio and convert to text
             try:
                 print("Attempting to download audio and convert to text...")
-                ydl_opts = {
-                    'format': 'bestaudio/best',
-                    'outtmpl': 'audio.%(ext)s',
-                    'postprocessors': [{
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'wav',  # Keep as wav format
-                        'preferredquality': '192',
-                    }],
-                }
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([youtube_link])
+                download_audio(youtube_link, 'audio.wav')
                 full_text = audio_to_text('audio.wav')  # Use wav file for recognition
             except Exception as e:
                 print(f"Error downloading audio: {str(e)}")
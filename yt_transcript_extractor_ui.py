@@ -1,6 +1,8 @@
+import queue
 import tkinter as tk
-from tkinter import messagebox
-from pytube import YouTube
+from tkinter import ttk, messagebox
+from job_queue import JobQueue
+from instrumentation import configure_logging, trace
 from yt_transcript_extractor import (
     process_video_transcript, summarize_text, create_markdown_files, 
     mark_video_processed, check_ffmpeg_installed
@@ -31,32 +33,71 @@ def process_video(export_only=False):
         messagebox.showerror("Input Error", "Please enter a YouTube link.")
         return
 
-    try:
+    jobs.submit(youtube_link, video_job, youtube_link, export_only)
+
+def video_job(youtube_link, export_only, job):
+    """Runs on a worker thread; returns the message shown on success"""
+    # One trace covers transcription, summary and file writes
+    with trace():
         # Process video and get transcript
-        result = process_video_transcript(youtube_link)
+        result = process_video_transcript(youtube_link, progress=job.report)
         
         # Handle export-only mode
         if export_only:
-            messagebox.showinfo("Success", 
-                f"Transcript exported successfully to:\n{result['output_file']}")
-            return
+            return f"Transcript exported successfully to:\n{result['output_file']}"
 
         # Generate summary and create files
-        try:
-            summary = summarize_text(result['transcript'])
-            create_markdown_files(result['video_id'], result['transcript'], summary)
-            mark_video_processed(result['video_id'])
-            
-            messagebox.showinfo("Success", 
-                f"Processing completed successfully!\n\n"
-                f"Video ID: {result['video_id']}\n"
-                f"Transcript: {result['output_file']}")
-                
-        except Exception as e:
-            messagebox.showerror("Processing Error", f"Error during text processing: {str(e)}")
-            
-    except Exception as e:
-        messagebox.showerror("Error", f"Failed to process video: {str(e)}")
+        summary = summarize_text(result['transcript'], result['structured'], progress=job.report)
+        job.check_cancelled()
+        job.report('writing')
+        create_markdown_files(result['video_id'], result['transcript'], summary)
+        mark_video_processed(result['video_id'])
+    
+    return (f"Processing completed successfully!\n\n"
+            f"Video ID: {result['video_id']}\n"
+            f"Transcript: {result['output_file']}")
+
+def poll_updates():
+    """Show job progress on the Tk thread, then reschedule"""
+    try:
+        while True:
+            refresh_job(updates.get_nowait())
+    except queue.Empty:
+        pass
+    root.after(100, poll_updates)
+
+def refresh_job(job):
+    """Update the job's row; report its outcome once it has finished"""
+    row = str(job.id)
+    progress = f"{job.progress:.0%}" if job.progress is not None else ""
+    values = (job.label, job.stage, progress, job.status)
+    if job_list.exists(row):
+        job_list.item(row, values=values)
+    else:
+        job_list.insert("", tk.END, iid=row, values=values)
+
+    # Updates carry the live Job, so earlier ones drained late already show the final status
+    if job.status not in ("done", "failed") or job.id in reported:
+        return
+    reported.add(job.id)
+    if job.status == "done":
+        messagebox.showinfo("Success", job.result)
+    else:
+        messagebox.showerror("Error", f"Failed to process {job.label}: {job.error}")
+
+def cancel_selected():
+    for row in job_list.selection():
+        jobs.cancel(int(row))
+
+def close():
+    jobs.shutdown()
+    root.destroy()
+
+# Jobs run on background threads; their updates reach Tk through this queue
+updates = queue.Queue()
+# IDs of jobs whose result dialog has been shown
+reported = set()
+jobs = JobQueue(max_workers=2, on_update=updates.put)
 
 # Create the main application window
 root = tk.Tk()
@@ -77,5 +118,23 @@ button_export = tk.Button(button_frame, text="Export Transcript Only",
                          command=lambda: process_video(True))
 button_export.pack(side=tk.LEFT, padx=5)
 
+# One row per job: queued, running and finished jobs with their stage and progress
+jobs_frame = ttk.LabelFrame(root, text="Jobs")
+jobs_frame.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+
+columns = ("video", "stage", "progress", "status")
+job_list = ttk.Treeview(jobs_frame, columns=columns, show="headings", height=6)
+for column, width in zip(columns, (260, 100, 80, 90)):
+    job_list.heading(column, text=column.capitalize())
+    job_list.column(column, width=width)
+job_list.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+button_cancel = tk.Button(jobs_frame, text="Cancel Selected", command=cancel_selected)
+button_cancel.pack(pady=5)
+
+root.protocol("WM_DELETE_WINDOW", close)
+root.after(100, poll_updates)
+
 # Start the application
+configure_logging()
 root.mainloop()